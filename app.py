@@ -4,13 +4,38 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import pydeck as pdk
 from datetime import datetime, timedelta
 import time
 import json
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
 import math
+import asyncio
+import uuid
+
+import aiohttp
+
+from cities import CityCache, CityData, resolve_city
+from data_store import AREAS
+from deck_map import DECK_MODES, CompactDeck, build_deck, hotspot_rows, street_rows
+from impact_model import ROUTE_FEATURES, ImpactModel
+from llm_client import LLMBridge, LLMError, llm_configured
+from map_clustering import RAW_POINT_ZOOM, cluster_hotspots
+from optimizer import optimize_budget
+from profiler import profile_run, profiled, record_memory, render_debug_panel
+from report_export import REPORT_FORMATS, ActionPlanReport, ReportExporter
+from response_cache import ResponseCache
+from rollup_cube import RollupCube, cube_manifest, publish_rollup_cube
+from route_planner import RoutePlanner
+from route_scoring import SCORE_COLUMNS, RouteScorer
+from schema import HOTSPOT_SCHEMA, ROUTE_SCHEMA, enforce_schema, memory_report, to_typed_frame, untyped_bytes
+from scenario_engine import simulate_scenario
+from sessions import SessionState, SessionStore
+from spatial_index import HotspotIndex, viewport_bounds
+from story_cache import StoryCache, build_story_cache, published_story_path
+from street_network import StreetNetwork
+from templates import inject_css, precompile_templates, render_template
+from timeseries import CHART_WIDTH_PX, TimeSeries, series_key
 
 # Set page configuration
 st.set_page_config(
@@ -21,289 +46,24 @@ st.set_page_config(
 )
 
 # Custom CSS for revolutionary UI
+@st.cache_resource
+def load_templates():
+    """Compile the card templates once per process"""
+    precompile_templates()
+
+@profiled
 def load_revolutionary_css():
-    st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    .main {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        min-height: 100vh;
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .hero-section {
-        background: rgba(255,255,255,0.95);
-        border-radius: 20px;
-        padding: 40px;
-        margin: 20px 0;
-        box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(255,255,255,0.2);
-    }
-    
-    .ai-chat-container {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        border-radius: 15px;
-        padding: 25px;
-        margin: 20px 0;
-        color: white;
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .ai-chat-container::before {
-        content: '';
-        position: absolute;
-        top: -2px;
-        left: -2px;
-        right: -2px;
-        bottom: -2px;
-        background: linear-gradient(45deg, #ff6b6b, #4ecdc4, #45b7d1, #96ceb4);
-        border-radius: 17px;
-        z-index: -1;
-        animation: gradient-shift 3s ease-in-out infinite;
-    }
-    
-    @keyframes gradient-shift {
-        0%, 100% { transform: rotate(0deg); }
-        50% { transform: rotate(180deg); }
-    }
-    
-    .story-card {
-        background: rgba(255,255,255,0.9);
-        border-radius: 15px;
-        padding: 25px;
-        margin: 15px 0;
-        border-left: 5px solid #4facfe;
-        box-shadow: 0 8px 25px rgba(0,0,0,0.1);
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    
-    .story-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 15px 35px rgba(0,0,0,0.2);
-    }
-    
-    .metric-hero {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 20px;
-        padding: 30px;
-        text-align: center;
-        color: white;
-        margin: 15px 0;
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .metric-hero::before {
-        content: '';
-        position: absolute;
-        top: -50%;
-        left: -50%;
-        width: 200%;
-        height: 200%;
-        background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
-        animation: pulse 4s ease-in-out infinite;
-    }
-    
-    @keyframes pulse {
-        0%, 100% { transform: scale(1); opacity: 0.3; }
-        50% { transform: scale(1.1); opacity: 0.1; }
-    }
-    
-    .metric-value {
-        font-size: 48px;
-        font-weight: 700;
-        margin-bottom: 10px;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .metric-label {
-        font-size: 16px;
-        opacity: 0.9;
-        text-transform: uppercase;
-        letter-spacing: 1px;
-    }
-    
-    .insight-bubble {
-        background: rgba(255,255,255,0.95);
-        border-radius: 25px;
-        padding: 20px;
-        margin: 10px 0;
-        border: 2px solid transparent;
-        background-clip: padding-box;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        position: relative;
-    }
-    
-    .insight-bubble::before {
-        content: '';
-        position: absolute;
-        top: -2px;
-        left: -2px;
-        right: -2px;
-        bottom: -2px;
-        background: linear-gradient(45deg, #ff6b6b, #4ecdc4, #45b7d1);
-        border-radius: 27px;
-        z-index: -1;
-        animation: rotate 3s linear infinite;
-    }
-    
-    @keyframes rotate {
-        0% { transform: rotate(0deg); }
-        100% { transform: rotate(360deg); }
-    }
-    
-    .progress-ring {
-        transform: rotate(-90deg);
-    }
-    
-    .progress-ring circle {
-        stroke-dasharray: 251.2;
-        stroke-dashoffset: 251.2;
-        transition: stroke-dashoffset 2s ease-in-out;
-    }
-    
-    .gamification-badge {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        border-radius: 50px;
-        padding: 10px 20px;
-        color: white;
-        font-weight: 600;
-        margin: 5px;
-        display: inline-block;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.2);
-    }
-    
-    .interactive-map-container {
-        border-radius: 20px;
-        overflow: hidden;
-        box-shadow: 0 15px 35px rgba(0,0,0,0.2);
-        margin: 20px 0;
-    }
-    
-    .ai-recommendation {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 15px;
-        padding: 20px;
-        color: white;
-        margin: 15px 0;
-        position: relative;
-    }
-    
-    .impact-simulator {
-        background: rgba(255,255,255,0.95);
-        border-radius: 20px;
-        padding: 30px;
-        margin: 20px 0;
-        box-shadow: 0 15px 35px rgba(0,0,0,0.1);
-    }
-    
-    .scenario-button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border: none;
-        border-radius: 10px;
-        padding: 15px 25px;
-        color: white;
-        font-weight: 600;
-        cursor: pointer;
-        margin: 10px 5px;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.2);
-    }
-    
-    .scenario-button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 8px 25px rgba(0,0,0,0.3);
-    }
-    
-    .prediction-card {
-        background: linear-gradient(135deg, #fa709a 0%, #fee140 100%);
-        border-radius: 15px;
-        padding: 25px;
-        color: white;
-        margin: 15px 0;
-        text-align: center;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-    }
-    
-    .safety-score-container {
-        position: relative;
-        width: 200px;
-        height: 200px;
-        margin: 20px auto;
-    }
-    
-    .floating-insight {
-        position: fixed;
-        top: 20px;
-        right: 20px;
-        background: rgba(255,255,255,0.95);
-        border-radius: 15px;
-        padding: 15px;
-        max-width: 300px;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-        z-index: 1000;
-        animation: float-in 0.5s ease-out;
-    }
-    
-    @keyframes float-in {
-        from { transform: translateX(100%); opacity: 0; }
-        to { transform: translateX(0); opacity: 1; }
-    }
-    
-    .stSelectbox > div > div {
-        background: rgba(255,255,255,0.9);
-        border-radius: 10px;
-        border: 2px solid #4facfe;
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border: none;
-        border-radius: 10px;
-        color: white;
-        font-weight: 600;
-        padding: 10px 20px;
-        transition: all 0.3s ease;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 8px 25px rgba(0,0,0,0.3);
-    }
-    
-    .conversation-flow {
-        background: rgba(255,255,255,0.9);
-        border-radius: 20px;
-        padding: 30px;
-        margin: 20px 0;
-        border: 1px solid rgba(255,255,255,0.3);
-        backdrop-filter: blur(10px);
-    }
-    
-    .typing-indicator {
-        display: inline-block;
-        animation: typing 1.5s infinite;
-    }
-    
-    @keyframes typing {
-        0%, 60%, 100% { opacity: 1; }
-        30% { opacity: 0.5; }
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    load_templates()
+    # Minified once per process, as a plain <style> element
+    inject_css()
+
+# Story types told from the worst hotspot of an incident type, and the card fields they show
+STORY_INCIDENTS = {"junction_safety": "Sudden Braking", "weather_impact": "Surface Issues"}
+STORY_CARD_FIELDS = ("title", "narrative", "impact", "solution", "cost", "benefit")
 
 # Simulated API calls and ML models
 class CycleSafeAI:
-    def __init__(self):
-        self.conversations = []
-        self.user_profile = {
-            "role": "city_planner",
-            "expertise": "beginner",
-            "interests": ["safety", "infrastructure", "budget"]
-        }
+    """Stateless assistant logic shared by every session - chat history lives in the session store"""
     
     def get_ai_insight(self, context: str) -> str:
         """Simulate Groq API call for AI insights"""
@@ -326,8 +86,48 @@ class CycleSafeAI:
         }
         return random.choice(insights.get(context, ["Great insight coming your way!"]))
     
-    def generate_story(self, data_point: str) -> Dict:
+    def stream_ai_insight(self, question: str, context: str, data_version: str) -> Iterator[str]:
+        """Stream an answer, serving repeat questions from the response cache"""
+        cache = get_response_cache()
+        key = cache.key(question, data_version)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        tokens: List[str] = []
+        complete = yield from self._stream_uncached(question, context, tokens)
+        # Cut-off streams and canned fallbacks are shown but never cached as answers
+        if complete:
+            cache.put(key, "".join(tokens))
+    
+    def _stream_uncached(self, question: str, context: str, tokens: List[str]) -> Generator[str, None, bool]:
+        """Stream an answer from the LLM into tokens, falling back to a canned insight offline
+
+        Returns whether the LLM answered in full.
+        """
+        if not llm_configured():
+            yield self.get_ai_insight(context)
+            return False
+        try:
+            for token in get_llm_bridge().stream(question, context):
+                tokens.append(token)
+                yield token
+        except (LLMError, aiohttp.ClientError, asyncio.TimeoutError):
+            if not tokens:
+                yield self.get_ai_insight(context)
+            return False
+        return True
+    
+    def generate_story(self, data_point: str, missing_links: Optional[pd.DataFrame] = None,
+                       daily_cyclists: float = 0.0, story_cache: Optional[StoryCache] = None) -> Dict:
         """Generate engaging stories from data"""
+        if data_point == "infrastructure_gap" and missing_links is not None and not missing_links.empty:
+            return self._missing_link_story(missing_links.iloc[0], daily_cyclists)
+        if data_point in STORY_INCIDENTS and story_cache is not None:
+            # The worst hotspot with that problem, its card written by the offline batch
+            top = story_cache.top(1, STORY_INCIDENTS[data_point])
+            if not top.empty:
+                return top.iloc[0][list(STORY_CARD_FIELDS)].to_dict()
         stories = {
             "junction_safety": {
                 "title": "The Story of Busy Corner",
@@ -356,71 +156,203 @@ class CycleSafeAI:
         }
         return stories.get(data_point, {})
     
-    def predict_impact(self, intervention: str) -> Dict:
-        """Simulate XGBoost predictions for impact assessment"""
-        predictions = {
-            "signal_timing": {
-                "incident_reduction": 32,
-                "cyclist_satisfaction": 85,
-                "implementation_time": "2 weeks",
-                "roi": "450%"
-            },
-            "protected_lanes": {
-                "incident_reduction": 68,
-                "cyclist_satisfaction": 92,
-                "implementation_time": "3 months",
-                "roi": "230%"
-            },
-            "surface_improvement": {
-                "incident_reduction": 25,
-                "cyclist_satisfaction": 78,
-                "implementation_time": "1 month",
-                "roi": "340%"
-            }
+    @staticmethod
+    def _missing_link_story(link: pd.Series, daily_cyclists: float) -> Dict:
+        """The Missing Link story for the gap that would carry the most cyclists"""
+        riders = max(int(round(link["flow_share"] * daily_cyclists, -1)), 10)
+        return {
+            "title": "The Missing Link",
+            "narrative": f"Tom's safe bike lane suddenly ends on {link['street']}, forcing him into traffic. This {link['length_m']:.0f}-meter gap splits two protected routes, and about {link['flow_share']:.0%} of all cycle trips in the city would ride through it. Completing this missing link would create a continuous safe route for {riders:,}+ daily cyclists.",
+            "impact": f"{riders:,}+ cyclists forced into traffic daily",
+            "solution": "Complete protected bike lane",
+            "cost": f"${link['cost']:,.0f}",
+            "benefit": f"Joins {link['lanes_joined_m'] / 1000:,.1f} km of protected lanes"
         }
-        return predictions.get(intervention, {})
-
-# Initialize AI system
-ai_system = CycleSafeAI()
-
-# Load sample data with more realistic scenarios
-@st.cache_data
-def load_narrative_data():
-    """Load data optimized for storytelling"""
-    
-    # Create realistic route data with personas
-    route_stories = pd.DataFrame({
-        'route_id': range(1, 1001),
-        'route_name': [f"Route {i}" for i in range(1, 1001)],
-        'primary_users': np.random.choice(['Commuters', 'Families', 'Fitness Enthusiasts', 'Students'], 1000),
-        'safety_score': np.random.beta(3, 1, 1000) * 10,  # Skewed toward higher scores
-        'daily_cyclists': np.random.poisson(50, 1000),
-        'incident_rate': np.random.exponential(0.5, 1000),
-        'infrastructure_quality': np.random.choice(['Excellent', 'Good', 'Fair', 'Poor'], 1000, p=[0.1, 0.3, 0.4, 0.2]),
-        'weather_resilience': np.random.uniform(0.3, 1.0, 1000),
-        'accessibility_score': np.random.uniform(0.2, 1.0, 1000),
-        'community_priority': np.random.choice(['High', 'Medium', 'Low'], 1000, p=[0.2, 0.5, 0.3])
-    })
-    
-    # Create hotspot data with contextual information
-    hotspot_stories = pd.DataFrame({
-        'location_id': range(1, 101),
-        'location_name': [f"Location {i}" for i in range(1, 101)],
-        'location_type': np.random.choice(['School Zone', 'Business District', 'Residential', 'Park Area', 'Transit Hub'], 100),
-        'lat': np.random.uniform(51.5, 51.6, 100),
-        'lon': np.random.uniform(-0.15, -0.05, 100),
-        'risk_level': np.random.choice(['Critical', 'High', 'Medium', 'Low'], 100, p=[0.1, 0.2, 0.4, 0.3]),
-        'affected_cyclists': np.random.poisson(30, 100),
-        'incident_type': np.random.choice(['Sudden Braking', 'Swerving', 'Conflicts', 'Surface Issues'], 100),
-        'time_of_day': np.random.choice(['Morning Rush', 'Midday', 'Evening Rush', 'Night'], 100),
-        'fix_complexity': np.random.choice(['Quick Fix', 'Moderate', 'Complex'], 100, p=[0.4, 0.4, 0.2]),
-        'estimated_cost': np.random.lognormal(8, 1, 100),  # Realistic cost distribution
-        'community_impact': np.random.uniform(0.3, 1.0, 100)
-    })
     
+    def predict_impact(self, intervention: str, route_features: np.ndarray) -> Dict:
+        """Score an intervention over every route with the XGBoost impact model"""
+        return get_impact_model().predict_impact(route_features, intervention)
+
+@st.cache_resource
+def get_llm_bridge() -> LLMBridge:
+    """One pooled LLM client and event loop per process"""
+    return LLMBridge()
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Assistant answers shared by all sessions, keyed by question and data version"""
+    return ResponseCache()
+
+@st.cache_resource
+def get_ai_system() -> CycleSafeAI:
+    """One assistant per process; it holds no per-user state"""
+    return CycleSafeAI()
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    """Chat history and profile of every connected session, capped and expired when idle"""
+    return SessionStore()
+
+def current_session() -> SessionState:
+    """This browser session's state in the shared session store"""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return get_session_store().get(st.session_state.session_id)
+
+# Columns each tab renders - only these are read from disk; None means the tab never reads that table
+TAB_COLUMNS = {
+    "dashboard": (
+        None,
+        ['location_id', 'location_name', 'lat', 'lon', 'risk_level', 'affected_cyclists']
+    ),
+    "action_plan": (
+        None,
+        ['location_id', 'location_name', 'risk_level', 'affected_cyclists', 'fix_complexity', 'estimated_cost', 'community_impact']
+    ),
+    "progress": (SCORE_COLUMNS, None),
+    "simulator": (ROUTE_FEATURES, None),
+}
+
+@st.cache_resource
+def get_city_cache() -> CityCache:
+    """Per-city stores and derived data, shared by all sessions under one memory budget"""
+    return CityCache()
+
+def current_city() -> CityData:
+    """The city selected by ?city= (default city when absent or unknown)"""
+    cities = get_city_cache()
+    return cities.get(resolve_city(st.query_params.get("city"), cities.configs))
+
+def data_version() -> str:
+    """Cache key for everything derived from the data: city, base tables and the event aggregate version"""
+    return current_city().version
+
+def _read_tables(city: CityData, route_columns: Tuple[str, ...], hotspot_columns: Tuple[str, ...]):
+    route_stories = hotspot_stories = None
+    memory = []
+    if route_columns:
+        routes = city.store.read_arrow("routes", list(route_columns))
+        route_stories = to_typed_frame(routes, ROUTE_SCHEMA)
+        memory.append(memory_report("route_stories", untyped_bytes(routes), route_stories))
+    if hotspot_columns:
+        hotspots = city.store.read_arrow("hotspots", list(hotspot_columns))
+        # Live aggregates may replace labels, so the schema is applied again afterwards
+        hotspot_stories = enforce_schema(city.aggregator.apply(to_typed_frame(hotspots, HOTSPOT_SCHEMA)), HOTSPOT_SCHEMA)
+        memory.append(memory_report("hotspot_stories", untyped_bytes(hotspots), hotspot_stories))
+    return route_stories, hotspot_stories, memory
+
+def get_rollup_cube() -> RollupCube:
+    """Headline rollups as last published by the ingest/publish steps; the page never rebuilds them"""
+    city = current_city()
+    name = cube_manifest(city.store.root)["file"]
+    if name is None:
+        # Tables that never went through a publish step (sample data, older layouts) get their first cube here
+        name = city.memo("rollup_cube_bootstrap", city.version,
+                         lambda: publish_rollup_cube(city.store, city.aggregator)).name
+    return city.memo("rollup_cube", name, lambda: RollupCube.load(city.store.root / "rollups" / name))
+
+@profiled
+def load_narrative_data(route_columns: Optional[List[str]] = None, hotspot_columns: Optional[List[str]] = None):
+    """Load data optimized for storytelling, projected to the columns a view needs
+
+    A table without columns is not read at all and comes back as None.
+    """
+    city = current_city()
+    key = ("tables", tuple(route_columns or ()), tuple(hotspot_columns or ()))
+    route_stories, hotspot_stories, memory = city.memo(key, city.version, lambda: _read_tables(city, *key[1:]))
+    record_memory(memory)
     return route_stories, hotspot_stories
 
+@st.cache_resource
+def get_impact_model() -> ImpactModel:
+    """Load the impact booster once per process"""
+    return ImpactModel()
+
+def get_story_cache() -> StoryCache:
+    """Story card of every hotspot, as last generated by the story batch job; the page never regenerates them"""
+    city = current_city()
+    path = published_story_path(city.store.root)
+    if path is None:
+        # Tables that never went through a publish step (sample data, older layouts) get their first stories here
+        path = city.memo("story_cache_bootstrap", city.version, lambda: build_story_cache(city.store, city.aggregator))
+    # A rebuild for the same hotspots table replaces the file under the same name
+    return city.memo("story_cache", f"{path.name}:{path.stat().st_mtime_ns}", lambda: StoryCache.load(path))
+
+def get_time_series() -> TimeSeries:
+    """Every trend series of the current city, reloaded whenever the stored history changes"""
+    city = current_city()
+    return city.memo("timeseries", city.timeseries.version, city.timeseries.load)
+
+def get_hotspot_deck(mode: str, show_streets: bool, hotspot_data: pd.DataFrame) -> CompactDeck:
+    """deck.gl map of every hotspot as compact positional rows, serialised once per data version"""
+    city = current_city()
+    center = (city.config.lat, city.config.lon)
+    version = f"{city.version}+{city.network.version}"
+    
+    def build() -> CompactDeck:
+        streets = None
+        if show_streets:
+            planner = get_route_planner()
+            network = planner.network
+            streets = street_rows(network.lat, network.lon, network.u, network.v, planner.risk, center)
+        return build_deck(mode, hotspot_rows(hotspot_data, center), center, city.config.zoom, streets)
+    
+    return city.memo(("deck", mode, show_streets), version, build)
+
+def get_street_network() -> StreetNetwork:
+    """The current city's cycle network graph"""
+    city = current_city()
+    return city.memo("street_network", city.network.version, city.network.load)
+
+def get_missing_links() -> pd.DataFrame:
+    """Protected-lane gaps in the current city, ranked by the cyclist flow they would carry"""
+    city = current_city()
+    network = get_street_network()
+    return city.memo("missing_links", city.network.version, lambda: city.network.missing_links(network))
+
+def get_route_planner() -> RoutePlanner:
+    """Safest-route planner over the current city's network, with its landmarks precomputed"""
+    city = current_city()
+    network = get_street_network()
+    columns = ["route_id", "safety_score", "incident_rate"]
+    # Edge risk comes from the routes table and the network only; hotspot events never change it
+    return city.memo("route_planner", f"{city.store.version}+{city.network.version}",
+                     lambda: RoutePlanner(network, city.store.read("routes", columns)))
+
+def get_route_features(version: str, route_data: pd.DataFrame) -> np.ndarray:
+    """Model feature matrix for the route table, built once per data version"""
+    return current_city().memo("route_features", version, lambda: ImpactModel.prepare(route_data))
+
+@st.cache_resource
+def get_route_scorer() -> RouteScorer:
+    """Process pool for route scoring, started once per process"""
+    return RouteScorer()
+
+def get_route_scores(version: str, route_data: pd.DataFrame) -> np.ndarray:
+    """Safety score of every route, computed once per data version"""
+    return current_city().memo("route_scores", version, lambda: get_route_scorer().score(route_data))
+
+def predict_intervention_impact(version: str, intervention: str, route_data: pd.DataFrame) -> Dict:
+    """Batch-score an intervention over all routes, once per intervention and data version"""
+    return current_city().memo(("intervention_impact", intervention), version,
+                               lambda: get_ai_system().predict_impact(intervention, get_route_features(version, route_data)))
+
 # UI Components
+@profiled
+def create_city_selector():
+    """Pick the council whose data the dashboard shows"""
+    configs = get_city_cache().configs
+    slug = resolve_city(st.query_params.get("city"), configs)
+    choice = st.selectbox(
+        "🏙️ Council",
+        list(configs),
+        index=list(configs).index(slug),
+        format_func=lambda city: configs[city].name
+    )
+    if choice != st.query_params.get("city"):
+        st.query_params["city"] = choice
+
+@profiled
 def create_hero_section():
     """Create an engaging hero section"""
     st.markdown("""
@@ -437,6 +369,8 @@ def create_hero_section():
     </div>
     """, unsafe_allow_html=True)
 
+@st.fragment
+@profiled
 def create_ai_chat_interface():
     """Create an AI chat interface for natural interaction"""
     st.markdown("""
@@ -451,26 +385,46 @@ def create_ai_chat_interface():
     </div>
     """, unsafe_allow_html=True)
     
-    # Chat interface
-    user_question = st.text_input(
-        "Ask your AI assistant:",
-        placeholder="e.g., 'What's the biggest safety concern in my city?' or 'How can I improve cyclist safety with a $50k budget?'"
-    )
-    
-    if user_question:
-        with st.spinner("🤖 Thinking..."):
-            time.sleep(1)  # Simulate processing
-            
-            # Generate contextual response
-            if "budget" in user_question.lower():
-                response = ai_system.get_ai_insight("budget_optimization")
-            elif "safety" in user_question.lower():
-                response = ai_system.get_ai_insight("safety_score")
-            else:
-                response = ai_system.get_ai_insight("general")
-            
-            st.success(f"🤖 AI Assistant: {response}")
+    # Chat interface - a form, so a question is asked (and counted) once per submit, not on every rerun
+    with st.form("ai_question", border=False):
+        user_question = st.text_input(
+            "Ask your AI assistant:",
+            placeholder="e.g., 'What's the biggest safety concern in my city?' or 'How can I improve cyclist safety with a $50k budget?'"
+        )
+        asked = st.form_submit_button("Ask")
+    
+    session = current_session()
+    if asked and user_question.strip():
+        # Generate contextual response
+        if "budget" in user_question.lower():
+            context = "budget_optimization"
+        elif "safety" in user_question.lower():
+            context = "safety_score"
+        else:
+            context = "general"
+        
+        with st.chat_message("assistant", avatar="🤖"):
+            answer = st.write_stream(get_ai_system().stream_ai_insight(user_question, context, data_version()))
+        session.add_turn(user_question, answer if isinstance(answer, str) else "".join(map(str, answer)))
+    elif session.history:
+        # Other reruns show the latest answer again without asking the assistant
+        with st.chat_message("assistant", avatar="🤖"):
+            st.markdown(session.history[-1][1])
+    
+    if session.history:
+        earlier = list(session.history)[:-1]
+        if earlier:
+            with st.expander(f"💬 Earlier in this conversation ({len(earlier)})"):
+                for question, reply in reversed(earlier):
+                    st.markdown(f"**You:** {question}\n\n**Assistant:** {reply}")
+        
+        cache_stats = get_response_cache().stats()
+        st.caption(
+            f"⚡ Answer cache: {cache_stats['hit_rate']:.0%} hit rate "
+            f"({cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} stored)"
+        )
 
+@profiled
 def create_safety_score_wheel(score: float, target: float):
     """Create an animated safety score wheel"""
     fig = go.Figure()
@@ -519,24 +473,14 @@ def create_safety_score_wheel(score: float, target: float):
     
     return fig
 
+@profiled
 def create_story_card(story_data: Dict):
     """Create an engaging story card"""
-    st.markdown(f"""
-    <div class="story-card">
-        <h3 style="color: #4facfe; margin-bottom: 15px;">📖 {story_data['title']}</h3>
-        <p style="font-size: 16px; line-height: 1.6; margin-bottom: 20px;">
-            {story_data['narrative']}
-        </p>
-        <div style="display: flex; justify-content: space-between; flex-wrap: wrap;">
-            <div><strong>Impact:</strong> {story_data['impact']}</div>
-            <div><strong>Solution:</strong> {story_data['solution']}</div>
-            <div><strong>Cost:</strong> {story_data['cost']}</div>
-            <div><strong>Benefit:</strong> {story_data['benefit']}</div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(render_template("story_card.html", **story_data), unsafe_allow_html=True)
 
-def create_impact_simulator():
+@st.fragment
+@profiled
+def create_impact_simulator(route_data: pd.DataFrame):
     """Create an interactive impact simulator"""
     st.markdown("""
     <div class="impact-simulator">
@@ -571,34 +515,22 @@ def create_impact_simulator():
         """, unsafe_allow_html=True)
     
     # Simulation results
+    interventions = {
+        "Traffic Signal Optimization": "signal_timing",
+        "Protected Bike Lanes": "protected_lanes",
+        "Surface Improvements": "surface_improvement"
+    }
     intervention = st.selectbox(
         "Select an intervention to simulate:",
-        ["Traffic Signal Optimization", "Protected Bike Lanes", "Surface Improvements"],
+        list(interventions),
         index=0
     )
     
-    if intervention == "Traffic Signal Optimization":
-        results = ai_system.predict_impact("signal_timing")
-        st.markdown(f"""
-        <div class="prediction-card">
-            <h4>Predicted Impact: Traffic Signal Optimization</h4>
-            <div style="display: flex; justify-content: space-around; margin-top: 20px;">
-                <div>
-                    <div style="font-size: 2rem; font-weight: bold;">{results['incident_reduction']}%</div>
-                    <div>Incident Reduction</div>
-                </div>
-                <div>
-                    <div style="font-size: 2rem; font-weight: bold;">{results['cyclist_satisfaction']}%</div>
-                    <div>Cyclist Satisfaction</div>
-                </div>
-                <div>
-                    <div style="font-size: 2rem; font-weight: bold;">{results['roi']}</div>
-                    <div>Return on Investment</div>
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    results = predict_intervention_impact(data_version(), interventions[intervention], route_data)
+    if results:
+        st.markdown(render_template("impact_prediction.html", intervention=intervention, **results), unsafe_allow_html=True)
 
+@profiled
 def create_gamified_dashboard():
     """Create gamified elements for engagement"""
     st.markdown("""
@@ -619,6 +551,36 @@ def create_gamified_dashboard():
     progress = 0.7
     st.progress(progress, text="Progress to next level: 70%")
 
+# The quick wins the priority matrix shows and exported reports list
+QUICK_WINS = [
+    {
+        "rank": 1,
+        "action": "Adjust traffic signal timing at Main & Oak",
+        "effort": "Low",
+        "impact": "High",
+        "timeline": "2 weeks",
+        "cost": "$2,500"
+    },
+    {
+        "rank": 2,
+        "action": "Install 'Cyclists Present' warning signs",
+        "effort": "Low",
+        "impact": "Medium",
+        "timeline": "1 week",
+        "cost": "$800"
+    },
+    {
+        "rank": 3,
+        "action": "Repair surface on Pine Street bike lane",
+        "effort": "Medium",
+        "impact": "Medium",
+        "timeline": "3 weeks",
+        "cost": "$12,000"
+    }
+]
+
+
+@profiled
 def create_priority_matrix():
     """Create a simple priority matrix for decision making"""
     st.markdown("""
@@ -628,51 +590,10 @@ def create_priority_matrix():
     </div>
     """, unsafe_allow_html=True)
     
-    priorities = [
-        {
-            "rank": 1,
-            "action": "Adjust traffic signal timing at Main & Oak",
-            "effort": "Low",
-            "impact": "High",
-            "timeline": "2 weeks",
-            "cost": "$2,500"
-        },
-        {
-            "rank": 2,
-            "action": "Install 'Cyclists Present' warning signs",
-            "effort": "Low",
-            "impact": "Medium",
-            "timeline": "1 week",
-            "cost": "$800"
-        },
-        {
-            "rank": 3,
-            "action": "Repair surface on Pine Street bike lane",
-            "effort": "Medium",
-            "impact": "Medium",
-            "timeline": "3 weeks",
-            "cost": "$12,000"
-        }
-    ]
-    
-    for priority in priorities:
-        st.markdown(f"""
-        <div class="insight-bubble">
-            <div style="display: flex; align-items: center; margin-bottom: 10px;">
-                <div style="background: #4facfe; color: white; border-radius: 50%; width: 30px; height: 30px; display: flex; align-items: center; justify-content: center; margin-right: 15px; font-weight: bold;">
-                    {priority['rank']}
-                </div>
-                <h4 style="margin: 0; color: #333;">{priority['action']}</h4>
-            </div>
-            <div style="display: flex; justify-content: space-between; font-size: 14px; color: #666;">
-                <span>⚡ Effort: {priority['effort']}</span>
-                <span>📈 Impact: {priority['impact']}</span>
-                <span>⏱️ Timeline: {priority['timeline']}</span>
-                <span>💰 Cost: {priority['cost']}</span>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    for priority in QUICK_WINS:
+        st.markdown(render_template("priority_bubble.html", **priority), unsafe_allow_html=True)
 
+@profiled
 def create_before_after_visualization():
     """Create before/after visualization"""
     st.markdown("""
@@ -710,6 +631,7 @@ def create_before_after_visualization():
         </div>
         """, unsafe_allow_html=True)
 
+@profiled
 def create_conversational_insights():
     """Create conversational insights that feel like talking to a friend"""
     st.markdown("""
@@ -743,129 +665,171 @@ def create_conversational_insights():
     ]
     
     for insight in insights:
-        st.markdown(f"""
-        <div class="story-card">
-            <div style="display: flex; align-items: center; margin-bottom: 15px;">
-                <span style="font-size: 2rem; margin-right: 15px;">{insight['emoji']}</span>
-                <h4 style="margin: 0; color: #4facfe;">{insight['title']}</h4>
-            </div>
-            <p style="font-size: 16px; line-height: 1.6; margin-bottom: 15px;">
-                {insight['message']}
-            </p>
-            <div style="background: #f8f9fa; padding: 10px; border-radius: 8px; border-left: 4px solid #4facfe;">
-                <strong>💪 Action:</strong> {insight['action']}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(render_template("insight_card.html", **insight), unsafe_allow_html=True)
+
+def _solve_plan(budget: int, hotspot_data: pd.DataFrame) -> Dict:
+    candidates = hotspot_data.assign(
+        value=hotspot_data['community_impact'] * hotspot_data['affected_cyclists']
+    )
+    return optimize_budget(candidates, budget)
+
+def plan_interventions(version: str, budget: int, hotspot_data: pd.DataFrame) -> Dict:
+    """Solve the budget-constrained fix selection over every hotspot, once per budget and data version"""
+    return current_city().memo(("action_plan", budget), version, lambda: _solve_plan(budget, hotspot_data))
+
+FIX_TIMEFRAMES = {"Quick Fix": "1-2 weeks", "Moderate": "1 month", "Complex": "3 months"}
 
-def create_smart_recommendations():
+def fix_priorities(plan: pd.DataFrame) -> np.ndarray:
+    """Priority label of every planned fix: urgent if critical, else a quick win or high impact"""
+    return np.where(plan['risk_level'].astype(str) == "Critical", "🔥 URGENT",
+                    np.where(plan['fix_complexity'].astype(str) == "Quick Fix", "🌟 QUICK WIN", "💪 HIGH IMPACT"))
+
+@st.cache_resource
+def get_report_exporter() -> ReportExporter:
+    """Background report renderer and finished-file cache, shared by all sessions"""
+    return ReportExporter()
+
+def _build_report(city: CityData, budget: int, result: Dict) -> ActionPlanReport:
+    plan = result["plan"]
+    fixes = pd.DataFrame({
+        "rank": np.arange(1, len(plan) + 1),
+        "location": plan['location_name'].astype(str).to_numpy(),
+        "priority": [label.split(" ", 1)[1].title() for label in fix_priorities(plan)],
+        "risk_level": plan['risk_level'].astype(str).to_numpy(),
+        "affected_cyclists": plan['affected_cyclists'].to_numpy(),
+        "community_impact": plan['community_impact'].round(2).to_numpy(),
+        "fix_complexity": plan['fix_complexity'].astype(str).to_numpy(),
+        "timeframe": plan['fix_complexity'].astype(str).map(FIX_TIMEFRAMES).fillna("1 month").to_numpy(),
+        "estimated_cost": plan['estimated_cost'].round().astype(np.int64).to_numpy(),
+    })
+    return ActionPlanReport(
+        city=city.config.name,
+        version=city.version,
+        budget=budget,
+        total_cost=int(round(result["total_cost"])),
+        efficiency=float(result["budget_efficiency"]),
+        fixes=fixes,
+        quick_wins=QUICK_WINS,
+    )
+
+def action_plan_report(budget: int, result: Dict) -> ActionPlanReport:
+    """The action plan as planners export it, from the same plan the recommendations show"""
+    city = current_city()
+    return city.memo(("action_plan_report", budget), city.version, lambda: _build_report(city, budget, result))
+
+@st.fragment(run_every=0.5)
+def show_report_progress(key: str):
+    """Poll a running export twice a second; once it finishes the page reruns to offer the download"""
+    job = get_report_exporter().get(key)
+    if job is None or job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"📄 Preparing {job.filename} - {job.stage} ({job.progress:.0%})")
+
+@profiled
+def create_report_export(report: ActionPlanReport):
+    """Export the action plan without blocking the page: rendering runs on a worker thread"""
+    exporter = get_report_exporter()
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        fmt = st.radio("Export format", list(REPORT_FORMATS), horizontal=True, key="report_format")
+    key = exporter.key(report, fmt)
+    job = exporter.get(key)
+    with col2:
+        if job is None or job.error is not None:
+            if st.button("📄 Export action plan", key="report_export"):
+                job = exporter.submit(report, fmt)
+    if job is None:
+        return
+    if job.error is not None:
+        st.error(f"Export failed: {job.error}")
+    elif job.done:
+        st.download_button(
+            f"⬇️ Download {fmt} ({len(job.data) / 1024:,.0f} KB)",
+            data=job.data, file_name=job.filename, mime=REPORT_FORMATS[fmt][1], key="report_download"
+        )
+        st.caption(f"Rendered in {job.elapsed:.1f}s - unchanged plans download straight from the cache")
+    else:
+        show_report_progress(key)
+
+@st.fragment
+@profiled
+def create_smart_recommendations(hotspot_data: pd.DataFrame):
     """Create AI-powered smart recommendations"""
-    st.markdown("""
+    budget = st.slider("Your improvement budget ($)", 10000, 200000, 50000, 5000, key="plan_budget")
+    
+    st.markdown(f"""
     <div class="ai-recommendation">
         <h3 style="margin-bottom: 20px;">🎯 Your Personalized Action Plan</h3>
         <p style="margin-bottom: 20px; opacity: 0.9;">
-            Based on your role as a city planner and your $50K budget, here's what our AI recommends:
+            Based on your role as a city planner and your ${budget / 1000:,.0f}K budget, here's what our AI recommends:
         </p>
     </div>
     """, unsafe_allow_html=True)
     
-    recommendations = [
-        {
-            "priority": "🔥 URGENT",
-            "action": "Fix the 'Death Junction' at Main & Oak",
-            "reason": "247 cyclists brake hard here daily - it's your #1 safety concern",
-            "cost": "$2,500",
-            "timeframe": "2 weeks",
-            "impact": "Prevents ~15 incidents/month"
-        },
-        {
-            "priority": "💪 HIGH IMPACT",
-            "action": "Complete the missing bike lane link on Pine St",
-            "reason": "500+ cyclists forced into traffic daily at this gap",
-            "cost": "$35,000",
-            "timeframe": "6 weeks",
-            "impact": "Protects 500+ daily cyclists"
-        },
-        {
-            "priority": "🌟 QUICK WIN",
-            "action": "Install smart warning signs at 8 locations",
-            "reason": "Low cost, high visibility safety improvement",
-            "cost": "$8,000",
-            "timeframe": "1 week",
-            "impact": "Increases driver awareness 3x"
-        }
-    ]
-    
-    for i, rec in enumerate(recommendations, 1):
-        st.markdown(f"""
-        <div class="insight-bubble">
-            <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px;">
-                <h4 style="margin: 0; color: #333;">#{i} {rec['action']}</h4>
-                <span style="background: #4facfe; color: white; padding: 5px 10px; border-radius: 15px; font-size: 12px; font-weight: bold;">
-                    {rec['priority']}
-                </span>
-            </div>
-            <p style="margin-bottom: 15px; color: #666; font-style: italic;">
-                "{rec['reason']}"
-            </p>
-            <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(120px, 1fr)); gap: 10px; font-size: 14px;">
-                <div><strong>💰 Cost:</strong> {rec['cost']}</div>
-                <div><strong>⏱️ Time:</strong> {rec['timeframe']}</div>
-                <div><strong>📈 Impact:</strong> {rec['impact']}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    result = plan_interventions(data_version(), budget, hotspot_data)
+    plan = result["plan"]
+    top = plan.head(3)
+    
+    for i, (rec, priority) in enumerate(zip(top.itertuples(), fix_priorities(top)), 1):
+        st.markdown(render_template(
+            "recommendation_bubble.html",
+            rank=i,
+            action=f"Fix the hotspot at {rec.location_name}",
+            priority=priority,
+            reason=f"{rec.affected_cyclists} cyclists affected at this {str(rec.risk_level).lower()}-risk spot - {rec.community_impact:.0%} community impact",
+            cost=f"${rec.estimated_cost:,.0f}",
+            timeframe=FIX_TIMEFRAMES.get(rec.fix_complexity, "1 month"),
+            impact=f"Protects {rec.affected_cyclists} daily cyclists"
+        ), unsafe_allow_html=True)
+    
+    if len(plan) > 3:
+        st.caption(f"➕ {len(plan) - 3:,} more fixes are included in the plan.")
     
     # Budget tracker
-    total_cost = 2500 + 35000 + 8000
-    remaining_budget = 50000 - total_cost
-    
-    st.markdown(f"""
-    <div style="background: #e8f5e8; padding: 20px; border-radius: 15px; margin: 20px 0; text-align: center;">
-        <h4 style="color: #2d5a2d; margin-bottom: 15px;">💰 Budget Tracker</h4>
-        <div style="display: flex; justify-content: space-around;">
-            <div>
-                <div style="font-size: 1.5rem; font-weight: bold; color: #2d5a2d;">${total_cost:,}</div>
-                <div style="color: #666;">Recommended Spend</div>
-            </div>
-            <div>
-                <div style="font-size: 1.5rem; font-weight: bold; color: #2d5a2d;">${remaining_budget:,}</div>
-                <div style="color: #666;">Remaining Budget</div>
-            </div>
-            <div>
-                <div style="font-size: 1.5rem; font-weight: bold; color: #2d5a2d;">91%</div>
-                <div style="color: #666;">Budget Efficiency</div>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    total_cost = int(round(result["total_cost"]))
+    remaining_budget = budget - total_cost
+    
+    st.markdown(render_template(
+        "budget_tracker.html",
+        total_cost=total_cost,
+        remaining_budget=remaining_budget,
+        efficiency=result["budget_efficiency"]
+    ), unsafe_allow_html=True)
+    
+    # Report export for council meetings
+    create_report_export(action_plan_report(budget, result))
 
-def create_interactive_map_with_stories():
-    """Create an interactive map that tells stories"""
-    st.markdown("""
-    <div class="interactive-map-container">
-        <h3 style="text-align: center; padding: 20px; margin: 0; background: rgba(79, 172, 254, 0.1);">
-            🗺️ Your City's Safety Story Map
-        </h3>
-    </div>
-    """, unsafe_allow_html=True)
+def get_hotspot_index(version: str, hotspot_data: pd.DataFrame) -> HotspotIndex:
+    """Build the hotspot spatial index once per data version"""
+    return current_city().memo("hotspot_index", version, lambda: HotspotIndex(hotspot_data))
+
+def get_story_points(count: int = 5) -> pd.DataFrame:
+    """The city's most pressing hotspots and their cached stories, for the map and ride planner"""
+    stories = get_story_cache().top(count * 2)
+    return stories.rename(columns={'location_name': 'name'}).drop_duplicates('name').head(count)[
+        ['location_id', 'lat', 'lon', 'name', 'story', 'severity', 'affected_daily', 'fix_cost']
+    ].reset_index(drop=True)
+
+def get_hotspot_clusters(version: str, zoom: int, hotspot_data: pd.DataFrame,
+                         hotspot_index: HotspotIndex) -> pd.DataFrame:
+    """Clustered hotspots in the city-centred viewport, computed once per zoom level and data version"""
+    city = current_city()
+
+    def build() -> pd.DataFrame:
+        in_view = hotspot_index.query_bbox(*viewport_bounds(city.config.lat, city.config.lon, zoom))
+        return cluster_hotspots(hotspot_data.iloc[in_view], zoom)
+    return city.memo(("hotspot_clusters", zoom), version, build)
+
+@profiled
+def create_story_map(map_data: pd.DataFrame, hotspot_data: pd.DataFrame, hotspot_index: HotspotIndex):
+    """Plotly map of the story locations over server-clustered hotspots"""
+    city = current_city().config
     
-    # Create sample map data with stories
-    map_data = pd.DataFrame({
-        'lat': [51.5074, 51.5155, 51.5033, 51.5200, 51.5085],
-        'lon': [-0.1278, -0.1123, -0.1195, -0.1050, -0.1400],
-        'name': ['Death Junction', 'School Zone Chaos', 'Pothole Paradise', 'Rush Hour Nightmare', 'Weather Trap'],
-        'story': [
-            'Sarah hits the brakes here every morning - 247 cyclists do the same',
-            'Parents avoid this route with kids - visibility issues at drop-off time',
-            'Mike\'s bike tire got damaged here last week - rough surface conditions',
-            'Evening commuters bottleneck here - needs better traffic flow',
-            'Emma slips here when it rains - drainage problems'
-        ],
-        'severity': [9, 7, 6, 8, 7],
-        'affected_daily': [247, 156, 89, 312, 134],
-        'fix_cost': [2500, 15000, 12000, 45000, 18000]
-    })
+    # Only hotspots inside the current viewport are sent to the map,
+    # clustered on the server until the map is zoomed in far enough
+    center_lat, center_lon = city.lat, city.lon
+    zoom = st.select_slider("🔍 Map detail", options=list(range(10, RAW_POINT_ZOOM + 2)), value=city.zoom)
+    clusters = get_hotspot_clusters(data_version(), zoom, hotspot_data, hotspot_index)
     
     # Create the map
     fig = px.scatter_mapbox(
@@ -884,43 +848,102 @@ def create_interactive_map_with_stories():
         },
         color_continuous_scale="Reds",
         size_max=25,
-        zoom=12,
+        zoom=zoom,
+        center={"lat": center_lat, "lon": center_lon},
         mapbox_style="carto-positron",
         title="Click on any hotspot to hear its story"
     )
     
+    risk_colors = {'Critical': '#d9534f', 'High': '#f0ad4e', 'Medium': '#4facfe', 'Low': '#5cb85c'}
+    fig.add_trace(go.Scattermapbox(
+        lat=clusters['lat'],
+        lon=clusters['lon'],
+        mode='markers',
+        marker=dict(
+            size=7 + 4 * np.log2(clusters['hotspot_count']),
+            color=clusters['risk_level'].map(risk_colors).fillna('#999999'),
+            opacity=0.6
+        ),
+        text=clusters['label'],
+        customdata=clusters[['risk_level', 'affected_cyclists']],
+        hovertemplate="<b>%{text}</b><br>Worst risk: %{customdata[0]}<br>Affected cyclists: %{customdata[1]}<extra></extra>",
+        name="Detected hotspots",
+        showlegend=False
+    ))
+    
     fig.update_layout(
         height=500,
         margin=dict(l=0, r=0, t=30, b=0)
     )
     
     st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+@profiled
+def create_interactive_map_with_stories(hotspot_data: pd.DataFrame):
+    """Create an interactive map that tells stories"""
+    st.markdown("""
+    <div class="interactive-map-container">
+        <h3 style="text-align: center; padding: 20px; margin: 0; background: rgba(79, 172, 254, 0.1);">
+            🗺️ Your City's Safety Story Map
+        </h3>
+    </div>
+    """, unsafe_allow_html=True)
     
-    # Story selector
+    map_data = get_story_points()
+    hotspot_index = get_hotspot_index(data_version(), hotspot_data)
+    
+    # The story map draws clustered hotspots with Plotly; the other modes hand
+    # every hotspot to deck.gl, which aggregates them in the browser
+    map_mode = st.radio("Map style", ["Story map"] + DECK_MODES, horizontal=True, key="map_mode")
+    if map_mode != "Story map":
+        show_streets = st.toggle("Show street risk", key="map_streets")
+        st.pydeck_chart(get_hotspot_deck(map_mode, show_streets, hotspot_data), use_container_width=True)
+    else:
+        create_story_map(map_data, hotspot_data, hotspot_index)
+    
+    # Story selector: every hotspot has a cached story, so the list is narrowed by
+    # a name search rather than sending every location to the browser each run
+    story_cache = get_story_cache()
+    search = st.text_input("🔎 Find a location", placeholder=f"Search {len(story_cache):,} locations by name",
+                           key="story_search")
+    matches = story_cache.search(search)
+    if matches.empty:
+        st.info("No location matches that name.")
+        return
+    names = dict(zip(matches['location_id'].tolist(), matches['location_name'].tolist()))
     selected_location = st.selectbox(
         "🎭 Choose a location to hear its story:",
-        options=map_data['name'].tolist(),
+        options=list(names),
+        format_func=names.get,
         index=0
     )
     
-    if selected_location:
-        location_data = map_data[map_data['name'] == selected_location].iloc[0]
+    if selected_location is not None:
+        location_data = story_cache.get(selected_location)
         
-        st.markdown(f"""
-        <div class="story-card">
-            <h4 style="color: #4facfe; margin-bottom: 15px;">📍 {location_data['name']}</h4>
-            <p style="font-size: 16px; line-height: 1.6; margin-bottom: 20px;">
-                {location_data['story']}
-            </p>
-            <div style="display: flex; justify-content: space-between; flex-wrap: wrap; background: #f8f9fa; padding: 15px; border-radius: 8px;">
-                <div><strong>Daily Impact:</strong> {location_data['affected_daily']} cyclists</div>
-                <div><strong>Severity:</strong> {location_data['severity']}/10</div>
-                <div><strong>Fix Cost:</strong> ${location_data['fix_cost']:,}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        # Hotspots around the story location
+        nearby = hotspot_data.iloc[hotspot_index.within_radius(location_data['lat'], location_data['lon'], 500)]
+        nearest_positions, nearest_distances = hotspot_index.nearest(location_data['lat'], location_data['lon'], k=3)
+        nearest_names = ", ".join(
+            f"{name} ({distance:.0f} m)"
+            for name, distance in zip(hotspot_data['location_name'].iloc[nearest_positions], nearest_distances)
+        )
+        
+        st.markdown(render_template(
+            "location_story.html",
+            name=location_data['location_name'],
+            story=location_data['story'],
+            affected_daily=int(location_data['affected_daily']),
+            severity=int(location_data['severity']),
+            fix_cost=int(location_data['fix_cost']),
+            nearby_count=len(nearby),
+            nearby_affected=int(nearby['affected_cyclists'].sum()),
+            nearest=nearest_names
+        ), unsafe_allow_html=True)
 
-def create_progress_tracking():
+@profiled
+def create_progress_tracking(route_data: pd.DataFrame):
     """Create progress tracking with celebration"""
     st.markdown("""
     <div class="conversation-flow">
@@ -930,8 +953,9 @@ def create_progress_tracking():
     """, unsafe_allow_html=True)
     
     # Create progress metrics
+    network_score = round(float(get_route_scores(data_version(), route_data).mean()), 1)
     progress_data = {
-        "Overall Safety Score": {"current": 8.4, "target": 9.5, "unit": "/10"},
+        "Overall Safety Score": {"current": network_score, "target": 9.5, "unit": "/10"},
         "Monthly Incidents": {"current": 47, "target": 25, "unit": "", "reverse": True},
         "Cyclist Confidence": {"current": 73, "target": 90, "unit": "%"},
         "Infrastructure Quality": {"current": 6.8, "target": 8.5, "unit": "/10"}
@@ -948,26 +972,16 @@ def create_progress_tracking():
                 progress = min(1, data["current"] / data["target"])
                 progress_pct = progress * 100
             
-            st.markdown(f"""
-            <div style="background: white; padding: 20px; border-radius: 15px; margin: 10px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.1);">
-                <h4 style="margin-bottom: 15px; color: #333;">{metric}</h4>
-                <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
-                    <span style="font-size: 1.5rem; font-weight: bold; color: #4facfe;">
-                        {data['current']}{data['unit']}
-                    </span>
-                    <span style="color: #666;">
-                        Target: {data['target']}{data['unit']}
-                    </span>
-                </div>
-                <div style="background: #e9ecef; height: 10px; border-radius: 5px; overflow: hidden;">
-                    <div style="background: linear-gradient(90deg, #4facfe, #00f2fe); height: 100%; width: {progress_pct}%; transition: width 1s ease;"></div>
-                </div>
-                <div style="text-align: center; margin-top: 10px; font-size: 14px; color: #666;">
-                    {progress_pct:.0f}% to target
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(render_template(
+                "progress_metric.html",
+                metric=metric,
+                current=data['current'],
+                target=data['target'],
+                unit=data['unit'],
+                progress_pct=progress_pct
+            ), unsafe_allow_html=True)
 
+@profiled
 def create_celebration_moments():
     """Create celebration moments for achievements"""
     achievements = [
@@ -983,330 +997,371 @@ def create_celebration_moments():
     """, unsafe_allow_html=True)
     
     for achievement in achievements:
-        st.markdown(f"""
-        <div style="background: rgba(255,255,255,0.8); padding: 10px; margin: 8px 0; border-radius: 10px;">
-            {achievement}
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(render_template("achievement.html", achievement=achievement), unsafe_allow_html=True)
     
     st.markdown("</div>", unsafe_allow_html=True)
 
-def main():
-    # Load CSS
-    load_revolutionary_css()
-    
-    # Load data
-    route_data, hotspot_data = load_narrative_data()
-    
-    # Create hero section
-    create_hero_section()
-    
-    # AI Chat Interface
-    st.markdown("## 🤖 Start with a Question")
-    create_ai_chat_interface()
-    
-    # Main dashboard tabs with user-friendly names
-    tabs = st.tabs([
-        "🏠 My City Dashboard", 
-        "📖 Safety Stories", 
-        "🎯 Action Plan",
-        "📊 Progress Tracker",
-        "🎮 What-If Simulator"
-    ])
-    
-    # Tab 1: My City Dashboard
-    with tabs[0]:
-        st.markdown("## 🏙️ Your City at a Glance")
-        
-        # Key metrics in an engaging way
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.markdown("""
-            <div class="metric-hero">
-                <div class="metric-value">8.4</div>
-                <div class="metric-label">Safety Score</div>
-                <div style="font-size: 14px; margin-top: 10px; opacity: 0.8;">
-                    📈 +0.6 this month
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown("""
-            <div class="metric-hero">
-                <div class="metric-value">2,847</div>
-                <div class="metric-label">Daily Cyclists</div>
-                <div style="font-size: 14px; margin-top: 10px; opacity: 0.8;">
-                    🚴 +12% vs last year
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown("""
-            <div class="metric-hero">
-                <div class="metric-value">5</div>
-                <div class="metric-label">Priority Areas</div>
-                <div style="font-size: 14px; margin-top: 10px; opacity: 0.8;">
-                    🎯 Quick wins available
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Conversational insights
-        create_conversational_insights()
-        
-        # Interactive map with stories
-        create_interactive_map_with_stories()
-        
-        # Gamification elements
-        create_gamified_dashboard()
+def render_dashboard_tab():
+    """Render the My City Dashboard tab"""
+    _, hotspot_data = load_narrative_data(*TAB_COLUMNS["dashboard"])
     
-    # Tab 2: Safety Stories
-    with tabs[1]:
-        st.markdown("## 📚 Your City's Safety Stories")
-        st.markdown("Every data point represents real people. Here are their stories:")
-        
-        # Story selection
-        story_type = st.selectbox(
-            "Choose a story to explore:",
-            ["The Junction Problem", "Rainy Day Challenges", "The Missing Link"],
-            index=0
-        )
-        
-        if story_type == "The Junction Problem":
-            story_data = ai_system.generate_story("junction_safety")
-        elif story_type == "Rainy Day Challenges":
-            story_data = ai_system.generate_story("weather_impact")
+    st.markdown(f"## 🏙️ {current_city().config.name} at a Glance")
+    
+    # Key metrics in an engaging way
+    col1, col2, col3 = st.columns(3)
+    
+    headline = get_rollup_cube().headline()
+    safety_change, cyclists_change = headline["safety_change"], headline["cyclists_change_pct"]
+    
+    with col1:
+        note = f"{'📈' if safety_change >= 0 else '📉'} {safety_change:+.1f} this month" if not math.isnan(safety_change) else "📈 Tracking monthly"
+        st.markdown(render_template("metric_hero.html", value=f"{headline['safety_score']:.1f}", label="Safety Score", note=note), unsafe_allow_html=True)
+    
+    with col2:
+        note = f"🚴 {cyclists_change:+.0f}% vs last month" if not math.isnan(cyclists_change) else "🚴 Across the network"
+        st.markdown(render_template("metric_hero.html", value=f"{headline['daily_cyclists']:,.0f}", label="Daily Cyclists", note=note), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown(render_template("metric_hero.html", value=f"{headline['priority_areas']:.0f}", label="Priority Areas", note="🎯 Quick wins available"), unsafe_allow_html=True)
+    
+    # Conversational insights
+    create_conversational_insights()
+    
+    # Interactive map with stories
+    create_interactive_map_with_stories(hotspot_data)
+    
+    # Safest way between two story locations
+    create_route_planner()
+    
+    # Gamification elements
+    create_gamified_dashboard()
+
+@st.fragment
+@profiled
+def create_route_planner():
+    """Plan the safest ride between two locations - its widgets rerun only this fragment"""
+    st.markdown("### 🧭 Plan a Safer Ride")
+    places = get_story_points().set_index('name')
+    col1, col2 = st.columns(2)
+    with col1:
+        origin = st.selectbox("From", places.index.tolist(), index=0, key="ride_from")
+    with col2:
+        destination = st.selectbox("To", places.index.tolist(), index=len(places) - 1, key="ride_to")
+    if origin == destination:
+        st.info("Pick two different places to plan a ride between them.")
+        return
+    
+    planner = get_route_planner()
+    ride = planner.plan(tuple(places.loc[origin, ['lat', 'lon']]), tuple(places.loc[destination, ['lat', 'lon']]))
+    if ride is None:
+        st.warning("These places aren't connected by the cycle network yet.")
+        return
+    
+    fig = go.Figure(go.Scattermapbox(
+        lat=ride['lat'], lon=ride['lon'], mode='lines',
+        line=dict(width=5, color='#2ecc71'), name="Safest route", hoverinfo='skip'
+    ))
+    fig.add_trace(go.Scattermapbox(
+        lat=places.loc[[origin, destination], 'lat'], lon=places.loc[[origin, destination], 'lon'],
+        mode='markers+text', text=[origin, destination], textposition="top right",
+        marker=dict(size=12, color='#4facfe'), name="Stops"
+    ))
+    fig.update_layout(
+        mapbox=dict(style="carto-positron", zoom=13,
+                    center=dict(lat=float(np.mean(ride['lat'])), lon=float(np.mean(ride['lon'])))),
+        height=350, margin=dict(l=0, r=0, t=0, b=0), showlegend=False
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    protected_share = ride['protected_m'] / ride['length_m'] if ride['length_m'] else 0.0
+    st.markdown(
+        f"🚴 **{ride['length_m'] / 1000:.1f} km**, {protected_share:.0%} on protected lanes, "
+        f"via {', '.join(ride['streets'][:4])}{'…' if len(ride['streets']) > 4 else ''}"
+    )
+    st.caption(f"⚡ Planned in {ride['elapsed_ms']:.1f} ms{' (cached)' if ride['cached'] else ''}")
+
+@st.fragment
+@profiled
+def create_story_explorer():
+    """Create the story selector and card - changing the story reruns only this fragment"""
+    story_type = st.selectbox(
+        "Choose a story to explore:",
+        ["The Junction Problem", "Rainy Day Challenges", "The Missing Link"],
+        index=0
+    )
+    
+    if story_type == "The Junction Problem":
+        story_data = get_ai_system().generate_story("junction_safety", story_cache=get_story_cache())
+    elif story_type == "Rainy Day Challenges":
+        story_data = get_ai_system().generate_story("weather_impact", story_cache=get_story_cache())
+    else:
+        missing_links = get_missing_links()
+        daily_cyclists = get_rollup_cube().headline()["daily_cyclists"]
+        story_data = get_ai_system().generate_story("infrastructure_gap", missing_links, daily_cyclists)
+    
+    if story_data:
+        create_story_card(story_data)
+    
+    if story_type == "The Missing Link" and not missing_links.empty:
+        st.markdown("#### 🔗 Other gaps in your protected network")
+        top = missing_links.head(5)
+        st.dataframe(pd.DataFrame({
+            "Street": top["street"],
+            "Gap (m)": top["length_m"].round().astype(int),
+            "Share of trips": (top["flow_share"] * 100).round(1).astype(str) + "%",
+            "Est. cost": top["cost"].map(lambda cost: f"${cost:,.0f}"),
+        }), use_container_width=True, hide_index=True)
+
+def render_stories_tab():
+    """Render the Safety Stories tab"""
+    st.markdown("## 📚 Your City's Safety Stories")
+    st.markdown("Every data point represents real people. Here are their stories:")
+    
+    # Story selection
+    create_story_explorer()
+    
+    # Before and after visualization
+    create_before_after_visualization()
+    
+    # User personas and their journeys
+    st.markdown("### 👥 Meet Your Cyclists")
+    
+    personas = [
+        {
+            "name": "Sarah the Commuter",
+            "emoji": "👩‍💼",
+            "description": "Cycles 8km daily to work, values speed and predictability",
+            "main_concern": "Traffic signal timing and junction safety",
+            "current_satisfaction": "7/10"
+        },
+        {
+            "name": "Mike the Family Man",
+            "emoji": "👨‍👩‍👧‍👦",
+            "description": "Weekend rides with kids, prioritizes safety above all",
+            "main_concern": "Protected lanes and surface quality",
+            "current_satisfaction": "6/10"
+        },
+        {
+            "name": "Emma the Fitness Enthusiast",
+            "emoji": "🏃‍♀️",
+            "description": "Long recreational rides, loves exploring new routes",
+            "main_concern": "Route connectivity and weather resilience",
+            "current_satisfaction": "8/10"
+        }
+    ]
+    
+    for persona in personas:
+        st.markdown(render_template("persona_card.html", **persona), unsafe_allow_html=True)
+
+def render_action_plan_tab():
+    """Render the Action Plan tab"""
+    _, hotspot_data = load_narrative_data(*TAB_COLUMNS["action_plan"])
+    
+    st.markdown("## 🎯 Your Personalized Action Plan")
+    
+    # Smart recommendations
+    create_smart_recommendations(hotspot_data)
+    
+    # Priority matrix
+    create_priority_matrix()
+    
+    # Implementation timeline
+    st.markdown("### 📅 Implementation Timeline")
+    
+    timeline_data = [
+        {"week": "Week 1", "action": "Install warning signs", "status": "ready"},
+        {"week": "Week 2-3", "action": "Adjust traffic signals", "status": "ready"},
+        {"week": "Week 4-7", "action": "Repair surface issues", "status": "planning"},
+        {"week": "Week 8-14", "action": "Complete bike lane gap", "status": "planning"},
+    ]
+    
+    for item in timeline_data:
+        st.markdown(render_template("timeline_item.html", **item), unsafe_allow_html=True)
+
+# Trend chart periods, in months back from the latest data (None = full history)
+TREND_WINDOWS = {"6 months": 6, "1 year": 12, "3 years": 36, "All": None}
+TREND_LABELS = {"daily": "Daily", "weekly": "Weekly", "monthly": "Monthly"}
+
+def render_progress_tab():
+    """Render the Progress Tracker tab"""
+    route_data, _ = load_narrative_data(*TAB_COLUMNS["progress"])
+    
+    st.markdown("## 📈 Track Your Success")
+    
+    # Progress tracking
+    create_progress_tracking(route_data)
+    
+    # Celebration moments
+    create_celebration_moments()
+    
+    # Trend analysis in simple terms
+    st.markdown("### 📊 Your Safety Trends")
+    
+    # Trend history comes from the time-series store, downsampled to the chart width
+    series = get_time_series()
+    col1, col2 = st.columns(2)
+    with col1:
+        area = st.selectbox("Area", ["Whole city"] + AREAS, key="trend_area")
+    with col2:
+        window = st.radio("Period", list(TREND_WINDOWS), index=1, horizontal=True, key="trend_window")
+    key = series_key(area=None if area == "Whole city" else area)
+    first, last = series.span(key)
+    months = TREND_WINDOWS[window]
+    start = max(first, (last.to_period("M") - months + 1).start_time) if months else first
+    incidents, level = series.query(key, "incidents", start, last, CHART_WIDTH_PX)
+    satisfaction, _ = series.query(key, "satisfaction", start, last, CHART_WIDTH_PX)
+    
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    
+    fig.add_trace(
+        go.Scatter(x=incidents.index, y=incidents.round().to_numpy(), name=f"{TREND_LABELS[level]} Incidents",
+                  line=dict(color='#e74c3c', width=2), mode='lines'),
+        secondary_y=False,
+    )
+    
+    fig.add_trace(
+        go.Scatter(x=satisfaction.index, y=satisfaction.round(1).to_numpy(), name="Cyclist Satisfaction",
+                  line=dict(color='#2ecc71', width=2), mode='lines'),
+        secondary_y=True,
+    )
+    
+    fig.update_xaxes(title_text="Date")
+    fig.update_yaxes(title_text=f"{TREND_LABELS[level]} Incidents", secondary_y=False)
+    fig.update_yaxes(title_text="Satisfaction (%)", secondary_y=True)
+    
+    fig.update_layout(
+        title="Your City's Safety Journey",
+        height=400,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Whole months only, so a partial first month does not skew the comparison
+    monthly = series.level("monthly", key, "incidents", start, last)
+    if len(monthly) >= 2 and monthly.iloc[0]:
+        change = (monthly.iloc[-1] / monthly.iloc[0] - 1) * 100
+        since = monthly.index[0].strftime('%b %Y')
+        if change < 0:
+            st.info(f"📈 **What this means:** You're on the right track! Monthly incidents are down {abs(change):.0f}% since {since}. Keep an eye on satisfaction too - it measures how safe cyclists feel, not just the numbers.")
         else:
-            story_data = ai_system.generate_story("infrastructure_gap")
-        
-        if story_data:
-            create_story_card(story_data)
-        
-        # Before and after visualization
-        create_before_after_visualization()
-        
-        # User personas and their journeys
-        st.markdown("### 👥 Meet Your Cyclists")
-        
-        personas = [
-            {
-                "name": "Sarah the Commuter",
-                "emoji": "👩‍💼",
-                "description": "Cycles 8km daily to work, values speed and predictability",
-                "main_concern": "Traffic signal timing and junction safety",
-                "current_satisfaction": "7/10"
-            },
-            {
-                "name": "Mike the Family Man",
-                "emoji": "👨‍👩‍👧‍👦",
-                "description": "Weekend rides with kids, prioritizes safety above all",
-                "main_concern": "Protected lanes and surface quality",
-                "current_satisfaction": "6/10"
-            },
-            {
-                "name": "Emma the Fitness Enthusiast",
-                "emoji": "🏃‍♀️",
-                "description": "Long recreational rides, loves exploring new routes",
-                "main_concern": "Route connectivity and weather resilience",
-                "current_satisfaction": "8/10"
-            }
-        ]
-        
-        for persona in personas:
-            st.markdown(f"""
-            <div class="story-card">
-                <div style="display: flex; align-items: center; margin-bottom: 15px;">
-                    <span style="font-size: 3rem; margin-right: 20px;">{persona['emoji']}</span>
-                    <div>
-                        <h4 style="margin: 0; color: #4facfe;">{persona['name']}</h4>
-                        <p style="margin: 5px 0; color: #666;">{persona['description']}</p>
-                    </div>
-                </div>
-                <div style="background: #f8f9fa; padding: 15px; border-radius: 8px;">
-                    <p><strong>Main Concern:</strong> {persona['main_concern']}</p>
-                    <p><strong>Current Satisfaction:</strong> {persona['current_satisfaction']}</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.info(f"📉 **What this means:** Monthly incidents are up {change:.0f}% since {since}. The Action Plan tab shows the fixes that would turn this around fastest.")
+
+@st.fragment
+@profiled
+def create_scenario_builder():
+    """Create the build-your-own-scenario panel - its widgets rerun only this fragment"""
+    st.markdown("### 🔧 Build Your Own Scenario")
     
-    # Tab 3: Action Plan
-    with tabs[2]:
-        st.markdown("## 🎯 Your Personalized Action Plan")
-        
-        # Smart recommendations
-        create_smart_recommendations()
-        
-        # Priority matrix
-        create_priority_matrix()
-        
-        # Implementation timeline
-        st.markdown("### 📅 Implementation Timeline")
-        
-        timeline_data = [
-            {"week": "Week 1", "action": "Install warning signs", "status": "ready"},
-            {"week": "Week 2-3", "action": "Adjust traffic signals", "status": "ready"},
-            {"week": "Week 4-7", "action": "Repair surface issues", "status": "planning"},
-            {"week": "Week 8-14", "action": "Complete bike lane gap", "status": "planning"},
-        ]
-        
-        for item in timeline_data:
-            status_color = "#28a745" if item["status"] == "ready" else "#ffc107"
-            status_text = "✅ Ready to Start" if item["status"] == "ready" else "📋 In Planning"
-            
-            st.markdown(f"""
-            <div style="display: flex; align-items: center; padding: 15px; background: white; border-radius: 10px; margin: 10px 0; border-left: 4px solid {status_color};">
-                <div style="font-weight: bold; color: #333; min-width: 100px;">{item['week']}</div>
-                <div style="flex: 1; margin: 0 20px;">{item['action']}</div>
-                <div style="color: {status_color}; font-weight: 500;">{status_text}</div>
-            </div>
-            """, unsafe_allow_html=True)
+    col1, col2 = st.columns(2)
     
-    # Tab 4: Progress Tracker
-    with tabs[3]:
-        st.markdown("## 📈 Track Your Success")
-        
-        # Progress tracking
-        create_progress_tracking()
-        
-        # Celebration moments
-        create_celebration_moments()
-        
-        # Trend analysis in simple terms
-        st.markdown("### 📊 Your Safety Trends")
-        
-        # Create simple trend chart
-        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun']
-        incidents = [65, 58, 52, 48, 45, 47]
-        satisfaction = [68, 71, 74, 76, 78, 73]
-        
-        fig = make_subplots(specs=[[{"secondary_y": True}]])
-        
-        fig.add_trace(
-            go.Scatter(x=months, y=incidents, name="Monthly Incidents", 
-                      line=dict(color='#e74c3c', width=3), mode='lines+markers'),
-            secondary_y=False,
-        )
-        
-        fig.add_trace(
-            go.Scatter(x=months, y=satisfaction, name="Cyclist Satisfaction", 
-                      line=dict(color='#2ecc71', width=3), mode='lines+markers'),
-            secondary_y=True,
-        )
-        
-        fig.update_xaxes(title_text="Month")
-        fig.update_yaxes(title_text="Number of Incidents", secondary_y=False)
-        fig.update_yaxes(title_text="Satisfaction (%)", secondary_y=True)
-        
-        fig.update_layout(
-            title="Your City's Safety Journey",
-            height=400,
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
-        
-        st.info("📈 **What this means:** You're on the right track! Incidents are decreasing, but May's dip in satisfaction suggests we need to focus on cyclist experience, not just numbers.")
+    with col1:
+        budget = st.slider("Available Budget ($)", 10000, 200000, 50000, 5000)
+        timeframe = st.selectbox("Implementation Timeframe", ["1 month", "3 months", "6 months", "1 year"])
+        priority = st.selectbox("Main Priority", ["Reduce incidents", "Improve satisfaction", "Increase ridership"])
     
-    # Tab 5: What-If Simulator
-    with tabs[4]:
-        st.markdown("## 🎮 What-If Simulator")
-        st.markdown("Play with different scenarios to see their impact before you invest!")
-        
-        # Impact simulator
-        create_impact_simulator()
-        
-        # Interactive scenario builder
-        st.markdown("### 🔧 Build Your Own Scenario")
+    with col2:
+        st.markdown("### 🎯 Scenario Results")
         
-        col1, col2 = st.columns(2)
+        # Calculate scenario results based on inputs
+        outcome = simulate_scenario(budget, timeframe, priority)
         
-        with col1:
-            budget = st.slider("Available Budget ($)", 10000, 200000, 50000, 5000)
-            timeframe = st.selectbox("Implementation Timeframe", ["1 month", "3 months", "6 months", "1 year"])
-            priority = st.selectbox("Main Priority", ["Reduce incidents", "Improve satisfaction", "Increase ridership"])
+        st.markdown(render_template("scenario_prediction.html", **outcome), unsafe_allow_html=True)
+    
+    # Scenario comparison
+    st.markdown("### ⚖️ Compare Scenarios")
+    
+    scenarios = pd.DataFrame({
+        'Scenario': ['Quick Fixes Only', 'Balanced Approach', 'Major Infrastructure'],
+        'Cost': ['$15K', '$50K', '$150K'],
+        'Incident Reduction': ['15%', '32%', '68%'],
+        'Timeline': ['1 month', '3 months', '12 months'],
+        'Difficulty': ['Easy', 'Medium', 'Complex']
+    })
+    
+    st.dataframe(scenarios, use_container_width=True)
+    
+    # Final AI recommendation
+    st.markdown("""
+    <div class="ai-recommendation">
+        <h4>🤖 AI Recommendation for Your Scenario</h4>
+        <p>
+            Based on your budget of ${:,} and focus on {}, I recommend the <strong>Balanced Approach</strong>. 
+            You'll see meaningful results within 3 months while staying within budget. 
+            This gives you the best bang for your buck and sets you up for bigger wins later!
+        </p>
+    </div>
+    """.format(budget, priority.lower()), unsafe_allow_html=True)
+
+def render_simulator_tab():
+    """Render the What-If Simulator tab"""
+    route_data, _ = load_narrative_data(*TAB_COLUMNS["simulator"])
+    
+    st.markdown("## 🎮 What-If Simulator")
+    st.markdown("Play with different scenarios to see their impact before you invest!")
+    
+    # Impact simulator
+    create_impact_simulator(route_data)
+    
+    # Interactive scenario builder
+    create_scenario_builder()
+
+TABS = {
+    "🏠 My City Dashboard": render_dashboard_tab,
+    "📖 Safety Stories": render_stories_tab,
+    "🎯 Action Plan": render_action_plan_tab,
+    "📊 Progress Tracker": render_progress_tab,
+    "🎮 What-If Simulator": render_simulator_tab
+}
+
+def main():
+    with profile_run():
+        # Load CSS
+        load_revolutionary_css()
         
-        with col2:
-            st.markdown("### 🎯 Scenario Results")
-            
-            # Calculate scenario results based on inputs
-            if budget >= 45000:
-                impact_level = "High"
-                incident_reduction = 45
-                satisfaction_boost = 18
-            elif budget >= 25000:
-                impact_level = "Medium"
-                incident_reduction = 28
-                satisfaction_boost = 12
-            else:
-                impact_level = "Low"
-                incident_reduction = 15
-                satisfaction_boost = 8
-            
-            st.markdown(f"""
-            <div class="prediction-card">
-                <h4>Predicted Impact: {impact_level}</h4>
-                <div style="margin-top: 20px;">
-                    <div style="font-size: 1.5rem; font-weight: bold; margin-bottom: 10px;">
-                        -{incident_reduction}% incidents
-                    </div>
-                    <div style="font-size: 1.5rem; font-weight: bold; margin-bottom: 10px;">
-                        +{satisfaction_boost}% satisfaction
-                    </div>
-                    <div style="font-size: 1.5rem; font-weight: bold;">
-                        ROI: {random.randint(200, 400)}%
-                    </div>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        # Create hero section
+        create_hero_section()
         
-        # Scenario comparison
-        st.markdown("### ⚖️ Compare Scenarios")
+        # Council selector - kept in the URL so links open on the same city
+        create_city_selector()
         
-        scenarios = pd.DataFrame({
-            'Scenario': ['Quick Fixes Only', 'Balanced Approach', 'Major Infrastructure'],
-            'Cost': ['$15K', '$50K', '$150K'],
-            'Incident Reduction': ['15%', '32%', '68%'],
-            'Timeline': ['1 month', '3 months', '12 months'],
-            'Difficulty': ['Easy', 'Medium', 'Complex']
-        })
+        # AI Chat Interface
+        st.markdown("## 🤖 Start with a Question")
+        create_ai_chat_interface()
         
-        st.dataframe(scenarios, use_container_width=True)
+        # Main dashboard tabs with user-friendly names - only the active one is rendered
+        active_tab = st.radio(
+            "Dashboard section",
+            list(TABS),
+            horizontal=True,
+            label_visibility="collapsed",
+            key="active_tab"
+        )
+        TABS[active_tab]()
         
-        # Final AI recommendation
+        # Footer with support
         st.markdown("""
-        <div class="ai-recommendation">
-            <h4>🤖 AI Recommendation for Your Scenario</h4>
-            <p>
-                Based on your budget of ${:,} and focus on {}, I recommend the <strong>Balanced Approach</strong>. 
-                You'll see meaningful results within 3 months while staying within budget. 
-                This gives you the best bang for your buck and sets you up for bigger wins later!
+        <div style="text-align: center; margin-top: 50px; padding: 30px; background: rgba(255,255,255,0.9); border-radius: 20px;">
+            <h4 style="color: #4facfe; margin-bottom: 15px;">Need Help? We're Here for You! 🤝</h4>
+            <p style="color: #666; margin-bottom: 20px;">
+                Our AI assistant is available 24/7, and our expert team is just a click away.
             </p>
+            <div style="display: flex; justify-content: center; gap: 20px; flex-wrap: wrap;">
+                <button style="background: #4facfe; color: white; border: none; padding: 10px 20px; border-radius: 25px; cursor: pointer;">
+                    💬 Chat with AI
+                </button>
+                <button style="background: #2ecc71; color: white; border: none; padding: 10px 20px; border-radius: 25px; cursor: pointer;">
+                    📞 Schedule Expert Call
+                </button>
+                <button style="background: #e74c3c; color: white; border: none; padding: 10px 20px; border-radius: 25px; cursor: pointer;">
+                    📚 Access Help Center
+                </button>
+            </div>
         </div>
-        """.format(budget, priority.lower()), unsafe_allow_html=True)
+        """, unsafe_allow_html=True)
     
-    # Footer with support
-    st.markdown("""
-    <div style="text-align: center; margin-top: 50px; padding: 30px; background: rgba(255,255,255,0.9); border-radius: 20px;">
-        <h4 style="color: #4facfe; margin-bottom: 15px;">Need Help? We're Here for You! 🤝</h4>
-        <p style="color: #666; margin-bottom: 20px;">
-            Our AI assistant is available 24/7, and our expert team is just a click away.
-        </p>
-        <div style="display: flex; justify-content: center; gap: 20px; flex-wrap: wrap;">
-            <button style="background: #4facfe; color: white; border: none; padding: 10px 20px; border-radius: 25px; cursor: pointer;">
-                💬 Chat with AI
-            </button>
-            <button style="background: #2ecc71; color: white; border: none; padding: 10px 20px; border-radius: 25px; cursor: pointer;">
-                📞 Schedule Expert Call
-            </button>
-            <button style="background: #e74c3c; color: white; border: none; padding: 10px 20px; border-radius: 25px; cursor: pointer;">
-                📚 Access Help Center
-            </button>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    # Opt-in render profile (CYCLESAFE_PROFILE=1 or ?debug=1)
+    render_debug_panel()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,181 @@
+"""Headless rerun-latency benchmark for app.py
+
+Drives the dashboard with Streamlit's AppTest: opens every tab, moves the
+budget sliders and steps through the selectboxes, timing each rerun. Every
+data size runs in a fresh worker process against its own synthetic dataset,
+so module-level caches and peak RSS are measured per size.
+
+    python benchmarks/bench_rerun.py --sizes 1000,100000,1000000 --output bench_results.json
+
+Results are written as JSON (one entry per size, with p50/p95 per
+interaction) so runs from different commits can be diffed directly.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parent.parent
+APP_SCRIPT = APP_DIR / "app.py"
+
+
+def _find(widgets, label: str):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No widget labelled {label!r} on the current page")
+
+
+def _interactions(at) -> List:
+    """(name, callable) steps for one pass over the app; each callable triggers one rerun"""
+    steps = []
+
+    def select_tab(option):
+        return lambda: at.radio(key="active_tab").set_value(option).run()
+
+    def set_widget(kind, label, value):
+        return lambda: _find(getattr(at, kind), label).set_value(value).run()
+
+    tabs = at.radio(key="active_tab").options
+    for option in tabs:
+        steps.append((f"tab:{option}", select_tab(option)))
+        if "Dashboard" in option:
+            for zoom in (11, 14):
+                steps.append(("map_detail", set_widget("select_slider", "🔍 Map detail", zoom)))
+        elif "Stories" in option:
+            steps.append(("story_type", set_widget("selectbox", "Choose a story to explore:", "The Missing Link")))
+        elif "Action" in option:
+            for budget in (20000, 120000, 200000):
+                steps.append(("plan_budget", set_widget("slider", "Your improvement budget ($)", budget)))
+        elif "Simulator" in option:
+            steps.append(("scenario_budget", set_widget("slider", "Available Budget ($)", 150000)))
+            steps.append(("scenario_timeframe", set_widget("selectbox", "Implementation Timeframe", "1 year")))
+            steps.append(("scenario_priority", set_widget("selectbox", "Main Priority", "Improve satisfaction")))
+    return steps
+
+
+def _summary(seconds: List[float]) -> Dict:
+    values = np.asarray(seconds) * 1000
+    return {
+        "runs": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def run_worker(routes: int, hotspots: int, repeats: int, timeout: float) -> Dict:
+    """Benchmark one data size in this process (invoked via --worker)"""
+    sys.path.insert(0, str(APP_DIR))
+    from streamlit.testing.v1 import AppTest
+
+    from data_store import NarrativeDataStore
+
+    start = time.perf_counter()
+    NarrativeDataStore(os.environ["CYCLESAFE_DATA_DIR"]).ensure_sample_data(routes, hotspots)
+    prepare_seconds = time.perf_counter() - start
+
+    at = AppTest.from_file(str(APP_SCRIPT), default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    cold_seconds = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"App raised on first run: {at.exception[0].value}")
+
+    timings: Dict[str, List[float]] = {}
+    for _ in range(repeats):
+        for name, step in _interactions(at):
+            start = time.perf_counter()
+            step()
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+            if at.exception:
+                raise RuntimeError(f"App raised during {name}: {at.exception[0].value}")
+
+    return {
+        "routes": routes,
+        "hotspots": hotspots,
+        "data_prepare_seconds": round(prepare_seconds, 3),
+        "cold_run_ms": round(cold_seconds * 1000, 2),
+        "rerun": _summary([t for runs in timings.values() for t in runs]),
+        "interactions": {name: _summary(runs) for name, runs in timings.items()},
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="comma-separated synthetic route counts")
+    parser.add_argument("--hotspot-ratio", type=float, default=0.1,
+                        help="hotspots generated per route")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over every interaction")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds allowed per rerun")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--routes", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--hotspots", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.routes, args.hotspots, args.repeats, args.timeout)))
+        return
+
+    import streamlit
+
+    results = []
+    for routes in (int(size) for size in args.sizes.split(",")):
+        hotspots = max(1, int(routes * args.hotspot_ratio))
+        with tempfile.TemporaryDirectory(prefix="cyclesafe-bench-") as data_dir:
+            # Offline: no LLM endpoint, so chat falls back to the canned answers
+            env = {key: value for key, value in os.environ.items()
+                   if key not in ("CYCLESAFE_LLM_URL", "GROQ_API_KEY", "CYCLESAFE_PROFILE")}
+            env["CYCLESAFE_DATA_DIR"] = data_dir
+            print(f"Benchmarking {routes:,} routes / {hotspots:,} hotspots...", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", "--routes", str(routes), "--hotspots", str(hotspots),
+                 "--repeats", str(args.repeats), "--timeout", str(args.timeout)],
+                env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                results.append({"routes": routes, "hotspots": hotspots, "error": proc.stderr.strip().splitlines()[-1:]})
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"  p50 {result['rerun']['p50_ms']} ms, p95 {result['rerun']['p95_ms']} ms, "
+                  f"peak {result['peak_rss_mb']} MB", file=sys.stderr)
+            results.append(result)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeats": args.repeats,
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATA_DIR, NarrativeDataStore
+from event_ingest import HotspotAggregator
+from street_network import StreetNetworkStore
+from timeseries import TimeSeriesStore
+
+DEFAULT_CITY = os.environ.get("CYCLESAFE_DEFAULT_CITY", "london")
+# Total memory all loaded cities may hold before the least recently used are dropped
+CITY_CACHE_MB = int(os.environ.get("CYCLESAFE_CITY_CACHE_MB", 1024))
+
+
+@dataclass(frozen=True)
+class CityConfig:
+    slug: str
+    name: str
+    lat: float
+    lon: float
+    zoom: int = 12
+
+
+CITIES = {
+    config.slug: config for config in [
+        CityConfig("london", "London", 51.5074, -0.1278),
+        CityConfig("manchester", "Manchester", 53.4808, -2.2426),
+        CityConfig("birmingham", "Birmingham", 52.4862, -1.8904),
+        CityConfig("bristol", "Bristol", 51.4545, -2.5879),
+        CityConfig("leeds", "Leeds", 53.8008, -1.5491),
+        CityConfig("edinburgh", "Edinburgh", 55.9533, -3.1883),
+        CityConfig("dublin", "Dublin", 53.3498, -6.2603),
+    ]
+}
+
+
+def load_city_configs(root: str = DATA_DIR) -> Dict[str, CityConfig]:
+    """Built-in cities plus any listed in <root>/cities.json ({slug: {name, lat, lon[, zoom]}})"""
+    configs = dict(CITIES)
+    path = Path(root) / "cities.json"
+    if path.exists():
+        for slug, entry in json.loads(path.read_text()).items():
+            configs[slug] = CityConfig(slug, **entry)
+    return configs
+
+
+def city_data_dir(slug: str, root: str = DATA_DIR) -> Path:
+    """Each city's tables live in <root>/<slug>; a pre-tenancy single-city layout serves the default city"""
+    legacy = Path(root)
+    if slug == DEFAULT_CITY and (legacy / "routes").exists() and not (legacy / slug).exists():
+        return legacy
+    return legacy / slug
+
+
+def estimate_bytes(value: Any) -> int:
+    """Approximate resident size of a cached artifact"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_bytes(item) for item in value.values())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class CityData:
+    """One city's data store, live aggregates and everything derived from them
+
+    Derived artifacts (frames, indexes, feature matrices) are memoised per
+    data version and counted against the owning CityCache's memory budget.
+    """
+
+    def __init__(self, config: CityConfig, root: Path, on_grow: Callable[[str], None]):
+        self.config = config
+        self.store = NarrativeDataStore(str(root))
+        seed = zlib.crc32(config.slug.encode())
+        self.store.ensure_sample_data(center=(config.lat, config.lon), seed=seed)
+        self.aggregator = HotspotAggregator(str(root))
+        self.timeseries = TimeSeriesStore(str(root))
+        self.timeseries.ensure_sample_data(self.store, seed=seed)
+        self.network = StreetNetworkStore(str(root))
+        self.network.ensure_sample_data((config.lat, config.lon), seed=seed)
+        self._artifacts: Dict[Hashable, Tuple[str, Any, int]] = {}
+        # One builder per key: concurrent misses wait for it instead of building again
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._on_grow = on_grow
+
+    @property
+    def version(self) -> str:
+        return f"{self.config.slug}:{self.store.version}+{self.aggregator.version}"
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(size for _, _, size in self._artifacts.values())
+
+    def memo(self, key: Hashable, version: str, build: Callable[[], Any]) -> Any:
+        """Cached artifact for key at this data version, built (and sized) on a miss"""
+        with self._lock:
+            hit = self._artifacts.get(key)
+            if hit is not None and hit[0] == version:
+                return hit[1]
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            with self._lock:
+                hit = self._artifacts.get(key)
+            if hit is not None and hit[0] == version:
+                return hit[1]
+            value = build()
+            with self._lock:
+                self._artifacts[key] = (version, value, estimate_bytes(value))
+        self._on_grow(self.config.slug)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._artifacts.clear()
+
+
+class CityCache:
+    """Loaded cities in least-recently-used order, evicted to stay under a total memory budget"""
+
+    def __init__(self, budget_mb: int = CITY_CACHE_MB, root: str = DATA_DIR):
+        self.budget_bytes = budget_mb * 2**20
+        self.root = root
+        self.configs = load_city_configs(root)
+        self._cities: "OrderedDict[str, CityData]" = OrderedDict()
+        # Per-city load locks, so a cold city's sample data and stores are set up once
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, slug: str) -> CityData:
+        config = self.configs[slug]
+        with self._lock:
+            city = self._cities.get(slug)
+            if city is not None:
+                self._cities.move_to_end(slug)
+                return city
+            loading = self._loading.setdefault(slug, threading.Lock())
+        with loading:
+            with self._lock:
+                city = self._cities.get(slug)
+                if city is not None:
+                    self._cities.move_to_end(slug)
+                    return city
+            city = CityData(config, city_data_dir(slug, self.root), self._enforce_budget)
+            with self._lock:
+                self._cities[slug] = city
+                self._loading.pop(slug, None)
+        return city
+
+    def _enforce_budget(self, keep: str):
+        """Drop least recently used cities (never the one just used) until under budget"""
+        with self._lock:
+            total = sum(city.nbytes for city in self._cities.values())
+            for slug in list(self._cities):
+                if total <= self.budget_bytes:
+                    break
+                if slug == keep:
+                    continue
+                evicted = self._cities.pop(slug)
+                total -= evicted.nbytes
+                evicted.clear()
+                self.evictions += 1
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [{"city": slug, "mb": round(city.nbytes / 2**20, 2)} for slug, city in self._cities.items()]
+
+
+def resolve_city(requested: Optional[str], configs: Dict[str, CityConfig]) -> str:
+    """Slug for a ?city= value, falling back to the default city"""
+    slug = (requested or "").strip().lower()
+    return slug if slug in configs else DEFAULT_CITY
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+# Where the partitioned route/hotspot tables live on disk
+DATA_DIR = os.environ.get("CYCLESAFE_DATA_DIR", "data")
+
+# Size of the generated sample dataset when no real data has been ingested
+SAMPLE_ROUTES = int(os.environ.get("CYCLESAFE_SAMPLE_ROUTES", 1000))
+SAMPLE_HOTSPOTS = int(os.environ.get("CYCLESAFE_SAMPLE_HOTSPOTS", 100))
+
+# Hive partition keys used when writing each table
+PARTITION_COLUMNS = {
+    "routes": ["community_priority"],
+    "hotspots": ["risk_level"],
+}
+
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+AREAS = ['City Centre', 'North', 'South', 'East', 'West']
+TIME_SLOTS = ['Morning Rush', 'Midday', 'Evening Rush', 'Night']
+# Months covered by the sample data, oldest first
+SAMPLE_MONTHS = [f"2025-{m:02d}" for m in range(1, 7)]
+
+
+def generate_sample_data(n_routes: int = 1000, n_hotspots: int = 100, seed: int = 42,
+                         center: Tuple[float, float] = (51.55, -0.10)):
+    """Generate reproducible sample route and hotspot tables around a city centre"""
+    rng = np.random.default_rng(seed)
+
+    # Create realistic route data with personas
+    route_stories = pd.DataFrame({
+        'route_id': np.arange(1, n_routes + 1),
+        'route_name': [f"Route {i}" for i in range(1, n_routes + 1)],
+        'primary_users': rng.choice(['Commuters', 'Families', 'Fitness Enthusiasts', 'Students'], n_routes),
+        'safety_score': rng.beta(3, 1, n_routes) * 10,  # Skewed toward higher scores
+        'daily_cyclists': rng.poisson(50, n_routes),
+        'incident_rate': rng.exponential(0.5, n_routes),  # expected incidents per month
+        'infrastructure_quality': rng.choice(['Excellent', 'Good', 'Fair', 'Poor'], n_routes, p=[0.1, 0.3, 0.4, 0.2]),
+        'weather_resilience': rng.uniform(0.3, 1.0, n_routes),
+        'accessibility_score': rng.uniform(0.2, 1.0, n_routes),
+        'community_priority': rng.choice(['High', 'Medium', 'Low'], n_routes, p=[0.2, 0.5, 0.3])
+    })
+
+    # Create hotspot data with contextual information
+    hotspot_stories = pd.DataFrame({
+        'location_id': np.arange(1, n_hotspots + 1),
+        'location_name': [f"Location {i}" for i in range(1, n_hotspots + 1)],
+        'location_type': rng.choice(['School Zone', 'Business District', 'Residential', 'Park Area', 'Transit Hub'], n_hotspots),
+        'lat': rng.uniform(center[0] - 0.05, center[0] + 0.05, n_hotspots),
+        'lon': rng.uniform(center[1] - 0.05, center[1] + 0.05, n_hotspots),
+        'risk_level': rng.choice(['Critical', 'High', 'Medium', 'Low'], n_hotspots, p=[0.1, 0.2, 0.4, 0.3]),
+        'affected_cyclists': rng.poisson(30, n_hotspots),
+        'incident_type': rng.choice(['Sudden Braking', 'Swerving', 'Conflicts', 'Surface Issues'], n_hotspots),
+        'time_of_day': rng.choice(TIME_SLOTS, n_hotspots),
+        'fix_complexity': rng.choice(['Quick Fix', 'Moderate', 'Complex'], n_hotspots, p=[0.4, 0.4, 0.2]),
+        'estimated_cost': rng.lognormal(8, 1, n_hotspots),  # Realistic cost distribution
+        'community_impact': rng.uniform(0.3, 1.0, n_hotspots)
+    })
+
+    # Where and when each row was observed; incidents ease off month by month
+    month_index = rng.integers(0, len(SAMPLE_MONTHS), n_routes)
+    route_stories['area'] = rng.choice(AREAS, n_routes)
+    route_stories['time_of_day'] = rng.choice(TIME_SLOTS, n_routes)
+    route_stories['month'] = np.asarray(SAMPLE_MONTHS)[month_index]
+    route_stories['incident_rate'] *= 1.3 - 0.06 * month_index
+    hotspot_stories['area'] = rng.choice(AREAS, n_hotspots)
+    hotspot_stories['month'] = rng.choice(SAMPLE_MONTHS, n_hotspots)
+
+    return route_stories, hotspot_stories
+
+
+def write_table(df: pd.DataFrame, path: str, partition_cols: Optional[List[str]] = None,
+                max_rows_per_file: int = 1_000_000):
+    """Write a frame as a hive-partitioned Parquet dataset"""
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        path,
+        format="parquet",
+        partitioning=partition_cols or None,
+        partitioning_flavor="hive" if partition_cols else None,
+        max_rows_per_file=max_rows_per_file,
+        max_rows_per_group=min(max_rows_per_file, 128_000),
+        existing_data_behavior="delete_matching",
+    )
+
+
+def read_manifest(directory: Path) -> Dict:
+    """Name of the file published in a directory of derived files, and of those published before it"""
+    try:
+        return json.loads((Path(directory) / "manifest.json").read_text())
+    except FileNotFoundError:
+        return {"file": None, "previous": []}
+
+
+def publish_file(path: Path, keep_previous: int = 2) -> Path:
+    """Make an already written file the published one in its directory
+
+    The manifest is swapped in one rename; the previous keep_previous files
+    stay for readers that read the old manifest, and older ones are removed.
+    """
+    manifest = read_manifest(path.parent)
+    kept = [name for name in [manifest["file"], *manifest["previous"]] if name and name != path.name]
+    manifest = {"file": path.name, "previous": kept[:keep_previous]}
+    tmp = path.parent / "manifest.tmp"
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, path.parent / "manifest.json")
+    for stale in path.parent.glob(f"*{path.suffix}"):
+        if stale.name not in (manifest["file"], *manifest["previous"]):
+            stale.unlink(missing_ok=True)
+    return path
+
+
+class NarrativeDataStore:
+    """Columnar, memory-mapped reader over the partitioned route/hotspot tables"""
+
+    def __init__(self, root: str = DATA_DIR):
+        self.root = Path(root)
+        self._filesystem = pafs.LocalFileSystem(use_mmap=True)
+        self._datasets: Dict[str, Tuple[Path, ds.Dataset]] = {}
+
+    def table_path(self, table: str) -> Path:
+        return self.root / table
+
+    def exists(self) -> bool:
+        return all(self.table_path(table).exists() for table in PARTITION_COLUMNS)
+
+    def ensure_sample_data(self, n_routes: int = SAMPLE_ROUTES, n_hotspots: int = SAMPLE_HOTSPOTS, seed: int = 42,
+                           center: Tuple[float, float] = (51.55, -0.10)):
+        """Write the sample tables if no real data has been ingested yet"""
+        if self.exists():
+            return
+        route_stories, hotspot_stories = generate_sample_data(n_routes, n_hotspots, seed, center)
+        write_table(route_stories, str(self.table_path("routes")), PARTITION_COLUMNS["routes"])
+        write_table(hotspot_stories, str(self.table_path("hotspots")), PARTITION_COLUMNS["hotspots"])
+        self._datasets.clear()
+
+    def publish_table(self, table: str, df: pd.DataFrame):
+        """Replace a table without readers ever seeing it half written
+
+        The new version is written to its own directory and the table path, a
+        symlink, is swapped to it in one rename. The previous version is kept
+        for readers that opened it just before the swap; older ones are removed.
+        """
+        path = self.table_path(table)
+        target = self.root / f".{table}-{uuid.uuid4().hex[:12]}"
+        write_table(df, str(target), PARTITION_COLUMNS.get(table))
+        if path.exists() and not path.is_symlink():
+            # First publish over a plain directory: move it aside so the name can become a link
+            legacy = self.root / f".{table}-{uuid.uuid4().hex[:12]}"
+            os.rename(path, legacy)
+            previous = legacy
+        else:
+            previous = path.resolve() if path.exists() else None
+        link = self.root / f".{table}.link"
+        link.unlink(missing_ok=True)
+        link.symlink_to(target.name)
+        os.replace(link, path)
+        for stale in self.root.glob(f".{table}-*"):
+            if stale not in (target, previous):
+                shutil.rmtree(stale, ignore_errors=True)
+        self._datasets.pop(table, None)
+
+    def dataset(self, table: str) -> ds.Dataset:
+        """Open (lazily, once per published version) the dataset behind a table - only file metadata is touched"""
+        path = self.table_path(table).resolve()
+        cached = self._datasets.get(table)
+        if cached is None or cached[0] != path:
+            is_arrow = any(p.suffix in ARROW_SUFFIXES for p in path.rglob("*") if p.is_file())
+            cached = self._datasets[table] = (path, ds.dataset(
+                str(path),
+                format="ipc" if is_arrow else "parquet",
+                partitioning="hive",
+                filesystem=self._filesystem,
+            ))
+        return cached[1]
+
+    def schema(self, table: str) -> pa.Schema:
+        return self.dataset(table).schema
+
+    def read_arrow(self, table: str, columns: Optional[List[str]] = None,
+                   filter: Optional[ds.Expression] = None) -> pa.Table:
+        """Read only the requested columns (and rows matching filter) of a table, as Arrow"""
+        dataset = self.dataset(table)
+        if columns is not None:
+            missing = [c for c in columns if c not in dataset.schema.names]
+            if missing:
+                raise KeyError(f"Unknown columns for '{table}': {missing}")
+        return dataset.to_table(columns=columns, filter=filter)
+
+    def read(self, table: str, columns: Optional[List[str]] = None,
+             filter: Optional[ds.Expression] = None) -> pd.DataFrame:
+        """Read only the requested columns (and rows matching filter) of a table"""
+        return self.read_arrow(table, columns, filter).to_pandas()
+
+    def iter_batches(self, table: str, columns: List[str], batch_rows: int = 1_000_000) -> Iterator[pa.Table]:
+        """Stream a table in bounded chunks, for aggregations over tables larger than memory"""
+        for batch in self.dataset(table).to_batches(columns=columns, batch_size=batch_rows):
+            if batch.num_rows:
+                yield pa.Table.from_batches([batch])
+
+    def count_rows(self, table: str) -> int:
+        return self.dataset(table).count_rows()
+
+    def _fingerprint(self, tables: Iterable[str]) -> str:
+        digest = hashlib.sha1()
+        for table in tables:
+            for path in sorted(self.table_path(table).rglob("*")):
+                if path.is_file():
+                    stat = path.stat()
+                    digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:12]
+
+    def table_version(self, table: str) -> str:
+        """Fingerprint of one table's files - changes whenever that table is rewritten"""
+        return self._fingerprint([table])
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the files on disk - changes whenever data is rewritten"""
+        return self._fingerprint(sorted(PARTITION_COLUMNS))
@@ -0,0 +1,142 @@
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+from map_clustering import RISK_ORDER
+
+# Coordinates travel as integer steps of this many degrees (~1.1 m) from the map origin
+QUANTUM_DEG = 1e-5
+# Points sent to the browser at most; beyond this an even sample is drawn
+DECK_MAX_POINTS = int(os.environ.get("CYCLESAFE_DECK_MAX_POINTS", 500_000))
+DECK_MAX_STREETS = int(os.environ.get("CYCLESAFE_DECK_MAX_STREETS", 250_000))
+
+DECK_MODES = ["Hexagons", "Points", "Heatmap"]
+RISK_COLORS = {'Critical': [217, 83, 79], 'High': [240, 173, 78], 'Medium': [79, 172, 254], 'Low': [92, 184, 92]}
+
+
+class CompactDeck(pdk.Deck):
+    """A Deck serialised once, without indentation, keeping only the JSON
+
+    pydeck pretty-prints its JSON, which puts every number of every row on
+    its own line; for large layers that more than doubles the payload. The
+    row lists are dropped after serialising, so a cached deck holds just the
+    string Streamlit sends.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compact_json = json.dumps(self, sort_keys=True, default=default_serialize, separators=(",", ":"))
+        self.layers = []
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._compact_json)
+
+    def to_json(self):
+        return self._compact_json
+
+
+def quantize(lat: np.ndarray, lon: np.ndarray, origin: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer (x, y) steps of QUANTUM_DEG east and north of origin"""
+    x = np.rint((np.asarray(lon, dtype=np.float64) - origin[1]) / QUANTUM_DEG).astype(np.int64)
+    y = np.rint((np.asarray(lat, dtype=np.float64) - origin[0]) / QUANTUM_DEG).astype(np.int64)
+    return x, y
+
+
+def position_accessor(origin: Tuple[float, float], offset: int = 0) -> str:
+    """deck.gl expression turning row[offset], row[offset + 1] back into [lon, lat]"""
+    return (f"[this[{offset}] * {QUANTUM_DEG} + {origin[1]}, "
+            f"this[{offset + 1}] * {QUANTUM_DEG} + {origin[0]}]")
+
+
+def _even_sample(n: int, limit: int) -> np.ndarray:
+    return np.arange(n) if n <= limit else np.linspace(0, n - 1, limit).astype(np.int64)
+
+
+def hotspot_rows(hotspots: pd.DataFrame, origin: Tuple[float, float], limit: int = DECK_MAX_POINTS) -> list:
+    """Hotspots as positional [x, y, affected_cyclists, risk_code] rows
+
+    Every point is a short array of integers rather than a JSON object with
+    named float fields, which makes the payload several times smaller and
+    quicker to parse; layers read the columns with index accessors.
+    """
+    rows = _even_sample(len(hotspots), limit)
+    x, y = quantize(hotspots['lat'].to_numpy()[rows], hotspots['lon'].to_numpy()[rows], origin)
+    weight = hotspots['affected_cyclists'].to_numpy()[rows].astype(np.int64)
+    risk = pd.Categorical(hotspots['risk_level'].to_numpy()[rows], categories=RISK_ORDER).codes.astype(np.int64)
+    return np.column_stack([x, y, weight, risk]).tolist()
+
+
+def _risk_color(column: int, alpha: int = 180) -> str:
+    """Expression mapping a risk code column to its colour"""
+    expression = f"[153, 153, 153, {alpha}]"
+    for code, level in enumerate(RISK_ORDER):
+        expression = f"this[{column}] == {code} ? {RISK_COLORS[level] + [alpha]} : {expression}"
+    return expression
+
+
+def hotspot_layer(mode: str, rows: list, origin: Tuple[float, float]) -> pdk.Layer:
+    position = position_accessor(origin)
+    if mode == "Hexagons":
+        return pdk.Layer(
+            "HexagonLayer", rows, id="hotspot-hexagons",
+            get_position=position, get_elevation_weight="this[2]", get_color_weight="this[2]",
+            elevation_aggregation="SUM", color_aggregation="SUM",
+            radius=150, elevation_scale=4, extruded=True, coverage=0.9, pickable=True, auto_highlight=True,
+        )
+    if mode == "Heatmap":
+        return pdk.Layer(
+            "HeatmapLayer", rows, id="hotspot-heatmap",
+            get_position=position, get_weight="this[2]", radius_pixels=40, aggregation="SUM",
+        )
+    return pdk.Layer(
+        "ScatterplotLayer", rows, id="hotspot-points",
+        get_position=position, get_radius="this[2] * 1.5 + 10", get_fill_color=_risk_color(3),
+        radius_min_pixels=1.5, radius_max_pixels=30, pickable=True,
+    )
+
+
+def street_rows(lat: np.ndarray, lon: np.ndarray, u: np.ndarray, v: np.ndarray, risk: np.ndarray,
+                origin: Tuple[float, float], limit: int = DECK_MAX_STREETS) -> list:
+    """Street segments as positional [x0, y0, x1, y1, risk x 10] rows"""
+    rows = _even_sample(len(u), limit)
+    u, v = u[rows], v[rows]
+    x0, y0 = quantize(lat[u], lon[u], origin)
+    x1, y1 = quantize(lat[v], lon[v], origin)
+    return np.column_stack([x0, y0, x1, y1, np.rint(risk[rows] * 10).astype(np.int64)]).tolist()
+
+
+def street_layer(rows: list, origin: Tuple[float, float]) -> pdk.Layer:
+    """Street segments shaded from green (safe) to red by their riding risk"""
+    return pdk.Layer(
+        "LineLayer", rows, id="street-risk",
+        get_source_position=position_accessor(origin, 0), get_target_position=position_accessor(origin, 2),
+        # Colour channels are clamped to 0-255 on the GPU side, so no min/max is needed
+        get_color="[(this[4] - 10) * 12, 200 - (this[4] - 10) * 10, 90, 140]",
+        get_width=2,
+    )
+
+
+def build_deck(mode: str, hotspot_rows_: list, center: Tuple[float, float], zoom: int,
+               streets: Optional[list] = None) -> pdk.Deck:
+    """A pydeck map of the hotspots in one of DECK_MODES, optionally over the street risk network"""
+    layers = [street_layer(streets, center)] if streets else []
+    layers.append(hotspot_layer(mode, hotspot_rows_, center))
+    tooltip: Optional[Dict] = None
+    if mode == "Hexagons":
+        tooltip = {"text": "{elevationValue} cyclists affected nearby"}
+    elif mode == "Points":
+        tooltip = {"text": "{2} cyclists affected"}
+    return CompactDeck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=center[0], longitude=center[1], zoom=zoom,
+                                         pitch=40 if mode == "Hexagons" else 0),
+        map_provider="carto",
+        map_style=pdk.map_styles.CARTO_LIGHT,
+        tooltip=tooltip,
+    )
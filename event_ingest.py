@@ -0,0 +1,300 @@
+"""Append-only sensor event ingestion with incrementally maintained hotspot aggregates
+
+    python event_ingest.py --city london ingest events.parquet
+    python event_ingest.py --city london simulate --events 50000
+    python event_ingest.py --city london rebuild
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from data_store import DATA_DIR, TIME_SLOTS
+from spatial_index import HotspotIndex
+
+INCIDENT_TYPES = ['Sudden Braking', 'Swerving', 'Conflicts', 'Surface Issues']
+# Start hour of each daytime slot; everything outside them is Night
+SLOT_HOURS = [(7, 10), (10, 16), (16, 19)]
+
+# Events further than this from every known hotspot are not attributed to one
+MATCH_RADIUS_M = 50.0
+# Aggregate files kept behind the published one, for readers still holding an older manifest
+KEEP_PREVIOUS_VERSIONS = 2
+
+INCIDENT_COLUMNS = [f"incident:{name}" for name in INCIDENT_TYPES]
+SLOT_COLUMNS = [f"time:{name}" for name in TIME_SLOTS]
+COUNT_COLUMNS = ["event_count", "affected_cyclists", *INCIDENT_COLUMNS, *SLOT_COLUMNS]
+
+
+def time_of_day(timestamps) -> np.ndarray:
+    """Index into TIME_SLOTS for every timestamp"""
+    hours = pd.DatetimeIndex(timestamps).hour.to_numpy()
+    slots = np.full(len(hours), len(TIME_SLOTS) - 1, dtype=np.int64)
+    for slot, (start, end) in enumerate(SLOT_HOURS):
+        slots[(hours >= start) & (hours < end)] = slot
+    return slots
+
+
+def generate_sample_events(hotspots: pd.DataFrame, n_events: int, seed: Optional[int] = None,
+                           end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Synthetic braking/swerving events scattered around existing hotspots over the last day"""
+    rng = np.random.default_rng(seed)
+    end = end or pd.Timestamp.now().floor("s")
+    source = rng.integers(0, len(hotspots), n_events)
+    # ~15 m of GPS jitter around the hotspot
+    return pd.DataFrame({
+        "timestamp": end - pd.to_timedelta(rng.integers(0, 86400, n_events), unit="s"),
+        "lat": hotspots["lat"].to_numpy()[source] + rng.normal(0, 0.00013, n_events),
+        "lon": hotspots["lon"].to_numpy()[source] + rng.normal(0, 0.0002, n_events),
+        "event_type": rng.choice(INCIDENT_TYPES, n_events, p=[0.4, 0.3, 0.2, 0.1]),
+        "cyclists": rng.integers(1, 4, n_events),
+    })
+
+
+def _aggregate_batch(location_ids: np.ndarray, incident_codes: np.ndarray, slot_codes: np.ndarray,
+                     cyclists: np.ndarray, timestamps: np.ndarray) -> pd.DataFrame:
+    """Per-hotspot aggregates of one batch - O(batch size)"""
+    locations, inverse = np.unique(location_ids, return_inverse=True)
+    n = len(locations)
+    incident_mix = np.bincount(inverse * len(INCIDENT_TYPES) + incident_codes,
+                               minlength=n * len(INCIDENT_TYPES)).reshape(n, -1)
+    slot_mix = np.bincount(inverse * len(TIME_SLOTS) + slot_codes,
+                           minlength=n * len(TIME_SLOTS)).reshape(n, -1)
+    batch = pd.DataFrame(np.column_stack([
+        np.bincount(inverse, minlength=n),
+        np.bincount(inverse, weights=cyclists, minlength=n).astype(np.int64),
+        incident_mix,
+        slot_mix,
+    ]), columns=COUNT_COLUMNS, index=pd.Index(locations, name="location_id"))
+    batch["last_event_at"] = pd.Series(timestamps).groupby(inverse).max().to_numpy()
+    return batch
+
+
+def _merge(current: pd.DataFrame, batch: pd.DataFrame) -> pd.DataFrame:
+    """Fold a batch into the running aggregates; untouched hotspots are carried over as-is"""
+    if current.empty:
+        return batch
+    merged = current[COUNT_COLUMNS].add(batch[COUNT_COLUMNS], fill_value=0).astype(np.int64)
+    merged["last_event_at"] = pd.concat([current["last_event_at"], batch["last_event_at"]]).groupby(level=0).max()
+    return merged
+
+
+class HotspotAggregator:
+    """Raw events appended under <root>/events, running aggregates versioned under <root>/aggregates
+
+    Each ingest writes the new events as their own Parquet files, folds only
+    those events into the current aggregates and publishes the result as the
+    next version. Readers key their caches on `version`, so a new ingest is
+    picked up on the next rerun without clearing anything.
+    """
+
+    def __init__(self, root: str = DATA_DIR, match_radius_m: float = MATCH_RADIUS_M):
+        self.root = Path(root)
+        self.events_path = self.root / "events"
+        self.aggregates_path = self.root / "aggregates"
+        self.manifest_path = self.aggregates_path / "manifest.json"
+        self.match_radius_m = match_radius_m
+        self._loaded = (None, None)
+
+    @property
+    def manifest(self) -> Dict:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return {"version": 0, "events_ingested": 0, "file": None}
+
+    @property
+    def version(self) -> int:
+        return self.manifest["version"]
+
+    @contextlib.contextmanager
+    def _writer_lock(self):
+        """Serialize ingest processes; readers never block"""
+        self.aggregates_path.mkdir(parents=True, exist_ok=True)
+        with open(self.aggregates_path / ".lock", "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def load(self) -> pd.DataFrame:
+        """Current aggregates indexed by location_id (empty before the first ingest)"""
+        return self.snapshot()[1]
+
+    def snapshot(self) -> Tuple[int, pd.DataFrame]:
+        """Current aggregates together with the version they were published as"""
+        manifest = self.manifest
+        if self._loaded[0] == manifest["version"]:
+            return self._loaded
+        if manifest["file"] is None:
+            frame = pd.DataFrame(columns=[*COUNT_COLUMNS, "last_event_at"],
+                                 index=pd.Index([], name="location_id", dtype=np.int64))
+        else:
+            try:
+                frame = pd.read_parquet(self.aggregates_path / manifest["file"])
+            except FileNotFoundError:
+                # Several publishes landed between reading the manifest and the file; the
+                # manifest on disk now names a newer file, which is kept until we read it
+                return self.snapshot()
+        self._loaded = (manifest["version"], frame)
+        return self._loaded
+
+    def _publish(self, aggregates: pd.DataFrame, events_ingested: int) -> int:
+        version = self.version + 1
+        name = f"v{version:08d}.parquet"
+        aggregates.to_parquet(self.aggregates_path / name)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": version, "events_ingested": events_ingested,
+                                   "file": name, "updated_at": time.time()}))
+        # Atomic swap: readers see either the old or the new version, never a partial one
+        os.replace(tmp, self.manifest_path)
+        # Older files stay a few more rounds for readers still holding an old manifest
+        for stale in self.aggregates_path.glob("v*.parquet"):
+            if int(stale.stem[1:]) < version - KEEP_PREVIOUS_VERSIONS:
+                stale.unlink(missing_ok=True)
+        return version
+
+    def ingest(self, events: pd.DataFrame, index: Optional[HotspotIndex] = None) -> Dict:
+        """Append events and fold them into the aggregates
+
+        Events need timestamp, event_type and either location_id or lat/lon
+        (matched to the nearest hotspot in `index`); cyclists defaults to 1.
+        """
+        start = time.perf_counter()
+        timestamps = pd.to_datetime(events["timestamp"]).to_numpy()
+        incident_codes = pd.Categorical(events["event_type"], categories=INCIDENT_TYPES).codes.astype(np.int64)
+        cyclists = (events["cyclists"].to_numpy(dtype=np.int64) if "cyclists" in events
+                    else np.ones(len(events), dtype=np.int64))
+
+        if "location_id" in events:
+            location_ids = events["location_id"].to_numpy(dtype=np.int64)
+        else:
+            if index is None:
+                raise ValueError("Events without location_id need a HotspotIndex to be matched")
+            positions = index.match(events["lat"].to_numpy(), events["lon"].to_numpy(), self.match_radius_m)
+            known = index.frame["location_id"].to_numpy(dtype=np.int64)
+            location_ids = np.where(positions >= 0, known[np.maximum(positions, 0)], -1)
+
+        valid = (incident_codes >= 0) & (location_ids >= 0)
+        accepted = pd.DataFrame({
+            "timestamp": timestamps[valid],
+            "location_id": location_ids[valid],
+            "event_type": np.asarray(INCIDENT_TYPES)[incident_codes[valid]],
+            "cyclists": cyclists[valid],
+        })
+
+        with self._writer_lock():
+            manifest = self.manifest
+            if len(accepted):
+                self._append_events(accepted)
+                batch = _aggregate_batch(location_ids[valid], incident_codes[valid],
+                                         time_of_day(timestamps[valid]), cyclists[valid], timestamps[valid])
+                version = self._publish(_merge(self.load(), batch), manifest["events_ingested"] + len(accepted))
+            else:
+                batch, version = pd.DataFrame(), manifest["version"]
+
+        return {
+            "version": version,
+            "events": len(events),
+            "accepted": int(valid.sum()),
+            "unmatched": int((location_ids < 0).sum()),
+            "unknown_type": int((incident_codes < 0).sum()),
+            "hotspots_updated": len(batch),
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    def _append_events(self, events: pd.DataFrame):
+        events = events.assign(date=events["timestamp"].dt.strftime("%Y-%m-%d"))
+        ds.write_dataset(
+            pa.Table.from_pandas(events, preserve_index=False),
+            str(self.events_path),
+            format="parquet",
+            partitioning=["date"],
+            partitioning_flavor="hive",
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    def rebuild(self) -> Dict:
+        """Recompute the aggregates from the full event log, e.g. after a crash mid-ingest"""
+        with self._writer_lock():
+            if not self.events_path.exists():
+                return {"version": self.version, "events": 0}
+            events = ds.dataset(str(self.events_path), format="parquet", partitioning="hive").to_table(
+                columns=["timestamp", "location_id", "event_type", "cyclists"]).to_pandas()
+            timestamps = events["timestamp"].to_numpy()
+            aggregates = _aggregate_batch(
+                events["location_id"].to_numpy(dtype=np.int64),
+                pd.Categorical(events["event_type"], categories=INCIDENT_TYPES).codes.astype(np.int64),
+                time_of_day(timestamps),
+                events["cyclists"].to_numpy(dtype=np.int64),
+                timestamps,
+            )
+            return {"version": self._publish(aggregates, len(events)), "events": len(events)}
+
+    def apply(self, hotspots: pd.DataFrame, aggregates: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Hotspot table with the ingested events (or the given aggregates) folded into the columns it has"""
+        aggregates = self.load() if aggregates is None else aggregates
+        if aggregates.empty or "location_id" not in hotspots:
+            return hotspots
+        rows = aggregates.reindex(hotspots["location_id"].to_numpy())
+        seen = rows["event_count"].notna().to_numpy()
+        hotspots = hotspots.copy()
+        if "affected_cyclists" in hotspots:
+            hotspots["affected_cyclists"] = hotspots["affected_cyclists"] + rows["affected_cyclists"].fillna(0).to_numpy(dtype=np.int64)
+        # Dominant incident type / time slot among the live events replaces the survey label
+        for column, count_columns, labels in (("incident_type", INCIDENT_COLUMNS, INCIDENT_TYPES),
+                                              ("time_of_day", SLOT_COLUMNS, TIME_SLOTS)):
+            if column in hotspots and seen.any():
+                dominant = np.asarray(labels)[rows[count_columns].fillna(0).to_numpy().argmax(axis=1)]
+                hotspots[column] = np.where(seen, dominant, hotspots[column].to_numpy())
+        return hotspots
+
+
+if __name__ == "__main__":
+    # Imported here: cities (and the rollups maintained next to the aggregates) build on this module
+    from cities import DEFAULT_CITY, CityData, city_data_dir, load_city_configs
+    from rollup_cube import publish_rollup_cube, update_rollup_cube
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="append events from a Parquet or CSV file")
+    ingest.add_argument("path")
+    simulate = commands.add_parser("simulate", help="append synthetic events around existing hotspots")
+    simulate.add_argument("--events", type=int, default=10000)
+    simulate.add_argument("--seed", type=int)
+    commands.add_parser("rebuild", help="recompute the aggregates from the full event log")
+    args = parser.parse_args()
+
+    configs = load_city_configs(args.data_dir)
+    if args.city not in configs:
+        parser.error(f"unknown city '{args.city}' (known: {', '.join(sorted(configs))})")
+    # Opening the city seeds its sample data the same way the app would
+    city = CityData(configs[args.city], city_data_dir(args.city, args.data_dir), lambda slug: None)
+    store, aggregator = city.store, city.aggregator
+    if args.command == "rebuild":
+        print(json.dumps(aggregator.rebuild()))
+        publish_rollup_cube(store, aggregator)
+    else:
+        index = HotspotIndex(store.read("hotspots", ["location_id", "location_name", "lat", "lon"]))
+        if args.command == "ingest":
+            path = Path(args.path)
+            events = pd.read_csv(path) if path.suffix == ".csv" else pd.read_parquet(path)
+        else:
+            events = generate_sample_events(index.frame, args.events, args.seed)
+        before = aggregator.snapshot()
+        print(json.dumps(aggregator.ingest(events, index)))
+        update_rollup_cube(store, aggregator, before)
@@ -0,0 +1,399 @@
+"""Streaming pipeline from raw accelerometer/GPS events to detected hotspots
+
+    python hotspot_pipeline.py --city london simulate raw_events/ --rows 5000000
+    python hotspot_pipeline.py --city london detect raw_events/ --publish
+
+Raw files are read chunk by chunk and reduced to per-grid-cell counts as
+they stream past, so memory is bounded by the number of occupied cells, not
+by the size of the input.
+"""
+import argparse
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from cities import DEFAULT_CITY, CityData, city_data_dir, load_city_configs
+from data_store import AREAS, DATA_DIR, NarrativeDataStore
+from event_ingest import MATCH_RADIUS_M, TIME_SLOTS, HotspotAggregator, time_of_day
+from rollup_cube import publish_rollup_cube
+from story_cache import build_story_cache
+from spatial_index import EARTH_RADIUS_M, HotspotIndex
+
+RAW_COLUMNS = ["timestamp", "lat", "lon", "speed_mps", "accel_long", "accel_lat", "yaw_rate"]
+DETECTED_TYPES = ["Sudden Braking", "Swerving"]
+# Share of hotspots per risk level, matching the distribution analysts are used to
+RISK_SHARES = [0.3, 0.4, 0.2, 0.1]
+CELL_KEY_OFFSET = 1 << 31
+# Hotspots within this distance of the city's mean position are in the City Centre area
+CENTRE_RADIUS_M = 1500.0
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    """Vectorised event filters; accelerations in m/s², yaw rate in deg/s"""
+    hard_braking: float = -3.4     # longitudinal deceleration, ~0.35 g
+    swerve_lateral: float = 3.0    # lateral acceleration, ~0.3 g
+    swerve_yaw_rate: float = 35.0
+    min_speed_mps: float = 2.0     # ignore wobbles while stopped or walking the bike
+
+
+def read_event_chunks(paths: Iterable[str], chunk_rows: int = 500_000,
+                      columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Yield raw events in chunks of at most chunk_rows rows from Parquet or CSV files/directories"""
+    for path in paths:
+        if str(path).endswith(".csv") or any(Path(path).glob("*.csv")):
+            fmt = ds.CsvFileFormat()
+        else:
+            # Without pre-buffering only the row group being decoded is held in memory
+            fmt = ds.ParquetFileFormat(default_fragment_scan_options=ds.ParquetFragmentScanOptions(pre_buffer=False))
+        dataset = ds.dataset(str(path), format=fmt)
+        for batch in dataset.to_batches(columns=columns or RAW_COLUMNS, batch_size=chunk_rows,
+                                        batch_readahead=1, fragment_readahead=1, use_threads=False):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+
+def detect_events(chunks: Iterable[pd.DataFrame], thresholds: Thresholds = Thresholds()) -> Iterator[pd.DataFrame]:
+    """Keep only hard-braking and swerve events, labelled with an incident type"""
+    for chunk in chunks:
+        moving = chunk["speed_mps"].to_numpy() >= thresholds.min_speed_mps
+        braking = moving & (chunk["accel_long"].to_numpy() <= thresholds.hard_braking)
+        swerving = moving & ~braking & (
+            (np.abs(chunk["accel_lat"].to_numpy()) >= thresholds.swerve_lateral)
+            | (np.abs(chunk["yaw_rate"].to_numpy()) >= thresholds.swerve_yaw_rate)
+        )
+        keep = braking | swerving
+        if keep.any():
+            yield pd.DataFrame({
+                "timestamp": chunk["timestamp"].to_numpy()[keep],
+                "lat": chunk["lat"].to_numpy()[keep],
+                "lon": chunk["lon"].to_numpy()[keep],
+                "incident": np.where(braking[keep], 0, 1),
+            })
+
+
+class GridAccumulator:
+    """Per-cell event statistics for a square grid of side cell_m metres
+
+    Chunks are reduced to one row per occupied cell as they arrive and
+    compacted every few chunks, so state stays proportional to the number
+    of distinct cells.
+    """
+
+    def __init__(self, cell_m: float, compact_every: int = 8):
+        self.cell_m = cell_m
+        self.compact_every = compact_every
+        self.ref_lat: Optional[float] = None
+        self._pending: List[pd.DataFrame] = []
+        self._cells = pd.DataFrame()
+        self.events = 0
+
+    def _cell_keys(self, lat: np.ndarray, lon: np.ndarray):
+        y_scale = math.radians(1) * EARTH_RADIUS_M / self.cell_m
+        x_scale = y_scale * math.cos(math.radians(self.ref_lat))
+        iy = np.floor(lat * y_scale).astype(np.int64)
+        ix = np.floor(lon * x_scale).astype(np.int64)
+        return iy, ix
+
+    def add(self, events: pd.DataFrame):
+        if self.ref_lat is None:
+            self.ref_lat = float(events["lat"].mean())
+        lat, lon = events["lat"].to_numpy(), events["lon"].to_numpy()
+        iy, ix = self._cell_keys(lat, lon)
+        slots = time_of_day(events["timestamp"])
+        incident = events["incident"].to_numpy()
+        seconds = pd.DatetimeIndex(events["timestamp"]).as_unit("s").asi8.astype(np.float64)
+        frame = pd.DataFrame({
+            "cell": (iy + CELL_KEY_OFFSET) * (CELL_KEY_OFFSET * 2) + (ix + CELL_KEY_OFFSET),
+            "count": 1,
+            "lat_sum": lat,
+            "lon_sum": lon,
+            "time_sum": seconds,
+            **{f"incident_{i}": (incident == i).astype(np.int64) for i in range(len(DETECTED_TYPES))},
+            **{f"slot_{i}": (slots == i).astype(np.int64) for i in range(len(TIME_SLOTS))},
+        })
+        self._pending.append(frame.groupby("cell").sum())
+        self.events += len(events)
+        if len(self._pending) >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        if self._pending:
+            self._cells = pd.concat([self._cells, *self._pending]).groupby(level=0).sum()
+            self._pending = []
+
+    def cells(self) -> pd.DataFrame:
+        self._compact()
+        return self._cells
+
+
+def cluster_cells(cells: pd.DataFrame, min_events: int) -> np.ndarray:
+    """DBSCAN over grid cells: cluster label per cell, -1 for noise
+
+    Cells holding at least min_events are core cells; core cells touching
+    each other (8-neighbourhood) form one cluster, and a non-core cell next
+    to a core cell joins that cluster as a border cell.
+    """
+    keys = cells.index.to_numpy()
+    counts = cells["count"].to_numpy()
+    core = counts >= min_events
+    labels = np.full(len(keys), -1, dtype=np.int64)
+    if not core.any():
+        return labels
+
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    width = CELL_KEY_OFFSET * 2
+    rows, cols = [], []
+    core_positions = np.flatnonzero(core)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dy == dx == 0:
+                continue
+            neighbour = keys[core_positions] + dy * width + dx
+            found = np.searchsorted(sorted_keys, neighbour)
+            found = np.minimum(found, len(sorted_keys) - 1)
+            hit = sorted_keys[found] == neighbour
+            rows.append(core_positions[hit])
+            cols.append(order[found[hit]])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+
+    # Core-core links define the clusters
+    both_core = core[cols]
+    graph = sparse.coo_matrix((np.ones(both_core.sum()), (rows[both_core], cols[both_core])),
+                              shape=(len(keys), len(keys))).tocsr()
+    _, components = connected_components(graph, directed=False)
+    labels[core] = components[core]
+    # Border cells take the label of (one of) their core neighbours
+    border = ~both_core
+    labels[cols[border]] = labels[rows[border]]
+    # Renumber clusters densely
+    assigned = labels >= 0
+    labels[assigned] = np.unique(labels[assigned], return_inverse=True)[1]
+    return labels
+
+
+def build_hotspots(cells: pd.DataFrame, labels: np.ndarray, cell_m: float,
+                   min_cluster_events: int = 0) -> pd.DataFrame:
+    """Collapse clustered cells into rows with the hotspot_stories schema"""
+    clustered = cells[labels >= 0].groupby(labels[labels >= 0]).sum()
+    extent = pd.Series(labels[labels >= 0]).value_counts().sort_index().to_numpy()
+    keep = clustered["count"].to_numpy() >= max(min_cluster_events, 1)
+    clustered, extent = clustered[keep], extent[keep]
+    n = len(clustered)
+    if n == 0:
+        return pd.DataFrame(columns=["location_id", "location_name", "location_type", "lat", "lon", "risk_level",
+                                     "affected_cyclists", "incident_type", "time_of_day", "fix_complexity",
+                                     "estimated_cost", "community_impact", "area", "month"])
+
+    counts = clustered["count"].to_numpy()
+    # Busiest clusters first, so location ids rank by severity
+    order = np.argsort(-counts, kind="stable")
+    clustered, extent, counts = clustered.iloc[order], extent[order], counts[order]
+    incidents = clustered[[f"incident_{i}" for i in range(len(DETECTED_TYPES))]].to_numpy()
+    slots = clustered[[f"slot_{i}" for i in range(len(TIME_SLOTS))]].to_numpy()
+
+    rank = np.arange(n) / n
+    risk = np.select([rank < RISK_SHARES[3], rank < RISK_SHARES[3] + RISK_SHARES[2],
+                      rank < 1 - RISK_SHARES[0]], ["Critical", "High", "Medium"], "Low")
+    # Larger footprints (in grid cells) mean longer stretches of street to rework
+    complexity = np.select([extent <= 4, extent <= 16], ["Quick Fix", "Moderate"], "Complex")
+    base_cost = np.select([complexity == "Quick Fix", complexity == "Moderate"], [2000.0, 8000.0], 25000.0)
+    ids = np.arange(1, n + 1)
+    lat = clustered["lat_sum"].to_numpy() / counts
+    lon = clustered["lon_sum"].to_numpy() / counts
+    # Month the cluster's events were (on average) recorded in
+    month = pd.to_datetime(clustered["time_sum"].to_numpy() / counts, unit="s").strftime("%Y-%m")
+
+    return pd.DataFrame({
+        "location_id": ids,
+        "location_name": [f"Hotspot {i}" for i in ids],
+        "location_type": "Unclassified",
+        "lat": lat,
+        "lon": lon,
+        "risk_level": risk,
+        "affected_cyclists": counts.astype(np.int64),
+        "incident_type": np.asarray(DETECTED_TYPES)[incidents.argmax(axis=1)],
+        "time_of_day": np.asarray(TIME_SLOTS)[slots.argmax(axis=1)],
+        "fix_complexity": complexity,
+        "estimated_cost": base_cost * np.sqrt(extent),
+        "community_impact": np.clip(np.log1p(counts) / np.log1p(counts.max()), 0.3, 1.0),
+        "area": compass_areas(lat, lon, weights=counts),
+        "month": np.asarray(month),
+    })
+
+
+def compass_areas(lat: np.ndarray, lon: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """City Centre within CENTRE_RADIUS_M of the (weighted) mean position, else North/South/East/West"""
+    y = (lat - np.average(lat, weights=weights)) * math.radians(1) * EARTH_RADIUS_M
+    x = ((lon - np.average(lon, weights=weights)) * math.radians(1) * EARTH_RADIUS_M
+         * math.cos(math.radians(float(np.mean(lat)))))
+    sector = np.where(np.abs(y) >= np.abs(x), np.where(y >= 0, "North", "South"), np.where(x >= 0, "East", "West"))
+    return np.where(np.hypot(x, y) <= CENTRE_RADIUS_M, AREAS[0], sector)
+
+
+def assign_stable_ids(hotspots: pd.DataFrame, previous: pd.DataFrame, used_ids: Iterable[int] = (),
+                      match_radius_m: float = MATCH_RADIUS_M) -> pd.DataFrame:
+    """Carry location ids (and names, types, areas) over from the hotspots already published
+
+    A detected hotspot within match_radius_m of a published one takes over its
+    id, so the live aggregates and everything keyed on location_id keep
+    pointing at the same place; when several land on one published hotspot the
+    busiest (first) wins. The rest get ids above every id used so far, never a
+    retired one whose aggregates are still on disk. Areas come from the nearest
+    published hotspot, however far, so new hotspots join the council's areas.
+    """
+    if previous.empty or hotspots.empty:
+        return hotspots
+    hotspots = hotspots.copy()
+    index = HotspotIndex(previous)
+    lat, lon = hotspots["lat"].to_numpy(), hotspots["lon"].to_numpy()
+    positions = index.match(lat, lon, match_radius_m)
+    positions[(positions >= 0) & pd.Series(positions).duplicated().to_numpy()] = -1
+    matched = positions >= 0
+    previous_ids = previous["location_id"].to_numpy(dtype=np.int64)
+    next_id = max(int(previous_ids.max()), max(used_ids, default=0)) + 1
+    ids = np.empty(len(hotspots), dtype=np.int64)
+    ids[matched] = previous_ids[positions[matched]]
+    ids[~matched] = next_id + np.arange((~matched).sum())
+    hotspots["location_id"] = ids
+    for column in ("location_name", "location_type"):
+        if column in previous:
+            values = hotspots[column].astype(object).to_numpy()
+            values[matched] = previous[column].astype(object).to_numpy()[positions[matched]]
+            hotspots[column] = values
+    hotspots.loc[~matched, "location_name"] = [f"Hotspot {i}" for i in ids[~matched]]
+    if "area" in previous:
+        nearest = index.match(lat, lon, np.inf)
+        hotspots["area"] = previous["area"].astype(object).to_numpy()[nearest]
+    return hotspots
+
+
+def publish_hotspots(hotspots: pd.DataFrame, root: str) -> Dict:
+    """Swap detected hotspots into a city's data store, keeping location ids stable across runs"""
+    store = NarrativeDataStore(root)
+    columns = ["location_id", "location_name", "location_type", "lat", "lon", "area"]
+    previous = (store.read("hotspots", [c for c in columns if c in store.schema("hotspots").names])
+                if store.table_path("hotspots").exists() else pd.DataFrame())
+    aggregator = HotspotAggregator(root)
+    hotspots = assign_stable_ids(hotspots, previous, used_ids=aggregator.load().index.astype(np.int64))
+    store.publish_table("hotspots", hotspots)
+    # Everything derived from the hotspots table is republished with it
+    publish_rollup_cube(store, aggregator)
+    build_story_cache(store, aggregator)
+    kept = np.isin(hotspots["location_id"].to_numpy(), previous["location_id"].to_numpy()) if len(previous) else []
+    return {"hotspots": len(hotspots), "kept_ids": int(np.sum(kept)), "new_ids": len(hotspots) - int(np.sum(kept))}
+
+
+def detect_hotspots(paths: Iterable[str], eps_m: float = 25.0, min_events: int = 5,
+                    chunk_rows: int = 500_000, thresholds: Thresholds = Thresholds()) -> Dict:
+    """Run the whole pipeline: stream, filter, grid, cluster, summarise"""
+    start = time.perf_counter()
+    # Any two points in one cell are within eps of each other
+    cell_m = eps_m / math.sqrt(2)
+    grid = GridAccumulator(cell_m)
+    raw_rows = 0
+
+    def counted(chunks):
+        nonlocal raw_rows
+        for chunk in chunks:
+            raw_rows += len(chunk)
+            yield chunk
+
+    for events in detect_events(counted(read_event_chunks(paths, chunk_rows)), thresholds):
+        grid.add(events)
+
+    cells = grid.cells()
+    labels = cluster_cells(cells, min_events) if len(cells) else np.empty(0, dtype=np.int64)
+    hotspots = build_hotspots(cells, labels, cell_m, min_cluster_events=min_events)
+    return {
+        "hotspots": hotspots,
+        "raw_rows": raw_rows,
+        "events": grid.events,
+        "cells": len(cells),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def generate_raw_events(path: str, n_rows: int, n_centres: int = 200, incident_share: float = 0.02,
+                        seed: int = 42, chunk_rows: int = 1_000_000, center: Tuple[float, float] = (51.55, -0.10)):
+    """Write synthetic raw sensor readings (mostly normal riding) around center to a Parquet file, chunk by chunk"""
+    rng = np.random.default_rng(seed)
+    (lat0, lat1), (lon0, lon1) = (center[0] - 0.05, center[0] + 0.05), (center[1] - 0.05, center[1] + 0.05)
+    centres = np.column_stack([rng.uniform(lat0, lat1, n_centres), rng.uniform(lon0, lon1, n_centres)])
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    writer = None
+    start = pd.Timestamp.now().floor("D") - pd.Timedelta(days=30)
+    try:
+        for offset in range(0, n_rows, chunk_rows):
+            n = min(chunk_rows, n_rows - offset)
+            incident = rng.random(n) < incident_share
+            at_centre = incident & (rng.random(n) < 0.8)
+            lat = rng.uniform(lat0, lat1, n)
+            lon = rng.uniform(lon0, lon1, n)
+            picks = centres[rng.integers(0, n_centres, at_centre.sum())]
+            lat[at_centre] = picks[:, 0] + rng.normal(0, 0.00008, len(picks))
+            lon[at_centre] = picks[:, 1] + rng.normal(0, 0.00012, len(picks))
+            braking = incident & (rng.random(n) < 0.6)
+            swerving = incident & ~braking
+            chunk = pa.table({
+                "timestamp": pa.array(start + pd.to_timedelta(rng.integers(0, 30 * 86400, n), unit="s")),
+                "lat": lat,
+                "lon": lon,
+                "speed_mps": rng.uniform(1, 9, n),
+                "accel_long": np.where(braking, rng.uniform(-7, -3.5, n), rng.normal(0, 0.8, n)),
+                "accel_lat": np.where(swerving, rng.choice([-1, 1], n) * rng.uniform(3.2, 6, n), rng.normal(0, 0.6, n)),
+                "yaw_rate": rng.normal(0, 8, n),
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(path, chunk.schema)
+            writer.write_table(chunk, row_group_size=min(chunk_rows, 256_000))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    simulate = commands.add_parser("simulate", help="write synthetic raw sensor readings")
+    simulate.add_argument("path")
+    simulate.add_argument("--rows", type=int, default=5_000_000)
+    simulate.add_argument("--seed", type=int, default=42)
+    detect = commands.add_parser("detect", help="detect hotspots in raw sensor files")
+    detect.add_argument("paths", nargs="+")
+    detect.add_argument("--eps-m", type=float, default=25.0)
+    detect.add_argument("--min-events", type=int, default=5)
+    detect.add_argument("--chunk-rows", type=int, default=500_000)
+    detect.add_argument("--publish", action="store_true", help="replace the city's hotspots table in the data store")
+    args = parser.parse_args()
+
+    configs = load_city_configs(args.data_dir)
+    if args.city not in configs:
+        parser.error(f"unknown city '{args.city}' (known: {', '.join(sorted(configs))})")
+    config = configs[args.city]
+    if args.command == "simulate":
+        target = Path(args.path)
+        generate_raw_events(str(target / "events.parquet" if target.suffix != ".parquet" else target), args.rows,
+                            seed=args.seed, center=(config.lat, config.lon))
+    else:
+        result = detect_hotspots(args.paths, args.eps_m, args.min_events, args.chunk_rows)
+        hotspots = result.pop("hotspots")
+        print(f"{result['raw_rows']:,} readings -> {result['events']:,} events -> "
+              f"{len(hotspots):,} hotspots in {result['seconds']}s")
+        if args.publish:
+            # Opening the city first seeds the rest of its tables, as the app would
+            city = CityData(config, city_data_dir(args.city, args.data_dir), lambda slug: None)
+            print(publish_hotspots(hotspots, str(city.store.root)))
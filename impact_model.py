@@ -0,0 +1,115 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# Trained booster; when absent a bootstrap model is fitted at startup
+MODEL_PATH = os.environ.get("CYCLESAFE_IMPACT_MODEL", "models/impact_model.json")
+
+ROUTE_FEATURES = ['safety_score', 'daily_cyclists', 'incident_rate', 'weather_resilience', 'accessibility_score']
+
+INTERVENTIONS = {
+    "signal_timing": {"implementation_time": "2 weeks", "cost_per_route": 2500, "lifespan_years": 1, "base_reduction": 0.32},
+    "protected_lanes": {"implementation_time": "3 months", "cost_per_route": 85000, "lifespan_years": 10, "base_reduction": 0.68},
+    "surface_improvement": {"implementation_time": "1 month", "cost_per_route": 15000, "lifespan_years": 5, "base_reduction": 0.25},
+}
+
+# Average cost of one cycling incident, used for ROI
+INCIDENT_COST = 12000
+MONTHS_PER_YEAR = 12
+
+
+def _bootstrap_training_set(n_rows: int = 20000, seed: int = 7):
+    """Synthetic labelled rows following the response curves of past schemes"""
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([
+        rng.beta(3, 1, n_rows) * 10,
+        rng.poisson(50, n_rows),
+        rng.exponential(0.5, n_rows),
+        rng.uniform(0.3, 1.0, n_rows),
+        rng.uniform(0.2, 1.0, n_rows),
+    ])
+    intervention = rng.integers(0, len(INTERVENTIONS), n_rows)
+    one_hot = np.eye(len(INTERVENTIONS))[intervention]
+
+    safety, cyclists, incidents, weather, access = features.T
+    base = np.array([spec["base_reduction"] for spec in INTERVENTIONS.values()])[intervention]
+    response = np.select(
+        [intervention == 0, intervention == 1, intervention == 2],
+        [
+            1 + 0.4 * np.tanh(incidents - 0.5) + 0.1 * (cyclists > 60),
+            1 + 0.5 * (10 - safety) / 10 - 0.2 * access,
+            1 + 0.8 * (1 - weather),
+        ],
+    )
+    target = np.clip(base * response + rng.normal(0, 0.03, n_rows), 0, 0.95)
+    return np.hstack([features, one_hot]).astype(np.float32), target.astype(np.float32)
+
+
+def train_bootstrap_booster(n_rounds: int = 30) -> xgb.Booster:
+    """Fit a small booster on the bootstrap training set"""
+    features, target = _bootstrap_training_set()
+    dtrain = xgb.DMatrix(features, label=target)
+    params = {"max_depth": 4, "eta": 0.3, "objective": "reg:squarederror", "nthread": os.cpu_count() or 1}
+    return xgb.train(params, dtrain, num_boost_round=n_rounds)
+
+
+class ImpactModel:
+    """Per-process XGBoost model scoring interventions over whole route tables"""
+
+    def __init__(self, model_path: str = MODEL_PATH):
+        if Path(model_path).exists():
+            self.booster = xgb.Booster(model_file=model_path)
+        else:
+            self.booster = train_bootstrap_booster()
+        self.booster.set_param({"nthread": os.cpu_count() or 1})
+        # Scoring rewrites the intervention columns of a shared feature matrix
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prepare(routes: pd.DataFrame) -> np.ndarray:
+        """Build the float32 feature matrix once; intervention columns are filled per call"""
+        features = np.zeros((len(routes), len(ROUTE_FEATURES) + len(INTERVENTIONS)), dtype=np.float32)
+        for i, column in enumerate(ROUTE_FEATURES):
+            features[:, i] = routes[column].to_numpy(dtype=np.float32)
+        return features
+
+    def score(self, features: np.ndarray, intervention: str) -> np.ndarray:
+        """Predicted incident reduction (0-1) for every row in a single batch"""
+        slot = list(INTERVENTIONS).index(intervention)
+        features[:, len(ROUTE_FEATURES):] = 0
+        features[:, len(ROUTE_FEATURES) + slot] = 1
+        return np.clip(self.booster.inplace_predict(features), 0, 1)
+
+    def predict_impact(self, features: np.ndarray, intervention: str) -> Dict:
+        """Aggregate per-route predictions into the simulator's headline figures"""
+        spec = INTERVENTIONS[intervention]
+        if not len(features):
+            return {}
+        with self._lock:
+            reduction = self.score(features, intervention)
+        safety = features[:, ROUTE_FEATURES.index('safety_score')]
+        cyclists = features[:, ROUTE_FEATURES.index('daily_cyclists')]
+        # incident_rate is expected incidents on the route per month, at its observed ridership
+        incidents = features[:, ROUTE_FEATURES.index('incident_rate')] * MONTHS_PER_YEAR
+
+        weights = np.maximum(incidents, 1e-6)
+        incident_reduction = float(np.average(reduction, weights=weights))
+        satisfaction = np.clip(safety / 10 + reduction * (1 - safety / 10), 0, 1)
+        cyclist_satisfaction = float(np.average(satisfaction, weights=np.maximum(cyclists, 1)))
+
+        # Net return of treating every route, over the intervention's lifespan
+        benefit = float((reduction * incidents).sum()) * INCIDENT_COST * spec["lifespan_years"]
+        cost = spec["cost_per_route"] * len(features)
+        roi = (benefit - cost) / cost * 100
+
+        return {
+            "incident_reduction": round(incident_reduction * 100),
+            "cyclist_satisfaction": round(cyclist_satisfaction * 100),
+            "implementation_time": spec["implementation_time"],
+            "roi": f"{roi:.0f}%"
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import aiohttp
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+# OpenAI-compatible chat completions endpoint (Groq by default)
+LLM_BASE_URL = os.environ.get("CYCLESAFE_LLM_URL", "https://api.groq.com/openai/v1")
+LLM_MODEL = os.environ.get("CYCLESAFE_LLM_MODEL", "llama-3.1-8b-instant")
+LLM_API_KEY = os.environ.get("GROQ_API_KEY", "")
+
+SYSTEM_PROMPT = (
+    "You are CycleSafe AI, a friendly cycling-safety assistant for city planners. "
+    "Answer in two or three plain-language sentences, using everyday analogies and concrete numbers."
+)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def llm_configured() -> bool:
+    """Whether an API key or a custom (e.g. local stand-in) endpoint has been set"""
+    return bool(LLM_API_KEY or "CYCLESAFE_LLM_URL" in os.environ)
+
+
+class LLMError(Exception):
+    """Raised when the LLM endpoint cannot produce a response"""
+
+
+class _RetryableStatus(LLMError):
+    pass
+
+
+def _is_retryable(error: BaseException) -> bool:
+    return isinstance(error, (_RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class AsyncLLMClient:
+    """Pooled aiohttp client streaming chat completions token by token"""
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = LLM_API_KEY, model: str = LLM_MODEL,
+                 max_connections: int = 20, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_attempts: int = 3):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_attempts = max_attempts
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60),
+                timeout=self.timeout,
+                headers=headers,
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _open_stream(self, messages: List[Dict]) -> aiohttp.ClientResponse:
+        """Start a streamed completion, retrying connection failures and transient statuses"""
+        session = await self._get_session()
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential(multiplier=0.25, max=4),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True,
+        ):
+            with attempt:
+                response = await session.post(f"{self.base_url}/chat/completions", json=payload)
+                if response.status in RETRYABLE_STATUS:
+                    response.release()
+                    raise _RetryableStatus(f"LLM endpoint returned {response.status}")
+                if response.status >= 400:
+                    body = await response.text()
+                    response.release()
+                    raise LLMError(f"LLM endpoint returned {response.status}: {body[:200]}")
+                return response
+
+    async def stream_chat(self, question: str, context: str = "") -> AsyncIterator[str]:
+        """Yield response tokens from a server-sent-events completion stream"""
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if context:
+            messages.append({"role": "system", "content": f"City data summary: {context}"})
+        messages.append({"role": "user", "content": question})
+
+        response = await self._open_stream(messages)
+        try:
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+        finally:
+            response.release()
+
+
+class LLMBridge:
+    """Runs the async client on a background event loop and exposes sync token streams"""
+
+    def __init__(self, client: Optional[AsyncLLMClient] = None):
+        self.client = client or AsyncLLMClient()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-event-loop", daemon=True)
+        self._thread.start()
+
+    def stream(self, question: str, context: str = "") -> Iterator[str]:
+        """Blocking iterator over tokens, suitable for st.write_stream"""
+        tokens: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for token in self.client.stream_chat(question, context):
+                    tokens.put(token)
+            except Exception as error:
+                tokens.put(error)
+            finally:
+                tokens.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        while True:
+            item = tokens.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,65 @@
+"""Local stand-in for the OpenAI-compatible LLM endpoint, for tests and offline development
+
+    python llm_stub.py --port 8765
+    CYCLESAFE_LLM_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+"""
+import argparse
+import asyncio
+import json
+
+from aiohttp import web
+
+DEFAULT_REPLY = (
+    "Think of your busiest junctions as the city's pressure points. "
+    "Fixing the top three would prevent most sudden-braking incidents next month."
+)
+# Request counter of a running stub, for tests
+STUB_STATE = web.AppKey("state", dict)
+
+
+def create_stub_app(reply: str = DEFAULT_REPLY, token_delay: float = 0.02, fail_first: int = 0) -> web.Application:
+    """aiohttp app streaming `reply` word by word; the first `fail_first` requests get a 503"""
+    state = {"requests": 0}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        state["requests"] += 1
+        if state["requests"] <= fail_first:
+            return web.Response(status=503, text="warming up")
+        body = await request.json()
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, word in enumerate(reply.split(" ")):
+            chunk = {
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(token_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app[STUB_STATE] = state
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+async def start_stub_server(host: str = "127.0.0.1", port: int = 0, **app_options):
+    """Start the stub in the running loop; returns (base_url, runner) - call runner.cleanup() to stop"""
+    runner = web.AppRunner(create_stub_app(**app_options))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return f"http://{host}:{bound_port}/v1", runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+    web.run_app(create_stub_app(token_delay=args.token_delay), host=args.host, port=args.port)
@@ -0,0 +1,121 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Candidate sets up to this size are solved exactly on their real costs
+EXACT_MAX_ITEMS = 24
+
+
+def _knapsack_dp(values: np.ndarray, weights: np.ndarray, capacity: int) -> np.ndarray:
+    """Exact 0/1 knapsack over integer weights; returns a boolean selection mask"""
+    n = len(values)
+    best = np.zeros(capacity + 1)
+    keep = np.zeros((n, capacity + 1), dtype=bool)
+    for i in range(n):
+        w = weights[i]
+        if w > capacity:
+            continue
+        candidate = best[:capacity + 1 - w] + values[i]
+        improved = candidate > best[w:]
+        keep[i, w:] = improved
+        best[w:] = np.where(improved, candidate, best[w:])
+
+    # Walk the decisions backwards to recover the chosen items
+    chosen = np.zeros(n, dtype=bool)
+    c = int(np.argmax(best))
+    for i in range(n - 1, -1, -1):
+        if keep[i, c]:
+            chosen[i] = True
+            c -= weights[i]
+    return chosen
+
+
+def _subset_sums(values: np.ndarray, costs: np.ndarray):
+    """Bitmask, total value and total cost of every subset of a few items"""
+    masks = np.arange(1 << len(values), dtype=np.int64)
+    bits = ((masks[:, None] >> np.arange(len(values))) & 1).astype(np.float64)
+    return masks, bits @ values, bits @ costs
+
+
+def _knapsack_exact(values: np.ndarray, costs: np.ndarray, capacity: float) -> np.ndarray:
+    """Exact 0/1 knapsack over real costs by meet in the middle; returns a boolean selection mask
+
+    Every subset of each half is enumerated; for each subset of the first
+    half, the best affordable subset of the second is found by binary search
+    over the second half sorted by cost with a running best value.
+    """
+    half = len(values) // 2
+    masks_a, values_a, costs_a = _subset_sums(values[:half], costs[:half])
+    masks_b, values_b, costs_b = _subset_sums(values[half:], costs[half:])
+    order = np.argsort(costs_b, kind="stable")
+    masks_b, values_b, costs_b = masks_b[order], values_b[order], costs_b[order]
+    running_best = np.maximum.accumulate(values_b)
+    # Latest position holding the running best, i.e. the best subset at or below each cost
+    running_arg = np.maximum.accumulate(np.where(values_b == running_best, np.arange(len(values_b)), 0))
+
+    room = capacity - costs_a
+    pick = np.searchsorted(costs_b, room, side="right") - 1
+    totals = np.where(room >= 0, values_a + running_best[np.maximum(pick, 0)], -np.inf)
+    a = int(np.argmax(totals))
+    b = int(running_arg[pick[a]])
+    chosen_mask = int(masks_a[a]) | (int(masks_b[b]) << half)
+    return ((chosen_mask >> np.arange(len(values))) & 1).astype(bool)
+
+
+def optimize_budget(candidates: pd.DataFrame, budget: float, value_column: str = "value",
+                    cost_column: str = "estimated_cost", cost_buckets: int = 1000,
+                    max_buckets: int = 10000, core_size: int = 1000) -> Dict:
+    """Pick the set of fixes with the highest total value that fits in the budget
+
+    Up to EXACT_MAX_ITEMS affordable fixes are solved exactly, by meet in the
+    middle on their real costs. Larger sets are approximate: costs are rounded
+    up to whole budget buckets (cost_buckets to max_buckets of them), so every
+    plan is feasible. The greedy value-per-dollar prefix is kept, and only the
+    core_size items around the greedy break point are re-solved by dynamic
+    programming, since that is where the greedy and optimal plans differ. The
+    result is reported against the fractional (LP relaxation) upper bound.
+    """
+    costs = candidates[cost_column].to_numpy(dtype=np.float64)
+    values = candidates[value_column].to_numpy(dtype=np.float64)
+    eligible = np.flatnonzero((costs <= budget) & (costs > 0) & (values > 0))
+
+    # Rank by value per dollar; the fractional knapsack bound falls out of the sort
+    order = eligible[np.argsort(-values[eligible] / costs[eligible], kind="stable")]
+    cumulative = np.cumsum(costs[order])
+    n_fit = int(np.searchsorted(cumulative, budget, side="right"))
+    bound = values[order[:n_fit]].sum()
+    if n_fit < len(order):
+        spare = budget - (cumulative[n_fit - 1] if n_fit else 0.0)
+        bound += values[order[n_fit]] * spare / costs[order[n_fit]]
+
+    if len(order) <= EXACT_MAX_ITEMS:
+        selected = order[_knapsack_exact(values[order], costs[order], budget)]
+    else:
+        # Finer buckets when many fixes fit, so rounding does not eat the budget
+        bucket = budget / max(cost_buckets, min(20 * n_fit, max_buckets))
+        core_start = max(0, n_fit - core_size // 2)
+        fixed = order[:core_start]
+        core = order[core_start:core_start + core_size]
+        capacity = int(np.floor((budget - costs[fixed].sum()) / bucket))
+        weights = np.ceil(costs[core] / bucket).astype(np.int64)
+        selected = np.concatenate([fixed, core[_knapsack_dp(values[core], weights, capacity)]])
+
+    # The single most valuable affordable fix bounds the worst case at half the optimum
+    if len(eligible):
+        best_single = eligible[np.argmax(values[eligible])]
+        if values[best_single] > values[selected].sum():
+            selected = np.array([best_single])
+
+    plan = candidates.iloc[selected].sort_values(value_column, ascending=False)
+    total_cost = float(costs[selected].sum())
+    total_value = float(values[selected].sum())
+    return {
+        "plan": plan,
+        "total_cost": total_cost,
+        "remaining_budget": budget - total_cost,
+        "total_value": total_value,
+        "value_bound": float(bound),
+        "optimality": total_value / bound if bound else 1.0,
+        "budget_efficiency": total_cost / budget if budget else 0.0,
+    }
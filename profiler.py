@@ -0,0 +1,188 @@
+import contextlib
+import functools
+import json
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Profiling is opt-in: CYCLESAFE_PROFILE=1 for the whole process, or ?debug=1 per session
+PROFILE_ENV = "CYCLESAFE_PROFILE"
+# When set, every profiled rerun is also written here as a JSON file
+PROFILE_DIR = os.environ.get("CYCLESAFE_PROFILE_DIR")
+# Streamlit has no public hook for outgoing messages, so element counts wrap this
+# private ScriptRunContext field (present in the streamlit pinned in requirements.txt);
+# when a release drops it the profiler keeps the timings and skips the counts
+ENQUEUE_ATTR = "_enqueue"
+
+
+def profiling_enabled() -> bool:
+    if os.environ.get(PROFILE_ENV) == "1":
+        return True
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+
+class RenderProfiler:
+    """Per-session timings plus element/byte counts for every profiled component"""
+
+    def __init__(self, session_id: str, history_size: int = 50):
+        self.session_id = session_id
+        self.history = deque(maxlen=history_size)
+        self.run: Optional[Dict] = None
+        self.memory: Dict[str, Dict] = {}
+        self.counts_elements = True
+        self._stack: List[str] = []
+
+    def install(self, ctx):
+        """Count every message this session's script run sends to the browser"""
+        if getattr(ctx, "_render_profiler", None) is self:
+            return
+        ctx._render_profiler = self
+        send = getattr(ctx, "_profiler_original_enqueue", getattr(ctx, ENQUEUE_ATTR, None))
+        if not callable(send):
+            self.counts_elements = False
+            return
+
+        def counting_enqueue(msg):
+            self._count(msg)
+            send(msg)
+
+        ctx._profiler_original_enqueue = send
+        setattr(ctx, ENQUEUE_ATTR, counting_enqueue)
+
+    def _component(self, name: str) -> Dict:
+        return self.run["components"].setdefault(name, {"calls": 0, "seconds": 0.0, "elements": 0, "bytes": 0})
+
+    def _count(self, msg):
+        if self.run is None or not msg.HasField("delta"):
+            return
+        stats = self._component(self._stack[-1] if self._stack else "(page)")
+        stats["elements"] += 1
+        stats["bytes"] += msg.ByteSize()
+
+    def start_run(self, kind: str):
+        self.run = {"session_id": self.session_id, "kind": kind, "started_at": time.time(),
+                    "components": {}, "_t0": time.perf_counter()}
+
+    def finish_run(self):
+        run, self.run = self.run, None
+        run["total_seconds"] = time.perf_counter() - run.pop("_t0")
+        run["components"] = [{"component": name, **stats} for name, stats in run["components"].items()]
+        self.history.append(run)
+        if PROFILE_DIR:
+            path = Path(PROFILE_DIR) / f"rerun-{self.session_id[:8]}-{int(run['started_at'] * 1000)}.json"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(run, indent=2))
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        self._stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            stats = self._component(name)
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+
+
+def get_profiler() -> Optional[RenderProfiler]:
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    if "_render_profiler" not in st.session_state:
+        st.session_state["_render_profiler"] = RenderProfiler(ctx.session_id)
+    profiler = st.session_state["_render_profiler"]
+    profiler.install(ctx)
+    return profiler
+
+
+@contextlib.contextmanager
+def profile_run(kind: str = "full"):
+    """Collect one rerun's report when profiling is enabled"""
+    profiler = get_profiler() if profiling_enabled() else None
+    if profiler is None:
+        yield None
+        return
+    profiler.start_run(kind)
+    try:
+        yield profiler
+    finally:
+        profiler.finish_run()
+
+
+def profiled(fn: Callable) -> Callable:
+    """Time a component and attribute the elements it emits to it"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not profiling_enabled():
+            return fn(*args, **kwargs)
+        profiler = get_profiler()
+        if profiler is None:
+            return fn(*args, **kwargs)
+        # A fragment rerun executes the component outside of main(); report it on its own
+        own_run = profiler.run is None
+        if own_run:
+            profiler.start_run(f"fragment:{fn.__name__}")
+        try:
+            with profiler.measure(fn.__name__):
+                return fn(*args, **kwargs)
+        finally:
+            if own_run:
+                profiler.finish_run()
+    return wrapper
+
+
+def record_memory(reports: List[Dict]):
+    """Keep the latest per-frame memory report for the debug panel"""
+    if not profiling_enabled():
+        return
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.memory.update({report["frame"]: report for report in reports})
+
+
+def render_debug_panel():
+    """Hidden debug panel with the latest rerun reports"""
+    if not profiling_enabled():
+        return
+    profiler = get_profiler()
+    if profiler is None or not profiler.history:
+        return
+    latest = profiler.history[-1]
+    with st.expander(f"🛠️ Render profile - last {latest['kind']} rerun took {latest['total_seconds'] * 1000:.0f} ms"):
+        table = pd.DataFrame(latest["components"])
+        if not table.empty:
+            table["ms"] = (table.pop("seconds") * 1000).round(1)
+            st.dataframe(table.sort_values("ms", ascending=False), use_container_width=True, hide_index=True)
+        if not profiler.counts_elements:
+            st.caption("Element and byte counts are not available with this Streamlit version; timings only.")
+        st.dataframe(
+            pd.DataFrame([
+                {"kind": run["kind"], "ms": round(run["total_seconds"] * 1000, 1),
+                 "elements": sum(c["elements"] for c in run["components"]),
+                 "bytes": sum(c["bytes"] for c in run["components"])}
+                for run in reversed(profiler.history)
+            ]),
+            use_container_width=True,
+            hide_index=True
+        )
+        if profiler.memory:
+            st.markdown("**Frame memory** (default dtypes vs enforced schema)")
+            st.dataframe(pd.DataFrame(list(profiler.memory.values())), use_container_width=True, hide_index=True)
+        st.download_button(
+            "⬇️ Download profile JSON",
+            data=json.dumps(list(profiler.history), indent=2),
+            file_name=f"render-profile-{profiler.session_id[:8]}.json",
+            mime="application/json"
+        )
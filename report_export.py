@@ -0,0 +1,252 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cached_property
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from cachetools import TTLCache
+
+# Extension and MIME type of every export format
+REPORT_FORMATS = {
+    "PDF": ("pdf", "application/pdf"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+# Finished reports kept for download, in bytes, and how long they stay
+REPORT_CACHE_MB = int(os.environ.get("CYCLESAFE_REPORT_CACHE_MB", 64))
+REPORT_TTL_SECONDS = 3600
+# Finished jobs the cache does not keep (failed, or larger than the whole cache) stay
+# visible for download or their error message this long, and only this many at once
+SETTLED_JOBS = 4
+SETTLED_TTL_SECONDS = 300
+# Reports rendered at once; more wait in the queue
+REPORT_WORKERS = int(os.environ.get("CYCLESAFE_REPORT_WORKERS", 1))
+# Rows written between progress updates, and plan rows per PDF page
+CHUNK_ROWS = 50_000
+PDF_ROWS_PER_PAGE = 40
+# Fixes listed in the PDF; longer plans are listed in full only in CSV/Parquet (matplotlib tables are slow)
+PDF_MAX_ROWS = 400
+
+
+@dataclass(frozen=True)
+class ActionPlanReport:
+    """Everything an exported action plan shows: budget tracker, quick wins and the full list of fixes"""
+    city: str
+    version: str
+    budget: int
+    total_cost: int
+    efficiency: float
+    fixes: pd.DataFrame
+    quick_wins: List[Dict]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.fixes.memory_usage(deep=True).sum())
+
+    @property
+    def remaining_budget(self) -> int:
+        return self.budget - self.total_cost
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Changes whenever anything in the report would change"""
+        digest = hashlib.sha1(f"{self.city}|{self.version}|{self.budget}|{self.total_cost}|{self.quick_wins}".encode())
+        digest.update(pd.util.hash_pandas_object(self.fixes, index=False).to_numpy().tobytes())
+        return digest.hexdigest()[:16]
+
+    def filename(self, fmt: str) -> str:
+        return f"cyclesafe-action-plan-{self.city.lower().replace(' ', '-')}-{self.budget}.{REPORT_FORMATS[fmt][0]}"
+
+
+@dataclass
+class ReportJob:
+    """One export in flight: its progress, and the file or error it ended with"""
+    key: str
+    fmt: str
+    filename: str
+    progress: float = 0.0
+    stage: str = "Queued"
+    data: Optional[bytes] = None
+    error: Optional[str] = None
+    started: float = field(default_factory=time.monotonic)
+    elapsed: float = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.data is not None or self.error is not None
+
+
+Progress = Callable[[float, str], None]
+
+
+def _write_csv(report: ActionPlanReport, progress: Progress) -> bytes:
+    buffer = io.StringIO()
+    for start in range(0, max(len(report.fixes), 1), CHUNK_ROWS):
+        report.fixes.iloc[start:start + CHUNK_ROWS].to_csv(buffer, index=False, header=start == 0)
+        progress(min(start + CHUNK_ROWS, len(report.fixes)) / max(len(report.fixes), 1), "Writing fixes")
+    return buffer.getvalue().encode()
+
+
+def _write_parquet(report: ActionPlanReport, progress: Progress) -> bytes:
+    table = pa.Table.from_pandas(report.fixes, preserve_index=False)
+    # The budget tracker and quick wins travel as file metadata next to the plan rows
+    metadata = {
+        **(table.schema.metadata or {}),
+        b"cyclesafe.city": report.city.encode(),
+        b"cyclesafe.budget": str(report.budget).encode(),
+        b"cyclesafe.total_cost": str(report.total_cost).encode(),
+        b"cyclesafe.efficiency": f"{report.efficiency:.4f}".encode(),
+        b"cyclesafe.quick_wins": pd.DataFrame(report.quick_wins).to_json(orient="records").encode(),
+    }
+    table = table.replace_schema_metadata(metadata)
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, table.schema, compression="zstd") as writer:
+        for start in range(0, max(table.num_rows, 1), CHUNK_ROWS):
+            writer.write_table(table.slice(start, CHUNK_ROWS))
+            progress(min(start + CHUNK_ROWS, table.num_rows) / max(table.num_rows, 1), "Writing fixes")
+    return buffer.getvalue()
+
+
+def _table_page(figure, title: str, frame: pd.DataFrame):
+    axes = figure.add_axes([0.05, 0.05, 0.9, 0.85])
+    axes.axis("off")
+    figure.suptitle(title, fontsize=14, x=0.05, ha="left")
+    if len(frame):
+        table = axes.table(cellText=frame.astype(str).to_numpy(), colLabels=list(frame.columns),
+                           loc="upper center", cellLoc="left")
+        table.auto_set_font_size(False)
+        table.set_fontsize(7)
+        table.scale(1, 1.2)
+
+
+def _write_pdf(report: ActionPlanReport, progress: Progress) -> bytes:
+    # Imported here so the app starts without paying for matplotlib; Figure objects
+    # (not pyplot) keep rendering safe off the main thread
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    shown = report.fixes.head(PDF_MAX_ROWS)
+    pages = 1 + -(-len(shown) // PDF_ROWS_PER_PAGE)
+    buffer = io.BytesIO()
+    with PdfPages(buffer, metadata={"Title": f"CycleSafe action plan - {report.city}"}) as pdf:
+        figure = Figure(figsize=(11.69, 8.27))
+        figure.text(0.05, 0.92, f"CycleSafe Action Plan - {report.city}", fontsize=20, weight="bold")
+        figure.text(0.05, 0.87, f"Generated {datetime.now():%d %B %Y %H:%M}", fontsize=9, color="#666666")
+        tracker = [("Budget", f"${report.budget:,}"), ("Recommended spend", f"${report.total_cost:,}"),
+                   ("Remaining budget", f"${report.remaining_budget:,}"), ("Budget efficiency", f"{report.efficiency:.0%}"),
+                   ("Fixes in plan", f"{len(report.fixes):,}")]
+        for i, (label, value) in enumerate(tracker):
+            figure.text(0.05 + i * 0.18, 0.76, value, fontsize=16, weight="bold", color="#2d5a2d")
+            figure.text(0.05 + i * 0.18, 0.72, label, fontsize=9, color="#666666")
+        figure.text(0.05, 0.62, "Top quick wins", fontsize=14, weight="bold")
+        for i, win in enumerate(report.quick_wins):
+            figure.text(0.05, 0.57 - i * 0.05, f"{win['rank']}. {win['action']} - {win['effort']} effort, "
+                        f"{win['impact']} impact, {win['timeline']}, {win['cost']}", fontsize=10)
+        if len(report.fixes):
+            by_complexity = report.fixes.groupby("fix_complexity", observed=True)["estimated_cost"].sum()
+            axes = figure.add_axes([0.55, 0.08, 0.4, 0.3])
+            axes.barh(by_complexity.index.astype(str), by_complexity.to_numpy(), color="#4facfe")
+            axes.set_title("Spend by fix complexity ($)", fontsize=10)
+            axes.tick_params(labelsize=8)
+        pdf.savefig(figure)
+        progress(1 / pages, "Summary page")
+        for page, start in enumerate(range(0, len(shown), PDF_ROWS_PER_PAGE), 2):
+            figure = Figure(figsize=(11.69, 8.27))
+            _table_page(figure, f"Recommended fixes {start + 1:,}-{min(start + PDF_ROWS_PER_PAGE, len(shown)):,}"
+                                f" of {len(report.fixes):,}", shown.iloc[start:start + PDF_ROWS_PER_PAGE])
+            pdf.savefig(figure)
+            progress(page / pages, f"Fixes page {page - 1} of {pages - 1}")
+    return buffer.getvalue()
+
+
+WRITERS = {"PDF": _write_pdf, "CSV": _write_csv, "Parquet": _write_parquet}
+
+
+class ReportExporter:
+    """Action plan exports rendered on background threads, with finished files cached by plan fingerprint
+
+    Submitting a report that is already rendered, or already being rendered,
+    returns the existing job, so exporting an unchanged plan again costs
+    nothing. The Streamlit script only polls job progress and never waits
+    on rendering.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, max_bytes: int = REPORT_CACHE_MB * 2**20,
+                 ttl_seconds: float = REPORT_TTL_SECONDS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-export")
+        self._finished = TTLCache(maxsize=max_bytes, ttl=ttl_seconds, getsizeof=self._sizeof)
+        self._running: Dict[str, ReportJob] = {}
+        self._settled = TTLCache(maxsize=SETTLED_JOBS, ttl=SETTLED_TTL_SECONDS)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _sizeof(job: ReportJob) -> int:
+        return sys.getsizeof(job.data or b"")
+
+    @staticmethod
+    def key(report: ActionPlanReport, fmt: str) -> str:
+        return f"{report.fingerprint}.{REPORT_FORMATS[fmt][0]}"
+
+    def get(self, key: str) -> Optional[ReportJob]:
+        """The finished or in-flight job for key, if any"""
+        with self._lock:
+            return self._finished.get(key) or self._running.get(key) or self._settled.get(key)
+
+    def submit(self, report: ActionPlanReport, fmt: str) -> ReportJob:
+        key = self.key(report, fmt)
+        with self._lock:
+            job = self._finished.get(key) or self._running.get(key)
+            if job is not None:
+                self.hits += 1
+                return job
+            self.misses += 1
+            job = ReportJob(key, fmt, report.filename(fmt))
+            self._running[key] = job
+        self._pool.submit(self._render, job, report)
+        return job
+
+    def _render(self, job: ReportJob, report: ActionPlanReport):
+        def progress(fraction: float, stage: str):
+            job.progress, job.stage = min(fraction, 1.0), stage
+
+        job.started = time.monotonic()
+        try:
+            data = WRITERS[job.fmt](report, progress)
+        except Exception as error:
+            job.error = f"{type(error).__name__}: {error}"
+        else:
+            job.progress, job.stage = 1.0, "Ready"
+            job.data = data
+        job.elapsed = time.monotonic() - job.started
+        with self._lock:
+            self._running.pop(job.key, None)
+            # Failures, and files larger than the whole cache, are kept only briefly; submitting
+            # the same report again retries or re-renders them
+            if job.error is None and self._sizeof(job) <= self._finished.maxsize:
+                self._finished[job.key] = job
+            else:
+                self._settled[job.key] = job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "running": sum(not job.done for job in self._running.values()),
+                "cached": len(self._finished),
+                "bytes": self._finished.currsize,
+                "max_bytes": self._finished.maxsize,
+            }
@@ -0,0 +1,73 @@
+import re
+import sys
+import threading
+from typing import Dict, Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "what", "whats", "s", "which", "my", "our", "in", "of", "for",
+    "to", "me", "i", "we", "can", "do", "does", "how", "please", "tell", "about", "city", "on", "with",
+}
+
+# Words planners use interchangeably, mapped to one canonical form
+SYNONYMS = {
+    "biggest": "top", "largest": "top", "main": "top", "greatest": "top", "worst": "top", "primary": "top",
+    "concern": "issue", "concerns": "issue", "problem": "issue", "problems": "issue", "issues": "issue",
+    "risk": "issue", "risks": "issue",
+    "improving": "improve", "better": "improve", "increase": "improve",
+    "cyclist": "cyclists", "bikers": "cyclists", "riders": "cyclists", "cycling": "cyclists",
+    "funds": "budget", "money": "budget", "spend": "budget", "spending": "budget",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Canonical form of a question, so near-identical phrasings share a cache key"""
+    tokens = re.findall(r"[a-z0-9]+", question.lower().replace("'", ""))
+    canonical = {SYNONYMS.get(token, token) for token in tokens}
+    return " ".join(sorted(canonical - STOPWORDS))
+
+
+class ResponseCache:
+    """Thread-safe LRU/TTL cache of assistant answers with a memory cap and hit-rate stats"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 3600):
+        self._entries = TTLCache(maxsize=max_bytes, ttl=ttl_seconds, getsizeof=self._sizeof)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _sizeof(value: str) -> int:
+        return sys.getsizeof(value)
+
+    @staticmethod
+    def key(question: str, data_version: str) -> Tuple[str, str]:
+        return normalize_question(question), data_version
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: str):
+        with self._lock:
+            # Entries larger than the whole cache are simply not stored
+            if self._sizeof(value) <= self._entries.maxsize:
+                self._entries[key] = value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._entries.currsize,
+                "max_bytes": self._entries.maxsize,
+            }
@@ -0,0 +1,247 @@
+import itertools
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from data_store import NarrativeDataStore, publish_file, read_manifest
+from event_ingest import HotspotAggregator
+from schema import SCHEMAS, to_typed_frame
+
+DIMENSIONS = ["area", "primary_users", "time_of_day", "month"]
+# Marker for "all values" of a dimension in a cube key
+ALL = "*"
+
+# Columns each table's measures are computed from
+ROUTE_COLUMNS = ["safety_score", "daily_cyclists", "incident_rate"]
+HOTSPOT_COLUMNS = ["risk_level", "affected_cyclists"]
+ROUTE_MEASURES = ["routes", "safety_score_sum", "daily_cyclists", "incidents"]
+HOTSPOT_MEASURES = ["hotspots", "priority_areas", "affected_cyclists"]
+MEASURES = ROUTE_MEASURES + HOTSPOT_MEASURES
+
+# Cube files kept behind the published one, for pages still holding an older manifest
+KEEP_PREVIOUS_CUBES = 2
+
+# Hotspots at this risk level count as priority areas on the dashboard
+PRIORITY_RISK_LEVEL = "Critical"
+
+
+def _route_measures(chunk: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "routes": 1,
+        "safety_score_sum": chunk["safety_score"].to_numpy(dtype=np.float64),
+        "daily_cyclists": chunk["daily_cyclists"].to_numpy(dtype=np.float64),
+        # incident_rate is expected incidents on the route per month, at its observed ridership
+        "incidents": chunk["incident_rate"].to_numpy(dtype=np.float64),
+    }, index=chunk.index)
+
+
+def _hotspot_measures(chunk: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "hotspots": 1,
+        "priority_areas": (chunk["risk_level"].to_numpy() == PRIORITY_RISK_LEVEL).astype(np.int64),
+        "affected_cyclists": chunk["affected_cyclists"].to_numpy(dtype=np.float64),
+    }, index=chunk.index)
+
+
+def _table_dims(store: NarrativeDataStore, table: str) -> List[str]:
+    names = store.schema(table).names
+    return [d for d in DIMENSIONS if d in names]
+
+
+def _partial(chunk: pd.DataFrame, dims: List[str], measures: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+    # Categorical keys group on their integer codes; tables without any dimension group on a constant key
+    keys = [chunk[d] for d in dims] or [np.zeros(len(chunk), dtype=np.int8)]
+    return measures(chunk).groupby(keys, sort=False, observed=True).sum()
+
+
+def _combine(frames: List[pd.DataFrame], dims: List[str]) -> pd.DataFrame:
+    return pd.concat(frames).groupby(level=list(range(max(len(dims), 1))), observed=True).sum()
+
+
+def _finish_grain(grain: pd.DataFrame, dims: List[str]) -> pd.DataFrame:
+    grain.index.names = dims or ["_all"]
+    grain = grain.reset_index().drop(columns="_all", errors="ignore")
+    for d in dims:
+        grain[d] = grain[d].astype(str)
+    # Dimensions a table does not carry only exist at the "all" level for its measures
+    for d in DIMENSIONS:
+        if d not in grain:
+            grain[d] = ALL
+    return grain
+
+
+def _finest_grain(store: NarrativeDataStore, table: str, measure_columns: List[str],
+                  measures: Callable[[pd.DataFrame], pd.DataFrame],
+                  transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+                  batch_rows: int = 1_000_000, compact_every: int = 16) -> pd.DataFrame:
+    """Stream a table and sum its measures per combination of the dimensions it has
+
+    Every measure is additive, so per-batch partial sums can be combined in
+    any order; memory is bounded by the number of distinct dimension
+    combinations, not by the table size.
+    """
+    dims = _table_dims(store, table)
+    extra = ["location_id"] if transform is not None and "location_id" in store.schema(table).names else []
+    columns = list(dict.fromkeys(dims + measure_columns + extra))
+
+    partials = []
+    for batch in store.iter_batches(table, columns, batch_rows):
+        chunk = to_typed_frame(batch, SCHEMAS[table])
+        if transform is not None:
+            chunk = transform(chunk)
+        partials.append(_partial(chunk, dims, measures))
+        if len(partials) >= compact_every:
+            partials = [_combine(partials, dims)]
+
+    grain = _combine(partials, dims) if partials else measures(pd.DataFrame(columns=measure_columns)).iloc[:0]
+    return _finish_grain(grain, dims)
+
+
+def _rollups(grain: pd.DataFrame, measure_names: List[str]) -> pd.DataFrame:
+    """All 2^len(DIMENSIONS) group-by subsets of the finest grain, with ALL for rolled-up dimensions"""
+    present = [d for d in DIMENSIONS if (grain[d] != ALL).any()]
+    levels = []
+    for size in range(len(present) + 1):
+        for subset in itertools.combinations(present, size):
+            if subset:
+                level = grain.groupby(list(subset), sort=False, observed=True)[measure_names].sum().reset_index()
+            else:
+                level = grain[measure_names].sum().to_frame().T
+            for d in DIMENSIONS:
+                if d not in subset:
+                    level[d] = ALL
+            levels.append(level[DIMENSIONS + measure_names])
+    return pd.concat(levels, ignore_index=True)
+
+
+class RollupCube:
+    """Pre-aggregated measures for every combination of area, rider group, time of day and month
+
+    Each cell is addressed by a 4-tuple where any dimension may be ALL, so any
+    headline figure is a single dict lookup regardless of table size.
+    """
+
+    def __init__(self, cells: pd.DataFrame):
+        self.cells = cells.reset_index(drop=True)
+        self._values = self.cells[MEASURES].to_numpy(dtype=np.float64)
+        self._positions: Dict[tuple, int] = {
+            key: i for i, key in enumerate(zip(*(self.cells[d].tolist() for d in DIMENSIONS)))
+        }
+        months = self.cells.loc[self.cells["month"] != ALL, "month"].unique()
+        self.months: List[str] = sorted(months)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.cells.memory_usage(deep=True).sum()) + self._values.nbytes
+
+    @classmethod
+    def build(cls, store: NarrativeDataStore,
+              hotspot_transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+              batch_rows: int = 1_000_000) -> "RollupCube":
+        routes = _finest_grain(store, "routes", ROUTE_COLUMNS, _route_measures, batch_rows=batch_rows)
+        hotspots = _finest_grain(store, "hotspots", HOTSPOT_COLUMNS, _hotspot_measures, hotspot_transform, batch_rows)
+        cells = pd.merge(_rollups(routes, ROUTE_MEASURES), _rollups(hotspots, HOTSPOT_MEASURES),
+                         on=DIMENSIONS, how="outer")
+        return cls(cells.fillna(0.0))
+
+    def add(self, delta: pd.DataFrame) -> "RollupCube":
+        """A new cube with delta's measures (cells keyed on DIMENSIONS, any subset of MEASURES) added"""
+        if delta.empty:
+            return self
+        cells = pd.concat([self.cells, delta], ignore_index=True).fillna({m: 0.0 for m in MEASURES})
+        return RollupCube(cells.groupby(DIMENSIONS, sort=False)[MEASURES].sum().reset_index())
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        self.cells.to_parquet(tmp, index=False)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RollupCube":
+        return cls(pd.read_parquet(path))
+
+    def get(self, area: str = ALL, primary_users: str = ALL, time_of_day: str = ALL,
+            month: str = ALL) -> Dict[str, float]:
+        """Measures for one cell; zeros when nothing was observed there"""
+        position = self._positions.get((area, primary_users, time_of_day, month))
+        if position is None:
+            return dict.fromkeys(MEASURES, 0.0)
+        return dict(zip(MEASURES, self._values[position]))
+
+    def mean_safety_score(self, **key) -> float:
+        cell = self.get(**key)
+        return cell["safety_score_sum"] / cell["routes"] if cell["routes"] else float("nan")
+
+    def monthly(self, measure: str, **key) -> pd.Series:
+        """One measure per month (oldest first), with the other dimensions fixed by key"""
+        return pd.Series([self.get(**key, month=m)[measure] for m in self.months], index=self.months, name=measure)
+
+    def headline(self) -> Dict[str, float]:
+        """City-wide headline figures for the latest month, with the change since the month before"""
+        latest = self.months[-1] if self.months else ALL
+        previous = self.months[-2] if len(self.months) >= 2 else None
+        now = self.get(month=latest)
+        before = self.get(month=previous) if previous else None
+        figures = {
+            "safety_score": self.mean_safety_score(month=latest),
+            "daily_cyclists": now["daily_cyclists"],
+            "priority_areas": self.get()["priority_areas"],
+            "safety_change": float("nan"),
+            "cyclists_change_pct": float("nan"),
+        }
+        if before and before["routes"]:
+            figures["safety_change"] = figures["safety_score"] - self.mean_safety_score(month=previous)
+        if before and before["daily_cyclists"]:
+            figures["cyclists_change_pct"] = (now["daily_cyclists"] / before["daily_cyclists"] - 1) * 100
+        return figures
+
+
+def cube_manifest(root: Path) -> Dict:
+    """Name of the published cube file and the ones published before it (empty before the first build)"""
+    return read_manifest(Path(root) / "rollups")
+
+
+def _publish(root: Path, cube: RollupCube, store_version: str, aggregates_version: int) -> Path:
+    path = Path(root) / "rollups" / f"cube-{store_version}-v{aggregates_version:08d}.parquet"
+    cube.save(path)
+    return publish_file(path, KEEP_PREVIOUS_CUBES)
+
+
+def publish_rollup_cube(store: NarrativeDataStore, aggregator: HotspotAggregator) -> Path:
+    """Build the cube from the full tables and publish it; run wherever the tables themselves are published"""
+    version, aggregates = aggregator.snapshot()
+    cube = RollupCube.build(store, lambda hotspots: aggregator.apply(hotspots, aggregates))
+    return _publish(store.root, cube, store.version, version)
+
+
+def update_rollup_cube(store: NarrativeDataStore, aggregator: HotspotAggregator,
+                       before: Tuple[int, pd.DataFrame]) -> Path:
+    """Fold an ingest into the published cube, touching only the hotspots that received events
+
+    `before` is the aggregator snapshot taken before the ingest. Every measure
+    is additive, so the cube changes by the touched hotspots' new measures
+    minus their old ones. If the published cube is not the one the ingest
+    started from (another writer got in between, or the tables were
+    republished) it is rebuilt in full instead.
+    """
+    (before_version, before), (after_version, after) = before, aggregator.snapshot()
+    expected = f"cube-{store.version}-v{before_version:08d}.parquet"
+    if cube_manifest(store.root)["file"] != expected:
+        return publish_rollup_cube(store, aggregator)
+    cube = RollupCube.load(Path(store.root) / "rollups" / expected)
+    counts = before["event_count"].reindex(after.index).to_numpy(dtype=np.float64)
+    touched = after.index[after["event_count"].to_numpy(dtype=np.float64) != counts]
+    if len(touched):
+        dims = _table_dims(store, "hotspots")
+        hotspots = to_typed_frame(store.read_arrow("hotspots", list(dict.fromkeys(dims + HOTSPOT_COLUMNS + ["location_id"])),
+                                                   filter=ds.field("location_id").isin(touched.to_numpy())),
+                                  SCHEMAS["hotspots"])
+        old = _partial(aggregator.apply(hotspots, before), dims, _hotspot_measures)
+        new = _partial(aggregator.apply(hotspots, after), dims, _hotspot_measures)
+        delta = _finish_grain(_combine([new, -old], dims), dims)
+        cube = cube.add(_rollups(delta, HOTSPOT_MEASURES))
+    return _publish(store.root, cube, store.version, after_version)
@@ -0,0 +1,231 @@
+import heapq
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+from scipy.spatial import cKDTree
+
+from spatial_index import EARTH_RADIUS_M
+from street_network import ShortestPathTrees, StreetNetwork, UNPROTECTED_PENALTY
+
+# Extra cost per metre for each point of safety score below 10, and per expected incident
+SAFETY_WEIGHT = 0.15
+INCIDENT_WEIGHT = 0.5
+# Landmarks precomputed for the ALT heuristic; 0 falls back to straight-line distance only
+LANDMARKS = int(os.environ.get("CYCLESAFE_LANDMARKS", 16))
+# Origin/destination pairs whose answers are kept
+ROUTE_CACHE_SIZE = 4096
+
+
+def edge_risk(network: StreetNetwork, routes: Optional[pd.DataFrame] = None) -> np.ndarray:
+    """Per-edge cost multiplier (>= 1) from the safety score and incident rate of the route it is on
+
+    Edges without a route (or a network without route_id) get the network
+    average. Off protected lanes the multiplier is scaled by UNPROTECTED_PENALTY.
+    """
+    safety = np.full(network.n_edges, np.nan)
+    incidents = np.full(network.n_edges, np.nan)
+    if routes is not None and len(routes) and "route_id" in network.edges:
+        by_route = routes.drop_duplicates("route_id").set_index("route_id")
+        route_ids = network.edges["route_id"]
+        safety = route_ids.map(by_route["safety_score"].astype(np.float64)).to_numpy(dtype=np.float64)
+        incidents = route_ids.map(by_route["incident_rate"].astype(np.float64)).to_numpy(dtype=np.float64)
+    safety = np.where(np.isnan(safety), np.nanmean(safety) if not np.isnan(safety).all() else 10.0, safety)
+    incidents = np.where(np.isnan(incidents), np.nanmean(incidents) if not np.isnan(incidents).all() else 0.0, incidents)
+    risk = 1 + SAFETY_WEIGHT * np.clip(10 - safety, 0, 10) + INCIDENT_WEIGHT * np.clip(incidents, 0, None)
+    return np.where(network.protected, risk, risk * UNPROTECTED_PENALTY)
+
+
+class RoutePlanner:
+    """Safest-path queries over a street network: A* with landmark (ALT) lower bounds
+
+    Edge cost is length times edge_risk, which is never below 1, so the
+    straight-line distance to the destination is an admissible heuristic. With
+    landmarks, the triangle inequality over precomputed landmark distances
+    gives a much tighter bound and A* settles few nodes beyond the path itself.
+    Bounds are computed for every node once per query, and the search runs
+    from both ends. Answers are kept in a bounded LRU keyed by origin and
+    destination node.
+    """
+
+    def __init__(self, network: StreetNetwork, routes: Optional[pd.DataFrame] = None,
+                 landmarks: int = LANDMARKS, cache_size: int = ROUTE_CACHE_SIZE, seed: int = 42):
+        self.network = network
+        self.risk = edge_risk(network, routes)
+        self.cost = network.length_m * self.risk
+        adjacency = network.adjacency(self.cost)
+        self._indptr = adjacency.indptr
+        self._indices = adjacency.indices
+        self._weights = adjacency.data
+        self.trees = ShortestPathTrees(adjacency)
+        self._x_scale = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(float(np.mean(network.lat))))
+        self._y_scale = math.radians(1) * EARTH_RADIUS_M
+        self._xy = np.column_stack([network.lon * self._x_scale, network.lat * self._y_scale])
+        self._kdtree = cKDTree(self._xy)
+        self._landmark_dist = self._select_landmarks(landmarks, seed)
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.risk, self.cost, self._indptr, self._indices, self._weights, self._xy]
+        landmarks = self._landmark_dist.nbytes if self._landmark_dist is not None else 0
+        return sum(a.nbytes for a in arrays) + landmarks + self.network.nbytes
+
+    def _select_landmarks(self, count: int, seed: int) -> Optional[np.ndarray]:
+        """(count, n_nodes) float32 cost distances from landmarks picked by farthest-point selection"""
+        if count <= 0 or self.network.n_nodes == 0:
+            return None
+        rng = np.random.default_rng(seed)
+        chosen = []
+        nearest = np.full(self.network.n_nodes, np.inf)
+        candidate = int(rng.integers(self.network.n_nodes))
+        for _ in range(min(count, self.network.n_nodes)):
+            dist, _ = self.trees.tree(candidate)
+            chosen.append(dist)
+            nearest = np.minimum(nearest, dist)
+            # Next landmark: the reachable node furthest from all chosen so far
+            reachable = np.where(np.isfinite(nearest), nearest, -1)
+            candidate = int(np.argmax(reachable))
+            if reachable[candidate] <= 0:
+                break
+        return np.ascontiguousarray(np.vstack(chosen), dtype=np.float32)
+
+    def nearest_node(self, lat: float, lon: float) -> int:
+        _, node = self._kdtree.query([lon * self._x_scale, lat * self._y_scale])
+        return int(node)
+
+    def _heuristic(self, target: int) -> np.ndarray:
+        """Lower bound on the cost from every node to target, computed once per query
+
+        Risk-weighted landmark bounds all but always beat straight-line distance,
+        so that is only used when no landmark reaches target. Nodes in another
+        component than target come out inf and are pruned.
+        """
+        to_target = None if self._landmark_dist is None else self._landmark_dist[:, target]
+        if to_target is None or not np.isfinite(to_target).any():
+            # Shrunk slightly so the flat projection never overestimates a haversine length
+            return 0.99 * np.hypot(*(self._xy - self._xy[target]).T)
+        bound = np.zeros(self.network.n_nodes, dtype=np.float32)
+        gap = np.empty_like(bound)
+        # One pass per landmark over its contiguous row; landmarks outside target's component bound nothing
+        for row, at_target in zip(self._landmark_dist, to_target):
+            if np.isfinite(at_target):
+                np.subtract(row, at_target, out=gap)
+                np.abs(gap, out=gap)
+                np.maximum(bound, gap, out=bound)
+        return bound
+
+    def _astar(self, source: int, target: int) -> Tuple[Optional[list], int]:
+        """Node path of least cost and the number of nodes settled on the way
+
+        Bidirectional: a forward search from source and a reverse one from
+        target both use half the difference of the bounds to target and to
+        source as potential, so their reduced edge costs agree and the search
+        stops as soon as the two frontiers together cannot beat the best
+        meeting point found so far.
+        """
+        if source == target:
+            return [source], 1
+        with np.errstate(invalid="ignore"):
+            # inf - inf only occurs on nodes in another component, which neither search reaches
+            potential = ((self._heuristic(target) - self._heuristic(source)) / 2).tolist()
+        if not math.isfinite(potential[source]):
+            return None, 0
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        n_nodes = self.network.n_nodes
+        # Flat per-node arrays (forward, reverse): cheaper than dicts/sets for the nodes a query touches
+        dist = ([math.inf] * n_nodes, [math.inf] * n_nodes)
+        parent = ([-1] * n_nodes, [-1] * n_nodes)
+        settled = (bytearray(n_nodes), bytearray(n_nodes))
+        dist[0][source] = dist[1][target] = 0.0
+        frontiers = ([(potential[source], source)], [(-potential[target], target)])
+        best, meet, n_settled = math.inf, -1, 0
+        while frontiers[0] and frontiers[1] and frontiers[0][0][0] + frontiers[1][0][0] < best:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            frontier, cost_to, via, done, other = (frontiers[side], dist[side], parent[side],
+                                                  settled[side], dist[1 - side])
+            sign = 1.0 if side == 0 else -1.0
+            _, node = heapq.heappop(frontier)
+            if done[node]:
+                continue
+            done[node] = 1
+            n_settled += 1
+            cost = cost_to[node]
+            edges = slice(indptr[node], indptr[node + 1])
+            for neighbour, weight in zip(indices[edges].tolist(), weights[edges].tolist()):
+                new_cost = cost + weight
+                if new_cost < cost_to[neighbour] and not done[neighbour]:
+                    cost_to[neighbour] = new_cost
+                    via[neighbour] = node
+                    heapq.heappush(frontier, (new_cost + sign * potential[neighbour], neighbour))
+                    if new_cost + other[neighbour] < best:
+                        best, meet = new_cost + other[neighbour], neighbour
+        if meet < 0:
+            return None, n_settled
+        path = [meet]
+        while parent[0][path[-1]] >= 0:
+            path.append(parent[0][path[-1]])
+        path.reverse()
+        while parent[1][path[-1]] >= 0:
+            path.append(parent[1][path[-1]])
+        return path, n_settled
+
+    def _describe(self, path: list) -> Dict:
+        nodes = np.asarray(path, dtype=np.int64)
+        edges = self.network.edge_ids(nodes[:-1], nodes[1:])
+        length = self.network.length_m[edges]
+        protected = self.network.protected[edges]
+        return {
+            "nodes": nodes,
+            "lat": self.network.lat[nodes],
+            "lon": self.network.lon[nodes],
+            "length_m": float(length.sum()),
+            "protected_m": float(length[protected].sum()),
+            "risk_cost": float(self.cost[edges].sum()),
+            "streets": list(dict.fromkeys(self.network.edges["name"].to_numpy()[edges].tolist())),
+        }
+
+    def plan(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Optional[Dict]:
+        """Safest route between two (lat, lon) points, snapped to the nearest street nodes
+
+        Returns None if the points are not connected. "cached" tells whether
+        the answer came from the route cache, "settled" how many nodes A*
+        expanded and "elapsed_ms" the time the query took.
+        """
+        started = time.perf_counter()
+        key = (self.nearest_node(*origin), self.nearest_node(*destination))
+        with self._lock:
+            found = self._cache.get(key)
+            if found is not None:
+                self.hits += 1
+        if found is None:
+            path, settled = self._astar(*key)
+            found = dict(self._describe(path), settled=settled) if path is not None else {}
+            with self._lock:
+                self.misses += 1
+                self._cache[key] = found
+            cached = False
+        else:
+            cached = True
+        if not found:
+            return None
+        return dict(found, cached=cached, elapsed_ms=(time.perf_counter() - started) * 1000)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+                "landmarks": 0 if self._landmark_dist is None else len(self._landmark_dist),
+            }
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SCORE_COLUMNS = ['safety_score', 'incident_rate', 'weather_resilience', 'accessibility_score']
+# Contribution of each column to the 0-10 route score
+SCORE_WEIGHTS = np.array([0.4, 0.3, 0.15, 0.15])
+
+# Below this many routes the pool overhead outweighs the gain
+SERIAL_THRESHOLD = 1_000_000
+SCORING_WORKERS = int(os.environ.get("CYCLESAFE_SCORING_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def score_block(features: np.ndarray, out: np.ndarray):
+    """Score a (4, n) column-major feature block into out (n,) - the kernel every worker runs"""
+    safety, incident_rate, weather, access = features
+    # Each component is mapped onto 0..1 row by row, so shards never need global statistics
+    np.multiply(safety, SCORE_WEIGHTS[0] / 10, out=out)
+    out += SCORE_WEIGHTS[1] * np.exp(-incident_rate)
+    out += SCORE_WEIGHTS[2] * np.clip(weather, 0, 1)
+    out += SCORE_WEIGHTS[3] * np.clip(access, 0, 1)
+    out *= 10
+
+
+def _score_shard(features_name: str, scores_name: str, n_rows: int, start: int, stop: int) -> int:
+    """Worker entry point: attach to the shared buffers and score rows [start, stop)"""
+    features_block = shared_memory.SharedMemory(name=features_name)
+    scores_block = shared_memory.SharedMemory(name=scores_name)
+    try:
+        features = np.ndarray((len(SCORE_COLUMNS), n_rows), dtype=np.float64, buffer=features_block.buf)
+        scores = np.ndarray((n_rows,), dtype=np.float64, buffer=scores_block.buf)
+        score_block(features[:, start:stop], scores[start:stop])
+        del features, scores
+    finally:
+        features_block.close()
+        scores_block.close()
+    return stop - start
+
+
+def feature_matrix(routes: pd.DataFrame) -> np.ndarray:
+    """(4, n) float64 matrix of the scoring columns, one contiguous row per column"""
+    features = np.empty((len(SCORE_COLUMNS), len(routes)), dtype=np.float64)
+    for i, column in enumerate(SCORE_COLUMNS):
+        features[i] = routes[column].to_numpy(dtype=np.float64)
+    return features
+
+
+class RouteScorer:
+    """Route safety scoring sharded across a process pool
+
+    Features and scores live in shared memory: workers receive only the
+    segment names and their row range, so no rows are ever pickled, and each
+    writes its slice of the result in place. Inputs smaller than
+    serial_threshold (or a single worker) are scored in-process.
+    """
+
+    def __init__(self, workers: int = SCORING_WORKERS, serial_threshold: int = SERIAL_THRESHOLD,
+                 shards_per_worker: int = 4):
+        self.workers = max(1, workers)
+        self.serial_threshold = serial_threshold
+        self.shards_per_worker = shards_per_worker
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # forkserver: safe to start from a process that already runs server threads
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("forkserver"))
+            return self._pool
+
+    def _shards(self, n_rows: int) -> Tuple[Tuple[int, int], ...]:
+        bounds = np.linspace(0, n_rows, self.workers * self.shards_per_worker + 1).astype(np.int64)
+        return tuple((int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a)
+
+    def score(self, routes: pd.DataFrame) -> np.ndarray:
+        """0-10 safety score for every route, in row order"""
+        if self.workers > 1 and len(routes) >= self.serial_threshold:
+            try:
+                return self._score_parallel(routes)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); drop the pool and finish in-process
+                self.close()
+        scores = np.empty(len(routes), dtype=np.float64)
+        score_block(feature_matrix(routes), scores)
+        return scores
+
+    def _score_parallel(self, routes: pd.DataFrame) -> np.ndarray:
+        n_rows = len(routes)
+
+        features_block = shared_memory.SharedMemory(create=True, size=len(SCORE_COLUMNS) * n_rows * 8)
+        scores_block = shared_memory.SharedMemory(create=True, size=n_rows * 8)
+        try:
+            features = np.ndarray((len(SCORE_COLUMNS), n_rows), dtype=np.float64, buffer=features_block.buf)
+            for i, column in enumerate(SCORE_COLUMNS):
+                features[i] = routes[column].to_numpy(dtype=np.float64)
+            futures = [
+                self._executor().submit(_score_shard, features_block.name, scores_block.name, n_rows, start, stop)
+                for start, stop in self._shards(n_rows)
+            ]
+            scored = sum(future.result() for future in futures)
+            if scored != n_rows:
+                raise RuntimeError(f"Scored {scored} of {n_rows} routes")
+            scores = np.ndarray((n_rows,), dtype=np.float64, buffer=scores_block.buf).copy()
+            del features
+        finally:
+            features_block.close()
+            features_block.unlink()
+            scores_block.close()
+            scores_block.unlink()
+        return scores
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,64 @@
+import zlib
+from typing import Dict, Optional
+
+import numpy as np
+
+TIMEFRAME_MONTHS = {"1 month": 1, "3 months": 3, "6 months": 6, "1 year": 12}
+
+# (incident, satisfaction) multipliers for each planning priority
+PRIORITY_WEIGHTS = {
+    "Reduce incidents": (1.15, 0.9),
+    "Improve satisfaction": (0.9, 1.2),
+    "Increase ridership": (0.95, 1.05),
+}
+
+BASELINE_MONTHLY_INCIDENTS = 47
+# Direct savings to the council for each incident avoided
+SAVINGS_PER_INCIDENT = 1000
+
+
+def _interval(samples: np.ndarray, level: float) -> Dict:
+    tail = (1 - level) / 2 * 100
+    low, high = np.percentile(samples, [tail, 100 - tail])
+    return {"mean": float(samples.mean()), "low": float(low), "high": float(high)}
+
+
+def simulate_scenario(budget: float, timeframe: str, priority: str, n_samples: int = 10000,
+                      confidence: float = 0.9, seed: Optional[int] = None) -> Dict:
+    """Monte Carlo outcome distribution for a budget/timeframe/priority scenario
+
+    All uncertain inputs are drawn as arrays of n_samples in one go. The seed
+    defaults to one derived from the inputs, so the same scenario always
+    reports the same figures across reruns.
+    """
+    if seed is None:
+        seed = zlib.crc32(f"{budget}|{timeframe}|{priority}".encode())
+    rng = np.random.default_rng(seed)
+    months = TIMEFRAME_MONTHS[timeframe]
+    incident_weight, satisfaction_weight = PRIORITY_WEIGHTS[priority]
+
+    # Share of the budget actually delivered within the timeframe
+    delivery_months = rng.lognormal(np.log(3), 0.4, n_samples)
+    delivered = budget * (1 - np.exp(-months / delivery_months))
+
+    # Diminishing returns: reduction saturates towards the best achievable
+    ceiling = rng.beta(6, 4, n_samples)
+    spend_scale = rng.lognormal(np.log(60000), 0.3, n_samples)
+    reduction = np.clip(incident_weight * ceiling * (1 - np.exp(-delivered / spend_scale)), 0, 0.95)
+
+    satisfaction = np.clip(satisfaction_weight * reduction * rng.normal(0.4, 0.08, n_samples), 0, 1)
+
+    baseline = rng.normal(BASELINE_MONTHLY_INCIDENTS, 5, n_samples) * 12
+    savings = reduction * baseline * rng.lognormal(np.log(SAVINGS_PER_INCIDENT), 0.25, n_samples)
+    roi = savings / budget * 100
+
+    result = {
+        "incident_reduction": _interval(reduction * 100, confidence),
+        "satisfaction_boost": _interval(satisfaction * 100, confidence),
+        "roi": _interval(roi, confidence),
+        "confidence": confidence,
+        "samples": n_samples,
+    }
+    mean_reduction = result["incident_reduction"]["mean"]
+    result["impact_level"] = "High" if mean_reduction >= 35 else "Medium" if mean_reduction >= 20 else "Low"
+    return result
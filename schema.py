@@ -0,0 +1,135 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from data_store import AREAS, TIME_SLOTS
+
+# Rows converted when measuring a large table's footprint as a default pandas frame
+UNTYPED_SAMPLE_ROWS = 100_000
+
+
+def _categories(values, ordered: bool = False) -> pd.CategoricalDtype:
+    return pd.CategoricalDtype(categories=list(values), ordered=ordered)
+
+
+RISK_LEVELS = _categories(['Low', 'Medium', 'High', 'Critical'], ordered=True)
+PRIORITIES = _categories(['Low', 'Medium', 'High'], ordered=True)
+QUALITY = _categories(['Poor', 'Fair', 'Good', 'Excellent'], ordered=True)
+COMPLEXITY = _categories(['Quick Fix', 'Moderate', 'Complex'], ordered=True)
+
+# Column dtypes enforced when a table is loaded. Categoricals listed as "category"
+# take their categories from the data; high-cardinality labels become Arrow strings.
+ROUTE_SCHEMA = {
+    'route_id': 'int32',
+    'route_name': 'string[pyarrow]',
+    'primary_users': _categories(['Commuters', 'Families', 'Fitness Enthusiasts', 'Students']),
+    'safety_score': 'float32',
+    'daily_cyclists': 'uint16',
+    'incident_rate': 'float32',
+    'infrastructure_quality': QUALITY,
+    'weather_resilience': 'float32',
+    'accessibility_score': 'float32',
+    'community_priority': PRIORITIES,
+    'area': _categories(AREAS),
+    'time_of_day': _categories(TIME_SLOTS),
+    'month': 'category',
+}
+
+HOTSPOT_SCHEMA = {
+    'location_id': 'int32',
+    'location_name': 'string[pyarrow]',
+    'location_type': 'category',
+    # Coordinates stay float64: float32 would cost ~0.5 m of precision
+    'lat': 'float64',
+    'lon': 'float64',
+    'risk_level': RISK_LEVELS,
+    'affected_cyclists': 'uint32',
+    'incident_type': 'category',
+    'time_of_day': _categories(TIME_SLOTS),
+    'fix_complexity': COMPLEXITY,
+    'estimated_cost': 'float32',
+    'community_impact': 'float32',
+    'area': _categories(AREAS),
+    'month': 'category',
+}
+
+SCHEMAS = {"routes": ROUTE_SCHEMA, "hotspots": HOTSPOT_SCHEMA}
+
+
+def _integer_dtype(values: pd.Series, dtype: str) -> str:
+    """The declared integer dtype, widened if the data does not fit in it"""
+    if values.empty:
+        return dtype
+    low, high = values.min(), values.max()
+    candidates = [dtype] + [d for d in ('int32', 'uint32', 'int64') if np.dtype(d).itemsize > np.dtype(dtype).itemsize]
+    for candidate in candidates:
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            return candidate
+    return 'int64'
+
+
+def enforce_schema(frame: pd.DataFrame, schema: Dict) -> pd.DataFrame:
+    """Cast the columns a frame has to their schema dtypes; other columns are left alone"""
+    columns = {}
+    for column, dtype in schema.items():
+        if column not in frame or frame[column].dtype == dtype:
+            continue
+        values = frame[column]
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Labels outside a fixed category list would silently become NaN
+            unknown = set(values.dropna().unique()) - set(dtype.categories)
+            if unknown:
+                dtype = _categories(list(dtype.categories) + sorted(map(str, unknown)), dtype.ordered)
+        elif dtype in ('int32', 'uint16', 'uint32'):
+            dtype = _integer_dtype(values, dtype)
+        columns[column] = values.astype(dtype)
+    return frame.assign(**columns) if columns else frame
+
+
+def to_typed_frame(table: pa.Table, schema: Dict) -> pd.DataFrame:
+    """Convert an Arrow table straight to the schema dtypes
+
+    String columns destined to be categorical are dictionary-encoded in Arrow
+    first, so the Python-object version of the frame is never materialised.
+    """
+    for i, name in enumerate(table.column_names):
+        dtype = schema.get(name)
+        if (isinstance(dtype, pd.CategoricalDtype) or dtype == 'category') and pa.types.is_string(table.schema.field(i).type):
+            table = table.set_column(i, name, table.column(i).dictionary_encode())
+    frame = table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+    return enforce_schema(frame, schema)
+
+
+def untyped_bytes(table: pa.Table, sample_rows: int = UNTYPED_SAMPLE_ROWS) -> int:
+    """Memory the same data takes as a default pandas frame, i.e. plain `table.to_pandas()`
+
+    Measured on a real conversion of up to sample_rows evenly spaced rows and
+    scaled to the whole table, so the figure reflects what pandas actually
+    allocates without paying for a second full copy of large tables.
+    """
+    if table.num_rows <= sample_rows:
+        return frame_memory(table.to_pandas())
+    rows = np.linspace(0, table.num_rows - 1, sample_rows).astype(np.int64)
+    sample = frame_memory(table.take(pa.array(rows)).to_pandas())
+    return int(sample * table.num_rows / sample_rows)
+
+
+def frame_memory(frame: pd.DataFrame) -> int:
+    """Resident bytes of a frame, including the Python strings behind object columns"""
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(name: str, before_bytes: int, after: pd.DataFrame) -> Dict:
+    """Rows, columns and memory of a frame with the default dtypes and with the schema applied"""
+    after_bytes = frame_memory(after)
+    return {
+        "frame": name,
+        "rows": len(after),
+        "columns": after.shape[1],
+        "before_mb": round(before_bytes / 2**20, 2),
+        "after_mb": round(after_bytes / 2**20, 2),
+        "reduction": round(before_bytes / after_bytes, 1) if after_bytes else None,
+    }
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Tuple
+
+from cachetools import TTLCache
+
+# Turns of chat history kept per session; older turns are dropped first
+MAX_TURNS = int(os.environ.get("CYCLESAFE_MAX_TURNS", 20))
+# Longest message kept in history, in characters
+MAX_MESSAGE_CHARS = 4000
+# Sessions not seen for this long are dropped with their history
+SESSION_IDLE_SECONDS = float(os.environ.get("CYCLESAFE_SESSION_IDLE_SECONDS", 1800))
+# Hard cap on tracked sessions; the least recently active go first past it
+MAX_SESSIONS = int(os.environ.get("CYCLESAFE_MAX_SESSIONS", 1000))
+
+
+def default_profile() -> Dict:
+    return {
+        "role": "city_planner",
+        "expertise": "beginner",
+        "interests": ["safety", "infrastructure", "budget"]
+    }
+
+
+@dataclass
+class SessionState:
+    """What one browser session owns: its planner profile and a capped chat history"""
+    profile: Dict = field(default_factory=default_profile)
+    history: Deque[Tuple[str, str]] = field(default_factory=lambda: deque(maxlen=MAX_TURNS))
+    last_seen: float = field(default_factory=time.monotonic)
+
+    def add_turn(self, question: str, answer: str):
+        self.history.append((question[:MAX_MESSAGE_CHARS], answer[:MAX_MESSAGE_CHARS]))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(question) + len(answer) for question, answer in self.history)
+
+
+class SessionStore:
+    """Per-session state for every connected user, bounded in count, age and size
+
+    Each session holds at most MAX_TURNS turns of MAX_MESSAGE_CHARS each, so
+    memory per user is fixed; sessions idle for longer than idle_seconds
+    expire and at most max_sessions are tracked at once.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=idle_seconds, timer=time.monotonic)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> SessionState:
+        """The state of a session, created on first use; every call counts as activity"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState()
+            state.last_seen = time.monotonic()
+            # Re-inserting restarts the idle timer and sweeps expired sessions
+            self._sessions[session_id] = state
+            return state
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        return list(self.get(session_id).history)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._sessions.expire()
+            states = list(self._sessions.values())
+            return {
+                "sessions": len(states),
+                "max_sessions": self._sessions.maxsize,
+                "turns": sum(len(state.history) for state in states),
+                "history_bytes": sum(state.nbytes for state in states),
+            }
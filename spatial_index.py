@@ -0,0 +1,117 @@
+import math
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6_371_000.0
+TILE_SIZE_PX = 256
+
+
+def viewport_bounds(center_lat: float, center_lon: float, zoom: float,
+                    width_px: int = 1200, height_px: int = 500) -> Tuple[float, float, float, float]:
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) of a web-mercator viewport"""
+    world_px = TILE_SIZE_PX * 2 ** zoom
+    cx = (center_lon + 180.0) / 360.0 * world_px
+    sin_lat = math.sin(math.radians(center_lat))
+    cy = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * world_px
+
+    def to_lat(y):
+        n = math.pi - 2 * math.pi * y / world_px
+        return math.degrees(math.atan(math.sinh(n)))
+
+    min_lon = (cx - width_px / 2) / world_px * 360.0 - 180.0
+    max_lon = (cx + width_px / 2) / world_px * 360.0 - 180.0
+    return to_lat(cy + height_px / 2), min_lon, to_lat(cy - height_px / 2), max_lon
+
+
+class HotspotIndex:
+    """Grid + KD-tree index over hotspot coordinates, built once per dataset"""
+
+    def __init__(self, frame: pd.DataFrame, points_per_cell: int = 16):
+        self.frame = frame
+        lat = frame["lat"].to_numpy(dtype=np.float64)
+        lon = frame["lon"].to_numpy(dtype=np.float64)
+        self._lat, self._lon = lat, lon
+
+        # Local equirectangular projection in metres for distance queries
+        self._ref_lat = float(lat.mean()) if len(lat) else 0.0
+        self._x_scale = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(self._ref_lat))
+        self._y_scale = math.radians(1) * EARTH_RADIUS_M
+        self._tree = cKDTree(self._project(lat, lon)) if len(lat) else None
+
+        # Uniform grid stored CSR-style: rows sorted by cell id, offsets per cell
+        self._lat0 = float(lat.min()) if len(lat) else 0.0
+        self._lon0 = float(lon.min()) if len(lon) else 0.0
+        lat_span = max(float(lat.max()) - self._lat0, 1e-9) if len(lat) else 1.0
+        lon_span = max(float(lon.max()) - self._lon0, 1e-9) if len(lon) else 1.0
+        n_cells = max(1, len(lat) // points_per_cell)
+        self._ny = max(1, int(math.sqrt(n_cells * lat_span / lon_span)))
+        self._nx = max(1, n_cells // self._ny)
+        self._cell_lat = lat_span / self._ny
+        self._cell_lon = lon_span / self._nx
+
+        cells = self._cell_of(lat, lon)
+        self._order = np.argsort(cells, kind="stable")
+        self._offsets = np.zeros(self._nx * self._ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self._nx * self._ny), out=self._offsets[1:])
+
+    def __len__(self) -> int:
+        return len(self._lat)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index arrays (the frame is shared with the caller)"""
+        tree = self._tree.data.nbytes * 2 if self._tree is not None else 0
+        return self._lat.nbytes + self._lon.nbytes + self._order.nbytes + self._offsets.nbytes + tree
+
+    def _project(self, lat, lon) -> np.ndarray:
+        return np.column_stack([np.asarray(lon) * self._x_scale, np.asarray(lat) * self._y_scale])
+
+    def _cell_of(self, lat, lon) -> np.ndarray:
+        iy = np.clip(((lat - self._lat0) / self._cell_lat).astype(np.int64), 0, self._ny - 1)
+        ix = np.clip(((lon - self._lon0) / self._cell_lon).astype(np.int64), 0, self._nx - 1)
+        return iy * self._nx + ix
+
+    def query_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Row positions of hotspots inside a lat/lon bounding box"""
+        if not len(self) or max_lat < self._lat0 or max_lon < self._lon0:
+            return np.empty(0, dtype=np.int64)
+        iy0, iy1 = (np.clip(((np.array([min_lat, max_lat]) - self._lat0) / self._cell_lat).astype(np.int64), 0, self._ny - 1))
+        ix0, ix1 = (np.clip(((np.array([min_lon, max_lon]) - self._lon0) / self._cell_lon).astype(np.int64), 0, self._nx - 1))
+
+        # Cells in one grid row are contiguous in the sorted order
+        slices = [
+            self._order[self._offsets[iy * self._nx + ix0]:self._offsets[iy * self._nx + ix1 + 1]]
+            for iy in range(iy0, iy1 + 1)
+        ]
+        candidates = np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+        lat, lon = self._lat[candidates], self._lon[candidates]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return candidates[inside]
+
+    def nearest(self, lat: float, lon: float, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions and distances (metres) of the k nearest hotspots"""
+        if self._tree is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        k = min(k, len(self))
+        distances, positions = self._tree.query(self._project([lat], [lon])[0], k=k)
+        return np.atleast_1d(positions), np.atleast_1d(distances)
+
+    def within_radius(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        """Row positions of hotspots within radius_m metres, nearest first"""
+        if self._tree is None:
+            return np.empty(0, dtype=np.int64)
+        point = self._project([lat], [lon])[0]
+        positions = np.asarray(self._tree.query_ball_point(point, radius_m), dtype=np.int64)
+        distances = np.hypot(*(self._project(self._lat[positions], self._lon[positions]) - point).T)
+        return positions[np.argsort(distances)]
+
+    def match(self, lat: np.ndarray, lon: np.ndarray, max_distance_m: float) -> np.ndarray:
+        """Nearest hotspot row position for each point, or -1 if none is within max_distance_m"""
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        if self._tree is None or not len(lat):
+            return np.full(len(lat), -1, dtype=np.int64)
+        _, positions = self._tree.query(self._project(lat, lon), k=1, distance_upper_bound=max_distance_m)
+        return np.where(positions < len(self), positions, -1).astype(np.int64)
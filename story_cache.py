@@ -0,0 +1,184 @@
+"""Batch story generation: one narrative card per hotspot, written to a keyed cache
+
+    python story_cache.py --city london build
+    python story_cache.py --city london show 42
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_store import DATA_DIR, NarrativeDataStore, publish_file, read_manifest
+from event_ingest import HotspotAggregator
+from schema import HOTSPOT_SCHEMA, to_typed_frame
+
+STORY_COLUMNS = ['location_id', 'location_name', 'location_type', 'lat', 'lon', 'risk_level', 'affected_cyclists',
+                 'incident_type', 'time_of_day', 'fix_complexity', 'estimated_cost']
+
+# Who typically rides through each kind of place, and the name the story follows
+RIDERS = {
+    'School Zone': ("Parents riding their kids to school", "Amira"),
+    'Business District': ("Commuters heading to the office", "Sarah"),
+    'Residential': ("Neighbours popping to the shops", "Mike"),
+    'Park Area': ("Weekend riders and families", "Emma"),
+    'Transit Hub': ("Riders connecting to trains and buses", "Tom"),
+}
+DEFAULT_RIDERS = ("Local cyclists", "Alex")
+
+# What the data shows at a location, what fixes it and the incident reduction that fix usually brings
+INCIDENTS = {
+    'Sudden Braking': ("brake hard", "Adjust signal timing and clear sightlines", 0.32),
+    'Swerving': ("swerve around obstacles", "Widen the lane and remove pinch points", 0.28),
+    'Conflicts': ("get squeezed by traffic", "Add protected lane separation", 0.45),
+    'Surface Issues': ("struggle with a rough, slippery surface", "Resurface and improve drainage", 0.40),
+}
+DEFAULT_INCIDENT = ("have close calls", "Targeted safety review", 0.25)
+
+SLOT_PHRASES = {
+    'Morning Rush': "during the morning rush",
+    'Midday': "in the middle of the day",
+    'Evening Rush': "on the way home in the evening",
+    'Night': "after dark",
+}
+SEVERITY = {'Critical': 9, 'High': 7, 'Medium': 5, 'Low': 3}
+COMPLEXITY_WEEKS = {'Quick Fix': "within a week", 'Moderate': "in about a month", 'Complex': "over a season"}
+
+
+def compose_stories(hotspots: pd.DataFrame) -> pd.DataFrame:
+    """A story card for every hotspot, built from its type, dominant incident and time, riders and cost"""
+    rows: Dict[str, List] = {name: [] for name in ('title', 'story', 'narrative', 'impact', 'solution', 'cost', 'benefit')}
+    columns = [hotspots[c].astype(object).to_numpy() if c in hotspots else np.full(len(hotspots), None)
+               for c in ('location_name', 'location_type', 'incident_type', 'time_of_day', 'fix_complexity')]
+    affected = hotspots['affected_cyclists'].to_numpy(dtype=np.int64)
+    cost = hotspots['estimated_cost'].to_numpy(dtype=np.float64)
+    for name, place, incident, slot, complexity, riders, fix_cost in zip(*columns, affected, cost):
+        who, persona = RIDERS.get(place, DEFAULT_RIDERS)
+        action, solution, reduction = INCIDENTS.get(incident, DEFAULT_INCIDENT)
+        when = SLOT_PHRASES.get(slot, "through the day")
+        rows['title'].append(f"{incident or 'Trouble'} at {name}")
+        rows['story'].append(f"{who} {action} here {when} - {riders} cyclists are affected.")
+        rows['narrative'].append(
+            f"Meet {persona}, one of {riders} cyclists who ride through {name}, a {str(place or 'busy').lower()} spot. "
+            f"Our sensors show riders here {action} most often {when}. "
+            f"{solution} {COMPLEXITY_WEEKS.get(complexity, 'soon')} and {persona}'s ride becomes "
+            f"{reduction:.0%} safer."
+        )
+        rows['impact'].append(f"{riders} cyclists affected")
+        rows['solution'].append(solution)
+        rows['cost'].append(f"${fix_cost:,.0f}")
+        rows['benefit'].append(f"{reduction:.0%} reduction in incidents")
+    risk = hotspots['risk_level'].astype(object).to_numpy()
+    return pd.DataFrame({
+        'location_id': hotspots['location_id'].to_numpy(),
+        'location_name': hotspots['location_name'].astype(str).to_numpy(),
+        'lat': hotspots['lat'].to_numpy(),
+        'lon': hotspots['lon'].to_numpy(),
+        'incident_type': hotspots['incident_type'].astype(str).to_numpy(),
+        'severity': np.array([SEVERITY.get(level, 5) for level in risk], dtype=np.int8),
+        'affected_daily': affected,
+        'fix_cost': np.rint(cost).astype(np.int64),
+        **rows,
+    })
+
+
+def story_path(root: Path, version: str) -> Path:
+    return Path(root) / "stories" / f"stories-{version}.parquet"
+
+
+def published_story_path(root: Path) -> Optional[Path]:
+    """The story file last built for this data directory, if any"""
+    name = read_manifest(Path(root) / "stories")["file"]
+    return Path(root) / "stories" / name if name else None
+
+
+def build_story_cache(store: NarrativeDataStore, aggregator: HotspotAggregator, batch_rows: int = 250_000) -> Path:
+    """Generate every hotspot's story in batches and publish them for the current hotspots table
+
+    Stories are keyed on the hotspots table alone: live events change the
+    labels they are composed from only slowly, so they are refreshed when
+    this runs (after each hotspot publish, and from the scheduled batch job)
+    rather than on every ingest.
+    """
+    path = story_path(store.root, store.table_version("hotspots"))
+    columns = [c for c in STORY_COLUMNS if c in store.schema("hotspots").names]
+    parts = [compose_stories(aggregator.apply(to_typed_frame(batch, HOTSPOT_SCHEMA)))
+             for batch in store.iter_batches("hotspots", columns, batch_rows)]
+    stories = pd.concat(parts, ignore_index=True) if parts else compose_stories(
+        to_typed_frame(store.read_arrow("hotspots", columns), HOTSPOT_SCHEMA))
+    # Most severe and most ridden first, so the first entries are the ones worth telling
+    stories = stories.sort_values(['severity', 'affected_daily'], ascending=False, kind="stable")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    stories.to_parquet(tmp, index=False)
+    tmp.replace(path)
+    return publish_file(path)
+
+
+class StoryCache:
+    """Pre-generated story cards, looked up by location id or searched by name"""
+
+    def __init__(self, stories: pd.DataFrame):
+        self.stories = stories.reset_index(drop=True)
+        self._positions = pd.Index(self.stories['location_id'])
+        self._names = self.stories['location_name'].str.lower()
+
+    @classmethod
+    def load(cls, path: Path) -> "StoryCache":
+        # Arrow-backed text takes about half the memory of Python string objects
+        table = pq.read_table(path)
+        return cls(table.to_pandas(types_mapper={pa.string(): pd.ArrowDtype(pa.string())}.get))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.stories.memory_usage(deep=True).sum()) + int(self._names.memory_usage(deep=True))
+
+    def __len__(self) -> int:
+        return len(self.stories)
+
+    def get(self, location_id: int) -> Optional[Dict]:
+        try:
+            position = self._positions.get_loc(location_id)
+        except KeyError:
+            return None
+        return self.stories.iloc[position].to_dict()
+
+    def search(self, text: str = "", limit: int = 200) -> pd.DataFrame:
+        """Up to limit locations whose name contains text, most important first"""
+        text = text.strip().lower()
+        matches = self.stories if not text else self.stories[self._names.str.contains(text, regex=False).to_numpy()]
+        return matches.head(limit)
+
+    def top(self, n: int = 5, incident_type: Optional[str] = None) -> pd.DataFrame:
+        stories = self.stories if incident_type is None else self.stories[self.stories['incident_type'] == incident_type]
+        return stories.head(n)
+
+
+if __name__ == "__main__":
+    # Imported here: cities builds on this module
+    from cities import DEFAULT_CITY, CityData, city_data_dir, load_city_configs
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="generate the story cache for the current data")
+    show = commands.add_parser("show", help="print the cached story of one location")
+    show.add_argument("location_id", type=int)
+    args = parser.parse_args()
+
+    configs = load_city_configs(args.data_dir)
+    if args.city not in configs:
+        parser.error(f"unknown city '{args.city}' (known: {', '.join(sorted(configs))})")
+    # Opening the city seeds its sample data (and first story file) the same way the app would
+    city = CityData(configs[args.city], city_data_dir(args.city, args.data_dir), lambda slug: None)
+    if args.command == "build":
+        path = build_story_cache(city.store, city.aggregator)
+        print(json.dumps({"path": str(path), "stories": len(StoryCache.load(path))}))
+    else:
+        print(json.dumps(StoryCache.load(published_story_path(city.store.root)).get(args.location_id),
+                         default=str, indent=2))
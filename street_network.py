@@ -0,0 +1,433 @@
+"""Cycle network graph engine: protected-lane gaps ranked by the cyclist flow they would carry
+
+    python street_network.py --city london sample --grid 60
+    python street_network.py --city london load network.graphml
+    python street_network.py --city london gaps --samples 64
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from data_store import DATA_DIR
+from spatial_index import EARTH_RADIUS_M
+
+# Riders treat a metre in traffic as this many metres on a protected lane
+UNPROTECTED_PENALTY = 2.0
+# Longest unprotected stretch between two protected lanes still counted as a missing link
+MAX_GAP_M = 400.0
+# Protected pieces shorter than this are too small to be worth joining up
+MIN_LANE_M = 150.0
+# Sources sampled for approximate betweenness; error shrinks with 1/sqrt(samples)
+BETWEENNESS_SAMPLES = int(os.environ.get("CYCLESAFE_BETWEENNESS_SAMPLES", 64))
+# Memory for cached shortest-path trees
+TREE_CACHE_MB = int(os.environ.get("CYCLESAFE_TREE_CACHE_MB", 256))
+# Rough build cost of a protected lane, per metre
+LANE_COST_PER_M = 425
+
+SAMPLE_GRID = int(os.environ.get("CYCLESAFE_SAMPLE_GRID", 60))
+STREET_NAMES = ['Oak Street', 'Mill Lane', 'Station Road', 'Church Street', 'Park Road', 'Victoria Road',
+                'Green Lane', 'King Street', 'Queen Street', 'Bridge Street', 'Market Street', 'High Street']
+CROSS_STREET_NAMES = ['Pine Avenue', 'Elm Avenue', 'Ash Grove', 'Cedar Way', 'Maple Avenue', 'Birch Road',
+                      'Willow Walk', 'Hazel Grove', 'Rowan Way', 'Larch Avenue', 'Beech Road', 'Holly Lane']
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class StreetNetwork:
+    """Undirected street graph as flat node/edge arrays with CSR adjacency
+
+    Parallel edges are collapsed to the shortest one, so every node pair maps
+    to exactly one edge id and sparse matrices never sum duplicates.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, edges: pd.DataFrame):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        u = edges["u"].to_numpy(dtype=np.int64)
+        v = edges["v"].to_numpy(dtype=np.int64)
+        edges = edges.assign(u=np.minimum(u, v).astype(np.int32), v=np.maximum(u, v).astype(np.int32))
+        edges = edges[edges["u"] != edges["v"]]
+        edges = edges.sort_values("length_m", kind="stable").drop_duplicates(["u", "v"]).sort_values(["u", "v"])
+        self.edges = edges.reset_index(drop=True)
+        self.u = self.edges["u"].to_numpy()
+        self.v = self.edges["v"].to_numpy()
+        self.length_m = self.edges["length_m"].to_numpy(dtype=np.float64)
+        self.protected = self.edges["protected"].to_numpy(dtype=bool)
+        # Edge id + 1 at both (u, v) and (v, u); 0 means "no edge"
+        ids = np.arange(1, len(self.edges) + 1, dtype=np.int64)
+        self._edge_ids = self._symmetric(ids)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.lat)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edges)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.lat.nbytes + self.lon.nbytes + int(self.edges.memory_usage(deep=True).sum())
+                + self._edge_ids.data.nbytes + self._edge_ids.indices.nbytes + self._edge_ids.indptr.nbytes)
+
+    def _symmetric(self, values: np.ndarray, mask: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+        u, v = (self.u, self.v) if mask is None else (self.u[mask], self.v[mask])
+        values = values if mask is None else values[mask]
+        return sparse.csr_matrix(
+            (np.concatenate([values, values]), (np.concatenate([u, v]), np.concatenate([v, u]))),
+            shape=(self.n_nodes, self.n_nodes),
+        )
+
+    def adjacency(self, weights: np.ndarray, mask: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+        """Symmetric CSR matrix with the given per-edge weights (optionally only the masked edges)"""
+        return self._symmetric(np.asarray(weights, dtype=np.float64), mask)
+
+    def edge_ids(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Edge id of each (a, b) node pair, -1 where the nodes are not adjacent"""
+        if len(a) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self._edge_ids[a, b]).ravel().astype(np.int64) - 1
+
+    def riding_cost(self, upgraded: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-edge cost riders minimise: length, penalised off protected lanes (upgraded edges count as protected)"""
+        protected = self.protected if upgraded is None else self.protected | upgraded
+        return np.where(protected, self.length_m, self.length_m * UNPROTECTED_PENALTY)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph, protected_attr: str = "protected") -> "StreetNetwork":
+        """Build from a networkx graph with lat/lon (or OSM-style y/x) on nodes
+
+        Edge length comes from "length" (metres) or the node coordinates; an
+        edge is protected if protected_attr is truthy or it is an OSM cycleway.
+        """
+        nodes = list(graph.nodes)
+        position = {node: i for i, node in enumerate(nodes)}
+        lat = np.array([float(graph.nodes[n].get("lat", graph.nodes[n].get("y"))) for n in nodes])
+        lon = np.array([float(graph.nodes[n].get("lon", graph.nodes[n].get("x"))) for n in nodes])
+        rows = []
+        for a, b, data in graph.edges(data=True):
+            # GraphML hands every attribute back as a string
+            protected = str(data.get(protected_attr, "")).lower() in ("1", "true", "yes") \
+                or data.get("highway") == "cycleway" or data.get("cycleway") in ("track", "separate")
+            name = data.get("name", "")
+            length = data.get("length")
+            rows.append((position[a], position[b], float(length) if length is not None else np.nan, protected,
+                         name[0] if isinstance(name, list) else str(name)))
+        edges = pd.DataFrame(rows, columns=["u", "v", "length_m", "protected", "name"])
+        missing = edges["length_m"].isna().to_numpy()
+        if missing.any():
+            u, v = edges["u"].to_numpy()[missing], edges["v"].to_numpy()[missing]
+            edges.loc[missing, "length_m"] = haversine_m(lat[u], lon[u], lat[v], lon[v])
+        return cls(lat, lon, edges.astype({"length_m": np.float64}))
+
+
+def generate_sample_network(center: Tuple[float, float] = (51.5074, -0.1278), grid: int = SAMPLE_GRID,
+                            spacing_m: float = 150.0, seed: int = 42) -> StreetNetwork:
+    """Jittered street grid with protected lanes along some streets, each broken by a few short gaps"""
+    rng = np.random.default_rng(seed)
+    iy, ix = np.divmod(np.arange(grid * grid), grid)
+    dlat = np.degrees(spacing_m / EARTH_RADIUS_M)
+    dlon = dlat / np.cos(np.radians(center[0]))
+    lat = center[0] + (iy - grid / 2 + rng.normal(0, 0.15, iy.size)) * dlat
+    lon = center[1] + (ix - grid / 2 + rng.normal(0, 0.15, ix.size)) * dlon
+
+    node = np.arange(grid * grid).reshape(grid, grid)
+    horizontal = pd.DataFrame({"u": node[:, :-1].ravel(), "v": node[:, 1:].ravel(),
+                               "line": np.repeat(np.arange(grid), grid - 1), "axis": "row",
+                               "step": np.tile(np.arange(grid - 1), grid)})
+    vertical = pd.DataFrame({"u": node[:-1, :].T.ravel(), "v": node[1:, :].T.ravel(),
+                             "line": np.repeat(np.arange(grid), grid - 1), "axis": "col",
+                             "step": np.tile(np.arange(grid - 1), grid)})
+    edges = pd.concat([horizontal, vertical], ignore_index=True)
+
+    # Every few streets carries a protected lane, interrupted where it was never finished
+    lane = (edges["line"] % 7 == 3).to_numpy()
+    gap = np.zeros(len(edges), dtype=bool)
+    for (axis, line), rows in edges[lane].groupby(["axis", "line"]).groups.items():
+        steps = edges.loc[rows, "step"].to_numpy()
+        for start in rng.choice(grid - 1, size=max(1, grid // 15), replace=False):
+            gap[rows[(steps >= start) & (steps < start + rng.integers(1, 4))]] = True
+    edges["protected"] = lane & ~gap
+
+    # Not every block connects through
+    keep = edges["protected"].to_numpy() | (rng.random(len(edges)) > 0.08)
+    edges = edges[keep]
+    u, v = edges["u"].to_numpy(), edges["v"].to_numpy()
+    return StreetNetwork(lat, lon, pd.DataFrame({
+        "u": u,
+        "v": v,
+        "length_m": haversine_m(lat[u], lon[u], lat[v], lon[v]),
+        "protected": edges["protected"].to_numpy(),
+        # Each street is one route of the route table
+        "route_id": np.where(edges["axis"] == "row", 0, grid) + edges["line"].to_numpy() + 1,
+        "name": np.where(edges["axis"] == "row", np.array(STREET_NAMES)[edges["line"] % len(STREET_NAMES)],
+                         np.array(CROSS_STREET_NAMES)[edges["line"] % len(CROSS_STREET_NAMES)]),
+    }))
+
+
+class ShortestPathTrees:
+    """LRU cache of single-source shortest-path trees (distance + predecessor) under one edge weighting
+
+    Trees are stored compactly (float32 distance, int32 predecessor) and
+    evicted least recently used first once max_bytes is reached, so repeated
+    centrality runs and route queries from the same sources skip Dijkstra.
+    """
+
+    def __init__(self, adjacency: sparse.csr_matrix, max_bytes: int = TREE_CACHE_MB * 2**20):
+        self.adjacency = adjacency
+        self._trees = LRUCache(maxsize=max_bytes, getsizeof=lambda tree: tree[0].nbytes + tree[1].nbytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def trees(self, sources: np.ndarray, batch: int = 8) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(distance, predecessor) for every source, computing the missing ones in batches"""
+        sources = [int(s) for s in sources]
+        with self._lock:
+            found = {s: self._trees[s] for s in sources if s in self._trees}
+            self.hits += len(found)
+            missing = [s for s in dict.fromkeys(sources) if s not in found]
+            self.misses += len(missing)
+        for i in range(0, len(missing), batch):
+            chunk = missing[i:i + batch]
+            dist, pred = csgraph.dijkstra(self.adjacency, directed=False, indices=chunk, return_predecessors=True)
+            for row, source in enumerate(chunk):
+                found[source] = (dist[row].astype(np.float32), pred[row].astype(np.int32))
+                with self._lock:
+                    self._trees[source] = found[source]
+        return [found[s] for s in sources]
+
+    def tree(self, source: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.trees(np.array([source]))[0]
+
+
+def _tree_edge_flow(network: StreetNetwork, source: int, dist: np.ndarray, pred: np.ndarray) -> np.ndarray:
+    """Number of shortest paths from source that cross each edge (one path per reachable target)
+
+    Every reached node sends one unit to its predecessor, accumulated leaf
+    first one hop-depth level at a time, so the work per level is vectorised.
+    """
+    reached = np.flatnonzero((pred >= 0) & np.isfinite(dist))
+    flow = np.zeros(network.n_edges, dtype=np.float64)
+    if len(reached) == 0:
+        return flow
+    tree = sparse.csr_matrix((np.ones(len(reached)), (pred[reached], reached)), shape=(network.n_nodes,) * 2)
+    depth = csgraph.shortest_path(tree, method="D", unweighted=True, indices=source)
+    depth_of = depth[reached].astype(np.int64)
+    order = reached[np.argsort(depth_of, kind="stable")]
+    bounds = np.searchsorted(np.sort(depth_of), np.arange(depth_of.max() + 2))
+    carried = np.ones(network.n_nodes, dtype=np.float64)
+    for level in range(depth_of.max(), 0, -1):
+        nodes = order[bounds[level]:bounds[level + 1]]
+        if len(nodes):
+            np.add.at(carried, pred[nodes], carried[nodes])
+    ids = network.edge_ids(pred[reached], reached)
+    valid = ids >= 0
+    np.add.at(flow, ids[valid], carried[reached[valid]])
+    return flow
+
+
+def sampled_edge_betweenness(network: StreetNetwork, trees: ShortestPathTrees,
+                             n_samples: int = BETWEENNESS_SAMPLES, seed: int = 42) -> np.ndarray:
+    """Share of all-pairs shortest paths that cross each edge, estimated from n_samples random sources
+
+    Exact edge betweenness needs a tree from every node (hours on a city
+    graph); sampling sources gives an unbiased estimate whose ranking of busy
+    links settles after a few dozen trees.
+    """
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(network.n_nodes, size=min(n_samples, network.n_nodes), replace=False)
+    flow = np.zeros(network.n_edges, dtype=np.float64)
+    for source, (dist, pred) in zip(sources, trees.trees(sources)):
+        flow += _tree_edge_flow(network, int(source), dist, pred)
+    return flow / (len(sources) * max(network.n_nodes - 1, 1))
+
+
+def protected_components(network: StreetNetwork, min_lane_m: float = MIN_LANE_M) -> Tuple[np.ndarray, np.ndarray]:
+    """Component label of every node on the protected network (-1 off it) and each component's lane length"""
+    adjacency = network.adjacency(np.ones(network.n_edges), network.protected)
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+    on_lane = np.zeros(network.n_nodes, dtype=bool)
+    on_lane[network.u[network.protected]] = True
+    on_lane[network.v[network.protected]] = True
+    lane_m = np.bincount(labels[network.u[network.protected]], weights=network.length_m[network.protected],
+                         minlength=labels.max() + 1)
+    labels = np.where(on_lane & (lane_m[labels] >= min_lane_m), labels, -1)
+    return labels, lane_m
+
+
+def _walk_back(pred: np.ndarray, node: int) -> List[int]:
+    path = [node]
+    while pred[path[-1]] >= 0:
+        path.append(int(pred[path[-1]]))
+    return path
+
+
+def find_gaps(network: StreetNetwork, max_gap_m: float = MAX_GAP_M, min_lane_m: float = MIN_LANE_M) -> pd.DataFrame:
+    """Shortest unprotected stretch joining each pair of protected lanes that come within max_gap_m
+
+    A multi-source Dijkstra from every protected node labels each street
+    node with its nearest lane; an unprotected edge whose two ends are
+    nearest to different lanes closes a gap of dist(u) + length + dist(v).
+    """
+    labels, lane_m = protected_components(network, min_lane_m)
+    sources = np.flatnonzero(labels >= 0)
+    columns = ["from_lane", "to_lane", "length_m", "edges", "street", "lat", "lon", "lanes_joined_m"]
+    if len(sources) == 0:
+        return pd.DataFrame(columns=columns)
+    dist, pred, nearest = csgraph.dijkstra(network.adjacency(network.length_m), directed=False, indices=sources,
+                                           return_predecessors=True, min_only=True, limit=max_gap_m)
+    u, v = network.u, network.v
+    reached = np.isfinite(dist[u]) & np.isfinite(dist[v]) & ~network.protected
+    lane_u = np.where(reached, labels[np.where(nearest[u] >= 0, nearest[u], 0)], -1)
+    lane_v = np.where(reached, labels[np.where(nearest[v] >= 0, nearest[v], 0)], -1)
+    total = dist[u] + network.length_m + dist[v]
+    candidate = np.flatnonzero(reached & (lane_u >= 0) & (lane_v >= 0) & (lane_u != lane_v) & (total <= max_gap_m))
+    best = pd.DataFrame({
+        "edge": candidate,
+        "a": np.minimum(lane_u[candidate], lane_v[candidate]),
+        "b": np.maximum(lane_u[candidate], lane_v[candidate]),
+        "length_m": total[candidate],
+    }).sort_values("length_m", kind="stable").drop_duplicates(["a", "b"])
+
+    rows = []
+    for edge, a, b, length in best.itertuples(index=False):
+        path = _walk_back(pred, int(u[edge]))[::-1] + _walk_back(pred, int(v[edge]))
+        path = np.array(path)
+        ids = network.edge_ids(path[:-1], path[1:])
+        names = network.edges["name"].to_numpy()[ids]
+        rows.append((int(a), int(b), float(length), ids.tolist(), pd.Series(names).mode().iat[0],
+                     float(network.lat[path].mean()), float(network.lon[path].mean()), float(lane_m[a] + lane_m[b])))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def rank_gaps(network: StreetNetwork, gaps: pd.DataFrame, n_samples: int = BETWEENNESS_SAMPLES,
+              seed: int = 42, trees: Optional[ShortestPathTrees] = None) -> pd.DataFrame:
+    """Order gaps by the share of cyclist trips that would ride through them once built
+
+    All gaps are upgraded together and riders route on riding_cost, so each
+    gap's flow_share is the sampled betweenness of its least used edge.
+    """
+    if gaps.empty:
+        return gaps.assign(flow_share=pd.Series(dtype=np.float64), cost=pd.Series(dtype=np.float64))
+    upgraded = np.zeros(network.n_edges, dtype=bool)
+    upgraded[np.concatenate(gaps["edges"].tolist()).astype(np.int64)] = True
+    if trees is None:
+        trees = ShortestPathTrees(network.adjacency(network.riding_cost(upgraded)))
+    flow = sampled_edge_betweenness(network, trees, n_samples, seed)
+    ranked = gaps.assign(
+        flow_share=[float(flow[np.asarray(ids, dtype=np.int64)].min()) for ids in gaps["edges"]],
+        cost=gaps["length_m"] * LANE_COST_PER_M,
+    )
+    return ranked.sort_values(["flow_share", "length_m"], ascending=[False, True], kind="stable").reset_index(drop=True)
+
+
+class StreetNetworkStore:
+    """A city's cycle network on disk (nodes/edges Parquet) plus its ranked missing links"""
+
+    def __init__(self, root: str = DATA_DIR):
+        self.root = Path(root) / "network"
+
+    def path(self, name: str) -> Path:
+        return self.root / f"{name}.parquet"
+
+    def exists(self) -> bool:
+        return self.path("nodes").exists() and self.path("edges").exists()
+
+    def save(self, network: StreetNetwork):
+        self.root.mkdir(parents=True, exist_ok=True)
+        frames = {"nodes": pd.DataFrame({"lat": network.lat, "lon": network.lon}), "edges": network.edges}
+        for name, frame in frames.items():
+            tmp = self.path(name).with_suffix(".tmp")
+            frame.to_parquet(tmp, index=False)
+            tmp.replace(self.path(name))
+
+    def load(self) -> StreetNetwork:
+        nodes = pd.read_parquet(self.path("nodes"))
+        return StreetNetwork(nodes["lat"].to_numpy(), nodes["lon"].to_numpy(), pd.read_parquet(self.path("edges")))
+
+    def ensure_sample_data(self, center: Tuple[float, float], seed: int = 42):
+        """Write a sample network if no real one has been loaded yet"""
+        if not self.exists():
+            self.save(generate_sample_network(center, seed=seed))
+
+    @property
+    def version(self) -> str:
+        digest = hashlib.sha1()
+        for name in ("nodes", "edges"):
+            path = self.path(name)
+            if path.exists():
+                stat = path.stat()
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:12]
+
+    def missing_links(self, network: Optional[StreetNetwork] = None, n_samples: int = BETWEENNESS_SAMPLES) -> pd.DataFrame:
+        """Ranked gaps for the current network, computed once and kept next to it"""
+        path = self.path(f"gaps-{self.version}-{n_samples}")
+        if path.exists():
+            return pd.read_parquet(path)
+        network = network or self.load()
+        ranked = rank_gaps(network, find_gaps(network), n_samples)
+        tmp = path.with_suffix(".tmp")
+        ranked.to_parquet(tmp, index=False)
+        tmp.replace(path)
+        for stale in self.root.glob("gaps-*.parquet"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        return ranked
+
+
+if __name__ == "__main__":
+    # Imported here: cities builds on this module
+    from cities import DEFAULT_CITY, city_data_dir, load_city_configs
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    sample = commands.add_parser("sample", help="write a synthetic grid network")
+    sample.add_argument("--grid", type=int, default=SAMPLE_GRID)
+    sample.add_argument("--lat", type=float, help="grid centre (default: the city's centre)")
+    sample.add_argument("--lon", type=float)
+    load = commands.add_parser("load", help="import a network from GraphML (e.g. exported by osmnx)")
+    load.add_argument("path")
+    gaps = commands.add_parser("gaps", help="find and rank missing links")
+    gaps.add_argument("--samples", type=int, default=BETWEENNESS_SAMPLES)
+    args = parser.parse_args()
+
+    configs = load_city_configs(args.data_dir)
+    if args.city not in configs:
+        parser.error(f"unknown city '{args.city}' (known: {', '.join(sorted(configs))})")
+    config = configs[args.city]
+    center = (config.lat if args.command != "sample" or args.lat is None else args.lat,
+              config.lon if args.command != "sample" or args.lon is None else args.lon)
+    store = StreetNetworkStore(str(city_data_dir(args.city, args.data_dir)))
+    if args.command == "sample":
+        store.save(generate_sample_network(center, args.grid))
+    elif args.command == "load":
+        store.save(StreetNetwork.from_networkx(nx.read_graphml(args.path)))
+    if args.command == "gaps":
+        # Same sample network the app would give this city if none was loaded
+        store.ensure_sample_data(center, seed=zlib.crc32(args.city.encode()))
+        ranked = store.missing_links(n_samples=args.samples)
+        print(ranked.drop(columns="edges").head(20).to_string())
+    else:
+        network = store.load()
+        print(json.dumps({"nodes": network.n_nodes, "edges": network.n_edges,
+                          "protected_edges": int(network.protected.sum())}))
@@ -0,0 +1,69 @@
+import functools
+import json
+import re
+import threading
+from pathlib import Path
+
+import jinja2
+import streamlit as st
+from cachetools import LRUCache
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATE_DIR = BASE_DIR / "templates"
+STYLESHEET = BASE_DIR / "static" / "styles.css"
+
+# Compiled once per process; auto_reload off so templates are never re-stat'ed on the hot path
+_environment = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(str(TEMPLATE_DIR)),
+    autoescape=jinja2.select_autoescape(["html"]),
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+
+
+# Rendered fragments keyed by template name and the JSON form of their inputs
+_rendered = LRUCache(maxsize=4096)
+_rendered_lock = threading.Lock()
+
+
+def render_template(template: str, /, **context) -> str:
+    """Render a card template, memoized on the template name and its input data"""
+    key = (template, json.dumps(context, sort_keys=True, default=str))
+    with _rendered_lock:
+        html = _rendered.get(key)
+    if html is None:
+        html = _environment.get_template(template).render(**context)
+        with _rendered_lock:
+            _rendered[key] = html
+    return html
+
+
+def precompile_templates():
+    """Compile every template up front so the first rerun does not pay for it"""
+    for name in _environment.list_templates(extensions=["html"]):
+        _environment.get_template(name)
+
+
+@functools.lru_cache(maxsize=1)
+def minified_css() -> str:
+    """Stylesheet with comments and redundant whitespace stripped, built once per process"""
+    css = STYLESHEET.read_text()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def inject_css():
+    """Add the stylesheet to the page as a <style> element
+
+    The markup is built once per session and kept in st.session_state. It is
+    still sent on every full rerun, since Streamlit removes elements that a
+    rerun does not send again. Fragment reruns leave it in place.
+    """
+    markup = st.session_state.get("_css_markup")
+    if markup is None:
+        markup = st.session_state["_css_markup"] = f"<style>{minified_css()}</style>"
+    st.markdown(markup, unsafe_allow_html=True)
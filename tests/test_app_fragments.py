@@ -0,0 +1,98 @@
+import ast
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+APP_DIR = Path(__file__).resolve().parents[1]
+
+# Interactive sections rerun on their own; data helpers they call must not be fragments
+FRAGMENTS = {"create_ai_chat_interface", "create_impact_simulator", "create_smart_recommendations",
+             "create_interactive_map_with_stories", "create_route_planner", "create_story_explorer",
+             "create_scenario_builder", "show_report_progress"}
+
+
+def _fragment_functions():
+    tree = ast.parse((APP_DIR / "app.py").read_text())
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            decorators = [d.func if isinstance(d, ast.Call) else d for d in node.decorator_list]
+            if any(isinstance(d, ast.Attribute) and d.attr == "fragment" for d in decorators):
+                yield node.name
+
+
+def test_fragments_wrap_interactive_sections_only():
+    assert set(_fragment_functions()) == FRAGMENTS
+
+
+def _fragment_rerun_report(timeout: float = 300) -> Dict:
+    """Run the page once, then move the map zoom as the browser would: a rerun of its fragment only
+
+    AppTest reruns the whole script on every interaction, so the fragment rerun
+    is requested on its script runner directly, with the fragment storage of
+    the first run.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+    from streamlit.testing.v1.util import patch_config_options
+
+    script = str(APP_DIR / "app.py")
+    at = AppTest.from_file(script, default_timeout=timeout)
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    def runner() -> LocalScriptRunner:
+        return LocalScriptRunner(script, at.session_state, PagesManager(script, setup_watcher=False))
+
+    with patch_config_options({"global.appTest": True}):
+        first = runner()
+        tree = first.run(None, None, timeout)
+        tree._runner = at
+        zoom = next(widget for widget in tree.select_slider if "Map detail" in widget.label)
+        fragment_id = next(msg.delta.fragment_id for msg in first.forward_msgs()
+                           if msg.HasField("delta") and msg.delta.new_element.slider.id == zoom.id)
+        zoom.set_value(14)
+
+        second = runner()
+        second._fragment_storage = first._fragment_storage
+        second.request_rerun(RerunData(widget_states=tree.get_widget_states(),
+                                       fragment_id_queue=[fragment_id], is_fragment_scoped_rerun=True))
+        second.start()
+        require_widgets_deltas(second, timeout)
+    deltas = [msg.delta for msg in second.forward_msgs() if msg.HasField("delta")]
+    return {
+        "fragment_id": fragment_id,
+        "elements": len(deltas),
+        "fragment_ids": sorted({delta.fragment_id for delta in deltas}),
+        "zoom": at.session_state[zoom.id],
+        "last_run": at.session_state["_render_profiler"].history[-1]["kind"],
+    }
+
+
+def test_widget_in_a_fragment_reruns_only_that_fragment(tmp_path):
+    # Own process and data directory, like the rerun benchmark: the page's caches are per process
+    env = {key: value for key, value in os.environ.items() if key not in ("CYCLESAFE_LLM_URL", "GROQ_API_KEY")}
+    env.update(CYCLESAFE_DATA_DIR=str(tmp_path), CYCLESAFE_PROFILE="1", PYTHONPATH=str(APP_DIR))
+    proc = subprocess.run([sys.executable, __file__], cwd=APP_DIR, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert report["elements"] > 0
+    assert report["fragment_ids"] == [report["fragment_id"]]
+    assert report["zoom"] == 14
+    assert report["last_run"] == "fragment:create_interactive_map_with_stories"
+
+
+if __name__ == "__main__":
+    print(json.dumps(_fragment_rerun_report()))
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+import pytest
+
+import cities
+from cities import CityCache
+
+
+@pytest.fixture(scope="module")
+def root(tmp_path_factory):
+    root = tmp_path_factory.mktemp("cities")
+    # Write every city's sample tables once; each test then loads them from disk
+    cache = CityCache(root=str(root))
+    for slug in ("london", "manchester", "leeds"):
+        cache.get(slug)
+    return str(root)
+
+
+def _fill(city, key, mb):
+    return city.memo(key, "v1", lambda: np.zeros(int(mb * 2**20), dtype=np.uint8))
+
+
+def test_least_recently_used_city_is_evicted_over_budget(root):
+    cache = CityCache(budget_mb=2, root=root)
+    _fill(cache.get("london"), "frame", 0.8)
+    _fill(cache.get("manchester"), "frame", 0.8)
+    cache.get("london")
+    _fill(cache.get("leeds"), "frame", 0.8)
+    assert [row["city"] for row in cache.stats()] == ["london", "leeds"]
+    assert cache.evictions == 1
+    assert sum(row["mb"] for row in cache.stats()) <= 2
+
+
+def test_city_just_used_is_kept_even_alone_over_budget(root):
+    cache = CityCache(budget_mb=1, root=root)
+    _fill(cache.get("london"), "frame", 0.8)
+    _fill(cache.get("manchester"), "frame", 1.5)
+    assert [row["city"] for row in cache.stats()] == ["manchester"]
+
+
+def test_memo_rebuilds_only_when_the_version_changes(root):
+    city = CityCache(root=root).get("london")
+    builds = []
+    for version in ("v1", "v1", "v2", "v2"):
+        city.memo("key", version, lambda: builds.append(version) or version)
+    assert builds == ["v1", "v2"]
+
+
+def test_concurrent_cold_requests_load_and_build_once(root, monkeypatch):
+    loads = []
+
+    class CountingCityData(cities.CityData):
+        def __init__(self, *args):
+            loads.append(1)
+            super().__init__(*args)
+
+    monkeypatch.setattr(cities, "CityData", CountingCityData)
+    cache = CityCache(root=root)
+    start = threading.Barrier(8)
+    builds = []
+
+    def request():
+        start.wait()
+        city = cache.get("leeds")
+        city.memo("slow", "v1", lambda: builds.append(1) or threading.Event().wait(0.1))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(builds) == 1
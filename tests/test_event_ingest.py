@@ -0,0 +1,37 @@
+import pandas as pd
+
+from event_ingest import KEEP_PREVIOUS_VERSIONS, HotspotAggregator
+
+
+def _events(location_ids):
+    return pd.DataFrame({"timestamp": pd.Timestamp("2025-03-01 08:00"), "location_id": location_ids,
+                         "event_type": "Swerving", "cyclists": 1})
+
+
+def test_publish_keeps_recent_files(tmp_path):
+    aggregator = HotspotAggregator(str(tmp_path))
+    for _ in range(5):
+        aggregator.ingest(_events([1, 2, 3]))
+    files = sorted(p.name for p in aggregator.aggregates_path.glob("v*.parquet"))
+    assert len(files) == KEEP_PREVIOUS_VERSIONS + 1
+    assert files[-1] == aggregator.manifest["file"]
+
+
+def test_reader_with_stale_manifest_reloads(tmp_path):
+    writer = HotspotAggregator(str(tmp_path))
+    writer.ingest(_events([1]))
+    stale = writer.manifest
+    for _ in range(KEEP_PREVIOUS_VERSIONS + 2):
+        writer.ingest(_events([1]))
+
+    class SlowReader(HotspotAggregator):
+        # Reads the manifest once before the writer's later publishes
+        reads = 0
+
+        @property
+        def manifest(self):
+            SlowReader.reads += 1
+            return stale if SlowReader.reads == 1 else super().manifest
+
+    frame = SlowReader(str(tmp_path)).load()
+    assert frame.loc[1, "event_count"] == KEEP_PREVIOUS_VERSIONS + 3
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from data_store import NarrativeDataStore
+from hotspot_pipeline import assign_stable_ids, publish_hotspots
+
+
+def _hotspots(ids, lat, lon, area="North"):
+    return pd.DataFrame({"location_id": ids, "location_name": [f"Hotspot {i}" for i in ids],
+                         "location_type": "Unclassified", "lat": lat, "lon": lon, "risk_level": "High",
+                         "affected_cyclists": 10, "incident_type": "Swerving", "time_of_day": "Midday",
+                         "fix_complexity": "Quick Fix", "estimated_cost": 2000.0, "community_impact": 0.5,
+                         "area": area, "month": "2025-03"})
+
+
+def test_redetected_hotspots_keep_their_ids():
+    previous = _hotspots([7, 9], [51.50, 51.51], [-0.10, -0.10], area=["East", "West"])
+    # Second one moved ~10 m, a third is new, and ids are renumbered from 1 by detection
+    detected = _hotspots([1, 2, 3], [51.51009, 51.50, 51.52], [-0.10, -0.10, -0.10])
+    stable = assign_stable_ids(detected, previous, used_ids=[12])
+    assert stable["location_id"].tolist() == [9, 7, 13]
+    assert stable["area"].tolist() == ["West", "East", "West"]
+
+
+def test_publish_swaps_table_atomically(tmp_path):
+    store = NarrativeDataStore(str(tmp_path))
+    store.ensure_sample_data(n_routes=50, n_hotspots=20)
+    first = store.read("hotspots")
+    publish_hotspots(_hotspots([1, 2], first["lat"][:2].to_numpy(), first["lon"][:2].to_numpy()), str(tmp_path))
+    published = store.read("hotspots")
+    assert np.array_equal(np.sort(published["location_id"].to_numpy()), np.sort(first["location_id"][:2].to_numpy()))
+    assert store.table_path("hotspots").is_symlink()
+    assert len(list(tmp_path.glob(".hotspots-*"))) == 2
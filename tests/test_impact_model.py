@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_store import generate_sample_data
+from impact_model import INTERVENTIONS, ImpactModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    return ImpactModel(model_path="missing-model.json")
+
+
+def _roi(result) -> float:
+    return float(result["roi"].rstrip("%"))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_roi_is_plausible_on_sample_data(model, seed):
+    routes, _ = generate_sample_data(seed=seed)
+    features = ImpactModel.prepare(routes)
+    for intervention in INTERVENTIONS:
+        result = model.predict_impact(features, intervention)
+        # Benefit-cost ratios of real schemes stay within low double figures
+        assert -100 <= _roi(result) <= 2000
+        assert 0 <= result["incident_reduction"] <= 100
+
+
+def test_roi_does_not_depend_on_route_count(model):
+    # Benefit and cost are taken over the same routes, so repeating the table changes nothing
+    routes, _ = generate_sample_data()
+    once = ImpactModel.prepare(routes)
+    twice = ImpactModel.prepare(pd.concat([routes] * 2, ignore_index=True))
+    for intervention in INTERVENTIONS:
+        assert model.predict_impact(once, intervention) == model.predict_impact(twice, intervention)
+
+
+def test_scores_every_route_in_one_batch(model):
+    routes, _ = generate_sample_data()
+    features = ImpactModel.prepare(routes)
+    reduction = model.score(features, "protected_lanes")
+    assert reduction.shape == (len(routes),)
+    assert np.all((reduction >= 0) & (reduction <= 1))
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+
+from llm_client import AsyncLLMClient, LLMBridge, LLMError
+from llm_stub import DEFAULT_REPLY, STUB_STATE, start_stub_server
+
+
+async def _collect(fail_first: int = 0, max_attempts: int = 3):
+    """Tokens streamed from a stub on an ephemeral port, and how many requests the stub saw"""
+    base_url, runner = await start_stub_server(port=0, token_delay=0, fail_first=fail_first)
+    client = AsyncLLMClient(base_url=base_url, api_key="", max_attempts=max_attempts)
+    try:
+        tokens = [token async for token in client.stream_chat("Where should we start?")]
+    finally:
+        await client.close()
+        requests = runner.app[STUB_STATE]["requests"]
+        await runner.cleanup()
+    return tokens, requests
+
+
+def test_tokens_stream_in_order():
+    tokens, requests = asyncio.run(_collect())
+    assert len(tokens) == len(DEFAULT_REPLY.split(" "))
+    assert "".join(tokens) == DEFAULT_REPLY
+    assert requests == 1
+
+
+def test_transient_failures_are_retried():
+    tokens, requests = asyncio.run(_collect(fail_first=2, max_attempts=3))
+    assert "".join(tokens) == DEFAULT_REPLY
+    assert requests == 3
+
+
+def test_gives_up_after_max_attempts():
+    with pytest.raises(LLMError):
+        asyncio.run(_collect(fail_first=3, max_attempts=3))
+
+
+def test_bridge_streams_synchronously():
+    loop = asyncio.new_event_loop()
+    base_url, runner = loop.run_until_complete(start_stub_server(port=0, token_delay=0, fail_first=1))
+    # The stub runs on a loop of its own thread, as the real endpoint would be remote
+    server = threading.Thread(target=loop.run_forever, daemon=True)
+    server.start()
+    bridge = LLMBridge(AsyncLLMClient(base_url=base_url, api_key=""))
+    try:
+        assert "".join(bridge.stream("Where should we start?")) == DEFAULT_REPLY
+    finally:
+        bridge.close()
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,41 @@
+import numpy as np
+
+from data_store import generate_sample_data
+from map_clustering import RAW_POINT_ZOOM, cluster_hotspots
+from spatial_index import viewport_bounds
+
+
+def test_cluster_count_grows_with_zoom_until_every_point_is_raw():
+    _, hotspots = generate_sample_data()
+    counts = [len(cluster_hotspots(hotspots, zoom)) for zoom in range(8, RAW_POINT_ZOOM + 2)]
+    # Cells at one zoom level split into four at the next, so clusters never merge when zooming in
+    assert counts == sorted(counts)
+    assert counts[0] < len(hotspots) // 4
+    assert counts[-1] == len(hotspots)
+
+
+def test_clusters_keep_every_hotspot_and_its_worst_risk():
+    _, hotspots = generate_sample_data(n_hotspots=2000)
+    clusters = cluster_hotspots(hotspots, 12)
+    assert clusters["hotspot_count"].sum() == len(hotspots)
+    assert clusters["affected_cyclists"].sum() == hotspots["affected_cyclists"].sum()
+    if (hotspots["risk_level"] == "Critical").any():
+        assert (clusters["risk_level"] == "Critical").any()
+
+
+def test_single_hotspots_are_shown_as_themselves():
+    _, hotspots = generate_sample_data()
+    clusters = cluster_hotspots(hotspots, RAW_POINT_ZOOM)
+    assert sorted(clusters["label"]) == sorted(hotspots["location_name"].astype(str))
+
+
+def test_markers_are_bounded_by_the_viewport_not_the_data():
+    _, hotspots = generate_sample_data(n_hotspots=50_000)
+    for zoom in (11, 13):
+        min_lat, min_lon, max_lat, max_lon = viewport_bounds(51.5074, -0.1278, zoom)
+        in_view = hotspots[hotspots["lat"].between(min_lat, max_lat) & hotspots["lon"].between(min_lon, max_lon)]
+        assert len(in_view)
+        clusters = cluster_hotspots(in_view, zoom)
+        # Partial cells along each edge add one row and one column
+        assert len(clusters) <= (1200 // 48 + 1) * (500 // 48 + 1)
+        assert np.isclose(clusters["hotspot_count"].sum(), len(in_view))
@@ -0,0 +1,40 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from optimizer import EXACT_MAX_ITEMS, optimize_budget
+
+
+def _brute_force(values: np.ndarray, costs: np.ndarray, budget: float) -> float:
+    best = 0.0
+    for size in range(len(values) + 1):
+        for combo in itertools.combinations(range(len(values)), size):
+            combo = list(combo)
+            if costs[combo].sum() <= budget:
+                best = max(best, values[combo].sum())
+    return best
+
+
+def test_small_sets_are_solved_exactly():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        n = int(rng.integers(1, 12))
+        costs = rng.lognormal(8, 1, n)
+        # Value close to cost is the case bucketed costs get wrong most often
+        values = costs * rng.uniform(0.95, 1.05, n)
+        budget = float(rng.uniform(2000, 20000))
+        result = optimize_budget(pd.DataFrame({"value": values, "estimated_cost": costs}), budget)
+        assert result["total_cost"] <= budget
+        assert np.isclose(result["total_value"], _brute_force(values, costs, budget))
+
+
+def test_large_sets_stay_within_budget():
+    rng = np.random.default_rng(3)
+    n = EXACT_MAX_ITEMS * 100
+    costs = rng.lognormal(8, 1, n)
+    values = rng.uniform(0.3, 1.0, n) * rng.poisson(30, n)
+    result = optimize_budget(pd.DataFrame({"value": values, "estimated_cost": costs}), 50_000)
+    assert result["total_cost"] <= 50_000
+    assert result["total_value"] <= result["value_bound"] + 1e-9
+    assert result["optimality"] > 0.9
@@ -0,0 +1,52 @@
+import dataclasses
+from types import SimpleNamespace
+
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.runtime.scriptrunner import ScriptRunContext
+
+from profiler import ENQUEUE_ATTR, RenderProfiler
+
+
+def _element(body: str) -> ForwardMsg:
+    msg = ForwardMsg()
+    msg.delta.new_element.markdown.body = body
+    return msg
+
+
+def test_pinned_streamlit_still_has_the_enqueue_field():
+    # If this fails after a Streamlit upgrade, element counts silently fall back to timings only
+    assert ENQUEUE_ATTR in {field.name for field in dataclasses.fields(ScriptRunContext)}
+
+
+def test_counts_elements_per_component_and_forwards_them():
+    sent = []
+    ctx = SimpleNamespace(_enqueue=sent.append)
+    profiler = RenderProfiler("session")
+    profiler.install(ctx)
+    profiler.install(ctx)
+    profiler.start_run("full")
+    with profiler.measure("map"):
+        ctx._enqueue(_element("a"))
+        ctx._enqueue(_element("b"))
+    ctx._enqueue(ForwardMsg())
+    profiler.finish_run()
+
+    components = {row["component"]: row for row in profiler.history[-1]["components"]}
+    assert components["map"]["elements"] == 2
+    assert components["map"]["bytes"] > 0
+    assert components["map"]["calls"] == 1
+    assert len(sent) == 3
+
+
+def test_falls_back_to_timings_without_the_enqueue_field():
+    ctx = SimpleNamespace()
+    profiler = RenderProfiler("session")
+    profiler.install(ctx)
+    profiler.start_run("full")
+    with profiler.measure("map"):
+        pass
+    profiler.finish_run()
+
+    assert not profiler.counts_elements
+    row = profiler.history[-1]["components"][0]
+    assert row["component"] == "map" and row["calls"] == 1 and row["elements"] == 0
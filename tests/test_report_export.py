@@ -0,0 +1,42 @@
+import time
+
+import pandas as pd
+
+import report_export
+from report_export import ActionPlanReport, ReportExporter
+
+
+def _report(budget=50000):
+    fixes = pd.DataFrame({"location_id": [1, 2], "fix_complexity": ["Quick Fix", "Moderate"],
+                          "estimated_cost": [2000, 8000]})
+    return ActionPlanReport("Leeds", "v1", budget, 10000, 0.9, fixes, [])
+
+
+def _wait(exporter, key):
+    for _ in range(200):
+        job = exporter.get(key)
+        if job is not None and job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("export did not finish")
+
+
+def test_finished_jobs_leave_the_running_map(monkeypatch):
+    def fail(report, progress):
+        raise ValueError("boom")
+
+    monkeypatch.setitem(report_export.WRITERS, "PDF", fail)
+    exporter = ReportExporter(max_bytes=64)
+    failed = exporter.submit(_report(), "PDF")
+    oversized = exporter.submit(_report(), "CSV")
+    assert _wait(exporter, failed.key).error == "ValueError: boom"
+    assert _wait(exporter, oversized.key).data
+    assert exporter._running == {}
+    assert exporter.stats()["cached"] == 0
+
+
+def test_settled_jobs_are_bounded():
+    exporter = ReportExporter(max_bytes=64)
+    for budget in range(report_export.SETTLED_JOBS + 3):
+        _wait(exporter, exporter.submit(_report(budget), "CSV").key)
+    assert len(exporter._settled) == report_export.SETTLED_JOBS
@@ -0,0 +1,32 @@
+import numpy as np
+
+from data_store import NarrativeDataStore
+from event_ingest import HotspotAggregator, generate_sample_events
+from rollup_cube import DIMENSIONS, MEASURES, RollupCube, cube_manifest, publish_rollup_cube, update_rollup_cube
+
+
+def _cells(root):
+    cube = RollupCube.load(root / "rollups" / cube_manifest(root)["file"])
+    return cube.cells.set_index(DIMENSIONS)[MEASURES].sort_index()
+
+
+def test_ingest_updates_cube_like_a_full_build(tmp_path):
+    store = NarrativeDataStore(str(tmp_path))
+    store.ensure_sample_data(n_routes=200, n_hotspots=50)
+    aggregator = HotspotAggregator(str(tmp_path))
+    publish_rollup_cube(store, aggregator)
+    hotspots = store.read("hotspots", ["location_id", "lat", "lon"])
+    for seed in range(3):
+        before = aggregator.snapshot()
+        aggregator.ingest(generate_sample_events(hotspots, 300, seed).assign(
+            location_id=hotspots["location_id"].to_numpy()[np.arange(300) % 7]))
+        update_rollup_cube(store, aggregator, before)
+    incremental = _cells(tmp_path)
+
+    publish_rollup_cube(store, aggregator)
+    full = _cells(tmp_path)
+    assert len(cube_manifest(tmp_path)["previous"]) == 2
+    incremental = incremental[(incremental != 0).any(axis=1)]
+    full = full[(full != 0).any(axis=1)]
+    assert incremental.index.equals(full.index)
+    assert np.allclose(incremental.to_numpy(), full.to_numpy())
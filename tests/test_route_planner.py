@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csgraph
+
+from route_planner import RoutePlanner
+from street_network import StreetNetwork, generate_sample_network
+
+
+def _path_cost(planner, path):
+    nodes = np.asarray(path)
+    return planner.cost[planner.network.edge_ids(nodes[:-1], nodes[1:])].sum()
+
+
+@pytest.mark.parametrize("landmarks", [0, 3, 16])
+def test_paths_are_as_cheap_as_dijkstra(landmarks):
+    network = generate_sample_network(grid=40, seed=landmarks)
+    planner = RoutePlanner(network, landmarks=landmarks)
+    rng = np.random.default_rng(landmarks)
+    sources = rng.integers(network.n_nodes, size=15)
+    dist = csgraph.dijkstra(network.adjacency(planner.cost), directed=False, indices=sources)
+    for row, source in enumerate(sources):
+        for target in rng.integers(network.n_nodes, size=15):
+            path, _ = planner._astar(int(source), int(target))
+            if not np.isfinite(dist[row, target]):
+                assert path is None
+                continue
+            assert path[0] == source and path[-1] == target
+            assert _path_cost(planner, path) == pytest.approx(dist[row, target], rel=1e-5)
+
+
+@pytest.mark.parametrize("landmarks", [0, 4])
+def test_disconnected_points_have_no_route(landmarks):
+    # Two separate 3-node streets
+    edges = pd.DataFrame({"u": [0, 1, 3, 4], "v": [1, 2, 4, 5], "length_m": 100.0, "protected": False})
+    network = StreetNetwork(np.full(6, 51.5), -0.1 + np.arange(6) * 0.001, edges)
+    planner = RoutePlanner(network, landmarks=landmarks)
+    assert planner._astar(0, 5)[0] is None
+    assert planner._astar(0, 2)[0] == [0, 1, 2]
+
+
+def test_city_sized_queries_stay_fast():
+    network = generate_sample_network(grid=200)
+    planner = RoutePlanner(network)
+    rng = np.random.default_rng(1)
+    elapsed = []
+    for source, target in rng.integers(network.n_nodes, size=(200, 2)):
+        started = time.perf_counter()
+        planner._astar(int(source), int(target))
+        elapsed.append(time.perf_counter() - started)
+    assert np.percentile(elapsed, 99) < 0.05
@@ -0,0 +1,33 @@
+import pytest
+
+from scenario_engine import PRIORITY_WEIGHTS, TIMEFRAME_MONTHS, simulate_scenario
+
+
+def test_same_scenario_reports_the_same_figures():
+    assert simulate_scenario(50000, "6 months", "Reduce incidents") == \
+        simulate_scenario(50000, "6 months", "Reduce incidents")
+
+
+@pytest.mark.parametrize("priority", list(PRIORITY_WEIGHTS))
+def test_intervals_are_ordered_and_bounded(priority):
+    result = simulate_scenario(50000, "6 months", priority)
+    for name in ("incident_reduction", "satisfaction_boost", "roi"):
+        interval = result[name]
+        assert interval["low"] <= interval["mean"] <= interval["high"]
+    assert 0 <= result["incident_reduction"]["low"] and result["incident_reduction"]["high"] <= 95
+    assert 0 <= result["satisfaction_boost"]["low"] and result["satisfaction_boost"]["high"] <= 100
+
+
+def test_more_budget_and_time_reduce_more_incidents():
+    by_budget = [simulate_scenario(budget, "6 months", "Reduce incidents", seed=1)["incident_reduction"]["mean"]
+                 for budget in (10000, 50000, 200000)]
+    by_time = [simulate_scenario(50000, timeframe, "Reduce incidents", seed=1)["incident_reduction"]["mean"]
+               for timeframe in TIMEFRAME_MONTHS]
+    assert by_budget == sorted(by_budget)
+    assert by_time == sorted(by_time)
+
+
+def test_wider_confidence_gives_a_wider_interval():
+    narrow = simulate_scenario(50000, "1 year", "Increase ridership", confidence=0.5)["roi"]
+    wide = simulate_scenario(50000, "1 year", "Increase ridership", confidence=0.95)["roi"]
+    assert wide["low"] <= narrow["low"] and narrow["high"] <= wide["high"]
@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from spatial_index import EARTH_RADIUS_M, HotspotIndex
+
+
+def _hotspots(n=5000, seed=3):
+    rng = np.random.default_rng(seed)
+    # Clustered like real hotspots, so some grid cells are crowded and many empty
+    centres = rng.uniform([51.45, -0.25], [51.55, 0.0], size=(20, 2))
+    points = centres[rng.integers(len(centres), size=n)] + rng.normal(0, 0.01, size=(n, 2))
+    return pd.DataFrame({"lat": points[:, 0], "lon": points[:, 1]})
+
+
+def _distances(frame, lat, lon):
+    # Same local projection as the index
+    scale_x = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(frame["lat"].mean()))
+    scale_y = math.radians(1) * EARTH_RADIUS_M
+    return np.hypot((frame["lon"].to_numpy() - lon) * scale_x, (frame["lat"].to_numpy() - lat) * scale_y)
+
+
+def test_bbox_matches_brute_force():
+    frame = _hotspots()
+    index = HotspotIndex(frame)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        lat = np.sort(rng.uniform(51.4, 51.6, 2))
+        lon = np.sort(rng.uniform(-0.3, 0.05, 2))
+        expected = np.flatnonzero(frame["lat"].between(*lat) & frame["lon"].between(*lon))
+        assert np.array_equal(np.sort(index.query_bbox(lat[0], lon[0], lat[1], lon[1])), expected)
+
+
+def test_bbox_outside_the_data_is_empty():
+    index = HotspotIndex(_hotspots())
+    assert len(index.query_bbox(50.0, -1.0, 50.1, -0.9)) == 0
+    assert len(index.query_bbox(52.0, 1.0, 52.1, 1.1)) == 0
+
+
+def test_nearest_and_radius_match_brute_force():
+    frame = _hotspots()
+    index = HotspotIndex(frame)
+    rng = np.random.default_rng(1)
+    for lat, lon in rng.uniform([51.45, -0.25], [51.55, 0.0], size=(100, 2)):
+        distances = _distances(frame, lat, lon)
+        positions, found = index.nearest(lat, lon, k=5)
+        assert np.allclose(found, np.sort(distances)[:5])
+        assert np.allclose(distances[positions], found)
+
+        within = index.within_radius(lat, lon, 400)
+        assert np.array_equal(np.sort(within), np.flatnonzero(distances <= 400))
+        assert np.all(np.diff(distances[within]) >= 0)
+
+
+def test_match_returns_nearest_or_minus_one():
+    frame = _hotspots(n=500)
+    index = HotspotIndex(frame)
+    rng = np.random.default_rng(2)
+    points = rng.uniform([51.45, -0.25], [51.55, 0.0], size=(300, 2))
+    matched = index.match(points[:, 0], points[:, 1], max_distance_m=300)
+    for (lat, lon), position in zip(points, matched):
+        distances = _distances(frame, lat, lon)
+        if distances.min() > 300:
+            assert position == -1
+        else:
+            assert distances[position] == distances.min()
+
+
+def test_empty_index():
+    index = HotspotIndex(pd.DataFrame({"lat": [], "lon": []}))
+    assert len(index.query_bbox(51, -1, 52, 0)) == 0
+    assert len(index.nearest(51.5, -0.1)[0]) == 0
+    assert np.array_equal(index.match([51.5], [-0.1], 100), [-1])
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from timeseries import CITY_SERIES, TimeSeries, build_levels, generate_sample_series, lttb
+
+
+def test_lttb_keeps_the_ends_and_the_extremes():
+    rng = np.random.default_rng(0)
+    x = np.arange(10_000)
+    y = rng.normal(0, 1, len(x))
+    y[3_333], y[6_666] = 50, -50
+    keep = lttb(x, y, 200)
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert {3_333, 6_666} <= set(keep.tolist())
+
+
+def test_lttb_returns_everything_when_nothing_needs_dropping():
+    x = np.arange(50)
+    assert np.array_equal(lttb(x, x * 2.0, 100), x)
+    assert np.array_equal(lttb(x, x * 2.0, 2), x)
+
+
+def test_query_is_bounded_by_chart_width_and_reads_a_coarser_level_for_long_spans():
+    routes = pd.DataFrame({"route_id": np.arange(20), "area": np.repeat(["North", "South"], 10),
+                           "incident_rate": 0.5, "safety_score": 7.0})
+    series = TimeSeries(build_levels(generate_sample_series(routes, years=3)))
+    _, end = series.span(CITY_SERIES)
+
+    values, level = series.query(CITY_SERIES, "incidents", max_points=100)
+    assert len(values) <= 100 and level != "daily"
+    assert values.index[0] == series.level(level, CITY_SERIES, "incidents").index[0]
+
+    recent, level = series.query(CITY_SERIES, "incidents", start=end - pd.Timedelta(days=60), max_points=100)
+    assert level == "daily" and len(recent) <= 100
+
+
+def test_every_level_adds_up_to_the_same_totals():
+    routes = pd.DataFrame({"route_id": np.arange(4), "area": "North", "incident_rate": 2.0, "safety_score": 6.0})
+    levels = build_levels(generate_sample_series(routes, years=1))
+    totals = {level: frame.groupby("series")[["incidents", "responses"]].sum() for level, frame in levels.items()}
+    for level in ("weekly", "monthly"):
+        pd.testing.assert_frame_equal(totals[level], totals["daily"])
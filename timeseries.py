@@ -0,0 +1,216 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_store import AREAS, DATA_DIR, SAMPLE_MONTHS, NarrativeDataStore
+
+# Pre-built resolutions, finest first, with the pandas frequency each is binned at
+LEVELS = {"daily": "D", "weekly": "W", "monthly": "MS"}
+MEASURES = ["incidents", "satisfaction"]
+CITY_SERIES = "city"
+
+# Points a chart is drawn with: about one per horizontal pixel of a full-width chart
+CHART_WIDTH_PX = 1200
+# A level is read only if it has at most this many points per output point in the range
+MAX_OVERSAMPLE = 8
+
+SAMPLE_YEARS = int(os.environ.get("CYCLESAFE_SAMPLE_YEARS", 3))
+
+
+def series_key(area: Optional[str] = None, route_id: Optional[int] = None) -> str:
+    """Name of a stored series: the whole city, one area or one route"""
+    if route_id is not None:
+        return f"route:{route_id}"
+    if area is not None:
+        return f"area:{area}"
+    return CITY_SERIES
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the n_out points Largest-Triangle-Three-Buckets keeps from (x, y)
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previous pick and the
+    next bucket's average, which preserves peaks and dips a plain stride drops.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def generate_sample_series(routes: pd.DataFrame, years: int = SAMPLE_YEARS, seed: int = 42) -> pd.DataFrame:
+    """Daily incidents and satisfaction survey results per area, ending with the sample months
+
+    Incident levels come from each area's routes (incident_rate is per route
+    per month) and satisfaction from their average safety score, with a
+    seasonal swing and a slow improvement over the years.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Period(SAMPLE_MONTHS[-1], "M").end_time.normalize()
+    dates = pd.date_range(end - pd.DateOffset(years=years) + pd.Timedelta(days=1), end, freq="D")
+    progress = np.linspace(0, 1, len(dates))
+    # More riding, and so more incidents, in summer
+    season = 1 - 0.2 * np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 15) / 365.25)
+
+    by_area = routes.groupby("area", observed=True).agg(
+        incidents=("incident_rate", "sum"), safety=("safety_score", "mean"))
+    frames = []
+    for area in AREAS:
+        if area not in by_area.index:
+            continue
+        daily = by_area.at[area, "incidents"] / (len(SAMPLE_MONTHS) * 30.44)
+        responses = rng.poisson(20, len(dates)) + 1
+        satisfaction = np.clip(by_area.at[area, "safety"] * 10 - 6 + 8 * progress + rng.normal(0, 4, len(dates)), 0, 100)
+        frames.append(pd.DataFrame({
+            "series": series_key(area=area),
+            "date": dates,
+            "incidents": rng.poisson(daily * (1.3 - 0.3 * progress) * season),
+            "satisfaction_sum": satisfaction * responses,
+            "responses": responses,
+        }))
+    areas = pd.concat(frames, ignore_index=True)
+    city = areas.groupby("date", as_index=False)[["incidents", "satisfaction_sum", "responses"]].sum()
+    city.insert(0, "series", CITY_SERIES)
+    return pd.concat([city, areas], ignore_index=True)
+
+
+def build_levels(daily: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Roll daily rows up to every level; all measures are additive so each bin is a plain sum"""
+    levels = {}
+    for level, freq in LEVELS.items():
+        grouped = daily.groupby(["series", pd.Grouper(key="date", freq=freq)], sort=True)
+        levels[level] = grouped[["incidents", "satisfaction_sum", "responses"]].sum().reset_index()
+    return levels
+
+
+class TimeSeries:
+    """All levels of every series held as flat arrays, sliced per series through offsets"""
+
+    def __init__(self, levels: Dict[str, pd.DataFrame]):
+        self._levels = {}
+        for level, frame in levels.items():
+            frame = frame.sort_values(["series", "date"], kind="stable")
+            keys = frame["series"].to_numpy()
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+            bounds = np.r_[starts, len(keys)]
+            self._levels[level] = {
+                "dates": frame["date"].to_numpy(dtype="datetime64[ns]"),
+                "incidents": frame["incidents"].to_numpy(dtype=np.float64),
+                "satisfaction_sum": frame["satisfaction_sum"].to_numpy(dtype=np.float64),
+                "responses": frame["responses"].to_numpy(dtype=np.float64),
+                "offsets": {keys[s]: (int(s), int(e)) for s, e in zip(bounds[:-1], bounds[1:])},
+            }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(arrays[name].nbytes for arrays in self._levels.values()
+                   for name in ("dates", "incidents", "satisfaction_sum", "responses"))
+
+    @property
+    def series(self):
+        return list(self._levels["daily"]["offsets"]) if "daily" in self._levels else []
+
+    def span(self, key: str = CITY_SERIES) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """First and last day a series has data for"""
+        arrays = self._levels["daily"]
+        start, stop = arrays["offsets"][key]
+        return pd.Timestamp(arrays["dates"][start]), pd.Timestamp(arrays["dates"][stop - 1])
+
+    def _slice(self, level: str, key: str, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> slice:
+        arrays = self._levels[level]
+        first, stop = arrays["offsets"].get(key, (0, 0))
+        dates = arrays["dates"][first:stop]
+        lo = np.searchsorted(dates, np.datetime64(start, "ns"), "left") if start is not None else 0
+        hi = np.searchsorted(dates, np.datetime64(end, "ns"), "right") if end is not None else len(dates)
+        return slice(first + lo, first + hi)
+
+    def level(self, level: str, key: str, measure: str, start: Optional[pd.Timestamp] = None,
+              end: Optional[pd.Timestamp] = None) -> pd.Series:
+        """One measure of a series at one level, every stored point in [start, end]"""
+        arrays = self._levels[level]
+        rows = self._slice(level, key, start, end)
+        if measure == "incidents":
+            values = arrays["incidents"][rows]
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = arrays["satisfaction_sum"][rows] / arrays["responses"][rows]
+        return pd.Series(values, index=pd.DatetimeIndex(arrays["dates"][rows]), name=measure)
+
+    def query(self, key: str, measure: str, start: Optional[pd.Timestamp] = None,
+              end: Optional[pd.Timestamp] = None, max_points: int = CHART_WIDTH_PX) -> Tuple[pd.Series, str]:
+        """A measure over [start, end] in at most max_points points, and the level it was read from
+
+        The finest level with no more than MAX_OVERSAMPLE points per output
+        point is read, then reduced with LTTB, so the cost depends on the
+        chart width rather than on how much history is stored.
+        """
+        chosen = list(LEVELS)[-1]
+        for level in LEVELS:
+            rows = self._slice(level, key, start, end)
+            if rows.stop - rows.start <= max_points * MAX_OVERSAMPLE:
+                chosen = level
+                break
+        values = self.level(chosen, key, measure, start, end).dropna()
+        if len(values) > max_points:
+            keep = lttb(values.index.asi8, values.to_numpy(), max_points)
+            values = values.iloc[keep]
+        return values, chosen
+
+
+class TimeSeriesStore:
+    """Daily series with pre-built weekly and monthly levels, one Parquet file per level"""
+
+    def __init__(self, root: str = DATA_DIR):
+        self.root = Path(root) / "timeseries"
+
+    def path(self, level: str) -> Path:
+        return self.root / f"{level}.parquet"
+
+    def exists(self) -> bool:
+        return all(self.path(level).exists() for level in LEVELS)
+
+    def write(self, daily: pd.DataFrame):
+        """Replace the stored history with these daily rows and rebuild every level"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        for level, frame in build_levels(daily).items():
+            tmp = self.path(level).with_suffix(".tmp")
+            frame.to_parquet(tmp, index=False)
+            tmp.replace(self.path(level))
+
+    def ensure_sample_data(self, store: NarrativeDataStore, years: int = SAMPLE_YEARS, seed: int = 42):
+        """Write sample history derived from the route table if none has been loaded yet"""
+        if self.exists():
+            return
+        routes = store.read("routes", ["area", "incident_rate", "safety_score"])
+        self.write(generate_sample_series(routes, years, seed))
+
+    def load(self) -> TimeSeries:
+        return TimeSeries({level: pd.read_parquet(self.path(level)) for level in LEVELS})
+
+    @property
+    def version(self) -> str:
+        digest = hashlib.sha1()
+        for level in LEVELS:
+            path = self.path(level)
+            if path.exists():
+                stat = path.stat()
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:12]